@@ -1,25 +1,41 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for, g, has_request_context, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_httpauth import HTTPBasicAuth
 from werkzeug.security import generate_password_hash, check_password_hash
 import subprocess
 import os
 import re
 import json
-from datetime import datetime, timedelta
+import csv
+import io
+from datetime import datetime, timedelta, timezone
 import threading
 import time
+import functools
+import heapq
+import itertools
 from pathlib import Path
+from contextlib import contextmanager
 import psutil
 import sqlite3
-from collections import defaultdict
+import socket
+from collections import defaultdict, deque, OrderedDict
 import paramiko
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import yaml
 import tempfile
 import shutil
+import zipfile
+import gzip
+import ctypes
+import select
+import struct
+import hashlib
+import hmac
+import queue
 
 auth = HTTPBasicAuth()
 
@@ -36,14 +52,141 @@ app.logger.disabled = True
 # Database for traffic history
 DATABASE_PATH = 'vpn_history.db'
 
+# system_metrics retention: raw samples, then 5-minute buckets, then hourly buckets
+SYSTEM_METRICS_RAW_HOURS = 24
+SYSTEM_METRICS_5M_DAYS = 30
+
+# Configure datetime adapter for Python 3.12+ compatibility
+sqlite3.register_adapter(datetime, lambda dt: dt.isoformat())
+sqlite3.register_converter("timestamp", lambda b: datetime.fromisoformat(b.decode()))
+
+DATABASE_BUSY_TIMEOUT_MS = 5000
+DATABASE_CACHE_SIZE_KB = 8192
+DATABASE_POOL_SIZE = 8
+
+# Write generation scopes: session tracking and metric samples commit often, so they
+# get their own counters and do not invalidate versions of unrelated resources
+DATABASE_WRITE_SCOPES = ('data', 'sessions', 'metrics')
+
+class PooledConnection:
+    """sqlite3 connection handed out by DatabasePool; close() returns it to the pool"""
+    __slots__ = ('_conn', '_pool', '_scope')
+
+    def __init__(self, conn, pool, scope='data'):
+        self._conn = conn
+        self._pool = pool
+        self._scope = scope
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        self._conn.commit()
+        self._pool.bump_generation(self._scope)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+class DatabasePool:
+    """Shared pool of tuned connections to vpn_history.db.
+
+    Connections run in WAL mode with synchronous=NORMAL and a busy timeout,
+    so the tracker thread and request threads wait for each other instead of
+    failing with "database is locked". The path is resolved once so the pool
+    does not depend on the process working directory.
+    """
+
+    def __init__(self, path, size=DATABASE_POOL_SIZE):
+        self.path = os.path.abspath(path)
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle = []
+        self._generations = dict.fromkeys(DATABASE_WRITE_SCOPES, 0)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=DATABASE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={DATABASE_BUSY_TIMEOUT_MS}')
+        conn.execute(f'PRAGMA cache_size=-{DATABASE_CACHE_SIZE_KB}')
+        return conn
+
+    def connect(self, scope='data'):
+        """Get a connection; call close() on it to give it back.
+
+        Commits on it bump the write generation of scope.
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+        return PooledConnection(conn, self, scope)
+
+    def bump_generation(self, *scopes):
+        with self._lock:
+            for scope in scopes or DATABASE_WRITE_SCOPES:
+                self._generations[scope] += 1
+
+    def generation(self, *scopes):
+        """Commit counters of the given scopes (all scopes if none given)"""
+        with self._lock:
+            return tuple(self._generations[scope] for scope in scopes or DATABASE_WRITE_SCOPES)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def backup_to(self, destination):
+        """Write a consistent copy of the database, including pending WAL pages"""
+        conn = self.connect()
+        try:
+            target = sqlite3.connect(destination)
+            try:
+                conn.backup(target)
+            finally:
+                target.close()
+        finally:
+            conn.close()
+
+    def replace_with(self, source):
+        """Overwrite the database with the contents of source (backup restore).
+
+        Goes through the SQLite backup API on a pooled connection instead of
+        swapping files, so connections other threads still hold keep working
+        and see the restored data once the copy commits.
+        """
+        conn = self.connect()
+        try:
+            src = sqlite3.connect(source)
+            try:
+                src.backup(conn._conn)
+            finally:
+                src.close()
+        finally:
+            conn.close()
+        self.bump_generation()
+
+db_pool = DatabasePool(DATABASE_PATH)
+
+def get_db_connection(scope='data'):
+    """Connection from the shared pool (use instead of sqlite3.connect)"""
+    return db_pool.connect(scope)
+
 def init_database():
     """Initialize database for traffic history"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        
-        # Configure datetime adapter for Python 3.12+ compatibility
-        sqlite3.register_adapter(datetime, lambda dt: dt.isoformat())
-        sqlite3.register_converter("timestamp", lambda b: datetime.fromisoformat(b.decode()))
+        conn = get_db_connection()
         
         cursor = conn.cursor()
         
@@ -77,6 +220,24 @@ def init_database():
             )
         ''')
         
+        # Create system metrics rollup tables (5-minute and hourly buckets)
+        for metrics_table in ('system_metrics_5m', 'system_metrics_1h'):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {metrics_table} (
+                    bucket DATETIME PRIMARY KEY,
+                    sample_count INTEGER DEFAULT 0,
+                    cpu_sum REAL DEFAULT 0,
+                    cpu_max REAL DEFAULT 0,
+                    memory_sum REAL DEFAULT 0,
+                    memory_max REAL DEFAULT 0,
+                    memory_available_min INTEGER,
+                    network_sent INTEGER,
+                    network_received INTEGER,
+                    connections_sum INTEGER DEFAULT 0,
+                    connections_max INTEGER DEFAULT 0
+                )
+            ''')
+        
         # Create temporary clients table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS temporary_clients (
@@ -167,6 +328,32 @@ def init_database():
             )
         ''')
         
+        # Create traffic rollup tables (maintained when sessions are finalized)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS client_traffic_totals (
+                client_name TEXT PRIMARY KEY,
+                bytes_sent INTEGER DEFAULT 0,
+                bytes_received INTEGER DEFAULT 0,
+                duration_seconds INTEGER DEFAULT 0,
+                session_count INTEGER DEFAULT 0,
+                first_connection DATETIME,
+                last_activity DATETIME
+            )
+        ''')
+        
+        for rollup_table in ('client_traffic_hourly', 'client_traffic_daily'):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {rollup_table} (
+                    client_name TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    bytes_sent INTEGER DEFAULT 0,
+                    bytes_received INTEGER DEFAULT 0,
+                    duration_seconds INTEGER DEFAULT 0,
+                    session_count INTEGER DEFAULT 0,
+                    PRIMARY KEY (client_name, bucket)
+                )
+            ''')
+        
         # Add new columns to existing traffic_history table if they don't exist
         try:
             cursor.execute('ALTER TABLE traffic_history ADD COLUMN real_address TEXT')
@@ -181,6 +368,9 @@ def init_database():
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_traffic_client ON traffic_history(client_name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_traffic_timestamp ON traffic_history(timestamp)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_traffic_real_address ON traffic_history(real_address)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_traffic_open_sessions ON traffic_history(client_name) WHERE session_end IS NULL')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_traffic_hourly_bucket ON client_traffic_hourly(bucket)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_traffic_daily_bucket ON client_traffic_daily(bucket)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_system_timestamp ON system_metrics(timestamp)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_stats_name ON client_stats(client_name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_stats_updated ON client_stats(updated_at)')
@@ -197,6 +387,14 @@ def init_database():
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_groups_name ON client_groups(client_name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_groups_group ON client_groups(group_name)')
         
+        # Backfill rollups for databases created before they existed
+        cursor.execute('SELECT COUNT(*) FROM client_traffic_totals')
+        if cursor.fetchone()[0] == 0:
+            cursor.execute('SELECT 1 FROM traffic_history WHERE session_end IS NOT NULL LIMIT 1')
+            if cursor.fetchone():
+                rebuild_traffic_rollups(cursor)
+                print("📊 Built traffic rollups from existing history")
+        
         conn.commit()
         
         # Test database write
@@ -221,155 +419,619 @@ def init_database():
 active_sessions = {}  # {client_name: {'start_time': datetime, 'initial_sent': int, 'initial_received': int}}
 
 # Global storage for temporary clients tracking
-temporary_clients = {}  # {client_name: {'revoke_time': datetime, 'timer': Timer, 'hours': int}}
+temporary_clients = {}  # {client_name: {'revoke_time': datetime, 'hours': int}}
+
+# Temporary clients expiring within this many seconds of each other are revoked together
+EXPIRY_BATCH_WINDOW = 5
+
+class ExpiryScheduler:
+    """Single thread revoking temporary clients when their revoke_at passes.
+
+    Keeps a min-heap of (revoke_at, seq, client_name). Cancelling or
+    rescheduling drops the client from the live map and leaves its heap entry
+    to be skipped when it surfaces, so both stay O(log n). Clients due within
+    EXPIRY_BATCH_WINDOW of the earliest one are handed to the callback as one
+    batch once the last of them is due, so no client is revoked early.
+    """
+
+    def __init__(self, on_expire, batch_window=EXPIRY_BATCH_WINDOW):
+        self.on_expire = on_expire
+        self.batch_window = batch_window
+        self._cond = threading.Condition()
+        self._heap = []
+        self._live = {}  # {client_name: (revoke_at_ts, seq)}
+        self._seq = 0
+        self._thread = None
+
+    def start(self):
+        """Start the scheduler thread (idempotent)"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def schedule(self, client_name, revoke_time):
+        """Schedule (or reschedule) revocation of a client at revoke_time (datetime)"""
+        self.start()
+        with self._cond:
+            self._seq += 1
+            entry = (revoke_time.timestamp(), self._seq, client_name)
+            self._live[client_name] = entry[:2]
+            heapq.heappush(self._heap, entry)
+            # Drop cancelled entries once they dominate the heap
+            if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+                self._heap = [(ts, seq, name) for name, (ts, seq) in self._live.items()]
+                heapq.heapify(self._heap)
+            self._cond.notify()
+
+    def cancel(self, client_name):
+        """Cancel a scheduled revocation; returns True if one was pending"""
+        with self._cond:
+            removed = self._live.pop(client_name, None) is not None
+            if removed:
+                self._cond.notify()
+            return removed
+
+    def is_scheduled(self, client_name):
+        with self._cond:
+            return client_name in self._live
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._live)
+
+    def _batch_end(self, horizon):
+        """Latest live revoke_at not after horizon. Caller holds the lock.
+
+        Walks only heap entries up to horizon: a subtree whose root is past
+        it holds nothing earlier, so the cost follows the batch size.
+        """
+        batch_end = self._heap[0][0]
+        stack = [0]
+        while stack:
+            index = stack.pop()
+            ts, seq, client_name = self._heap[index]
+            if ts > horizon:
+                continue
+            if ts > batch_end and self._live.get(client_name) == (ts, seq):
+                batch_end = ts
+            stack.extend(child for child in (2 * index + 1, 2 * index + 2) if child < len(self._heap))
+        return batch_end
+
+    def _pop_due(self):
+        """Wait until every client in the earliest batch window is due, then pop the due clients"""
+        with self._cond:
+            while True:
+                # Skip entries that were cancelled or rescheduled
+                while self._heap and self._live.get(self._heap[0][2]) != self._heap[0][:2]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                horizon = self._heap[0][0] + self.batch_window
+                batch_due = self._batch_end(horizon)
+                delay = batch_due - time.time()
+                if delay > 0:
+                    # Re-check at least every minute in case the wall clock jumps
+                    self._cond.wait(min(delay, 60))
+                    continue
+
+                now = time.time()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    ts, seq, client_name = heapq.heappop(self._heap)
+                    if self._live.get(client_name) == (ts, seq):
+                        del self._live[client_name]
+                        due.append(client_name)
+                if due:
+                    return due
+
+    def _run(self):
+        while True:
+            due = self._pop_due()
+            try:
+                self.on_expire(due)
+            except Exception as e:
+                print(f"💥 Expiry scheduler error: {e}")
+
+expiry_scheduler = ExpiryScheduler(lambda client_names: OpenVPNManager.auto_revoke_clients(client_names))
+
+# Rollup tables filled from finalized traffic_history rows:
+# (table, bucket expression or None for per-client totals)
+TRAFFIC_ROLLUPS = (
+    ('client_traffic_totals', None),
+    ('client_traffic_hourly', "strftime('%Y-%m-%d %H:00:00', session_end)"),
+    ('client_traffic_daily', "date(session_end)")
+)
+
+def _traffic_rollup_sql(table, bucket, where):
+    """INSERT ... SELECT upsert adding traffic_history rows matching where to table"""
+    if bucket is None:
+        return f'''
+            INSERT INTO {table}
+            (client_name, bytes_sent, bytes_received, duration_seconds, session_count, first_connection, last_activity)
+            SELECT client_name, SUM(COALESCE(bytes_sent, 0)), SUM(COALESCE(bytes_received, 0)),
+                   SUM(COALESCE(duration_seconds, 0)), COUNT(*), MIN(session_start), MAX(session_end)
+            FROM traffic_history
+            WHERE session_end IS NOT NULL AND {where}
+            GROUP BY client_name
+            ON CONFLICT(client_name) DO UPDATE SET
+                bytes_sent = bytes_sent + excluded.bytes_sent,
+                bytes_received = bytes_received + excluded.bytes_received,
+                duration_seconds = duration_seconds + excluded.duration_seconds,
+                session_count = session_count + excluded.session_count,
+                first_connection = CASE WHEN first_connection IS NULL OR excluded.first_connection < first_connection
+                                        THEN excluded.first_connection ELSE first_connection END,
+                last_activity = CASE WHEN last_activity IS NULL OR excluded.last_activity > last_activity
+                                     THEN excluded.last_activity ELSE last_activity END
+        '''
+    return f'''
+        INSERT INTO {table}
+        (client_name, bucket, bytes_sent, bytes_received, duration_seconds, session_count)
+        SELECT client_name, {bucket}, SUM(COALESCE(bytes_sent, 0)), SUM(COALESCE(bytes_received, 0)),
+               SUM(COALESCE(duration_seconds, 0)), COUNT(*)
+        FROM traffic_history
+        WHERE session_end IS NOT NULL AND {bucket} IS NOT NULL AND {where}
+        GROUP BY client_name, {bucket}
+        ON CONFLICT(client_name, bucket) DO UPDATE SET
+            bytes_sent = bytes_sent + excluded.bytes_sent,
+            bytes_received = bytes_received + excluded.bytes_received,
+            duration_seconds = duration_seconds + excluded.duration_seconds,
+            session_count = session_count + excluded.session_count
+    '''
+
+def apply_traffic_rollups(cursor, row_ids):
+    """Add just-finalized traffic_history rows (by id) to the rollup tables"""
+    row_ids = list(row_ids)
+    for start in range(0, len(row_ids), 500):
+        chunk = row_ids[start:start + 500]
+        where = f"id IN ({','.join('?' * len(chunk))})"
+        for table, bucket in TRAFFIC_ROLLUPS:
+            cursor.execute(_traffic_rollup_sql(table, bucket, where), chunk)
+
+def rebuild_traffic_rollups(cursor):
+    """Recompute all rollup tables from traffic_history"""
+    for table, bucket in TRAFFIC_ROLLUPS:
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(_traffic_rollup_sql(table, bucket, '1'))
+
+def delete_client_traffic(cursor, client_names):
+    """Remove the clients' rows from the rollup tables; returns the traffic_history rows deleted"""
+    deleted = 0
+    client_names = list(client_names)
+    for start in range(0, len(client_names), 500):
+        chunk = client_names[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'DELETE FROM traffic_history WHERE client_name IN ({placeholders})', chunk)
+        deleted += cursor.rowcount
+        for table, _ in TRAFFIC_ROLLUPS:
+            cursor.execute(f'DELETE FROM {table} WHERE client_name IN ({placeholders})', chunk)
+    return deleted
+
+class SessionWriter:
+    """Writes one tracking tick of session changes in a single transaction.
+
+    Keeps a client_name -> traffic_history.id map of open sessions
+    (session_end IS NULL) so active sessions are updated by primary key
+    instead of being looked up per client on every tick.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open_rows = None  # {client_name: traffic_history.id}, loaded lazily
+
+    def _load_open_rows(self, cursor):
+        cursor.execute('SELECT id, client_name FROM traffic_history WHERE session_end IS NULL ORDER BY id')
+        self._open_rows = {client_name: row_id for row_id, client_name in cursor.fetchall()}
+
+    def forget(self, client_name):
+        """Drop the cached open row of a client finalized or deleted outside the tracker"""
+        with self._lock:
+            if self._open_rows is not None:
+                self._open_rows.pop(client_name, None)
+
+    def reset(self):
+        """Reload the open row map from the database on the next tick"""
+        with self._lock:
+            self._open_rows = None
+
+    def write_tick(self, connected, updated, disconnected):
+        """Persist the deltas computed by track_client_sessions.
+
+        connected:    [(client_name, session_start)]
+        updated:      [(client_name, bytes_sent, bytes_received, duration_seconds,
+                        session_start, real_address, virtual_address, last_activity)]
+        disconnected: [(client_name, bytes_sent, bytes_received, duration_seconds,
+                        session_start, session_end, real_address, virtual_address, count_totals)]
+        """
+        if not (connected or updated or disconnected):
+            return
+
+        with self._lock:
+            conn = get_db_connection('sessions')
+            try:
+                cursor = conn.cursor()
+                if self._open_rows is None:
+                    self._load_open_rows(cursor)
+                current_time = datetime.now()
+
+                # Make sure every client touched this tick has a stats row
+                touched = {row[0] for row in connected}
+                touched.update(row[0] for row in updated)
+                touched.update(row[0] for row in disconnected)
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO client_stats
+                    (client_name, first_connection, last_connection, last_activity, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(name, current_time, current_time, current_time, current_time, current_time) for name in touched])
+
+                # Newly connected clients - mark as online
+                cursor.executemany('''
+                    UPDATE client_stats
+                    SET is_online = 1, current_session_start = ?, last_activity = ?, updated_at = ?
+                    WHERE client_name = ?
+                ''', [(session_start, current_time, current_time, name) for name, session_start in connected])
+
+                # Active sessions - update open rows by id, insert rows for new sessions
+                open_updates = []
+                for (name, bytes_sent, bytes_received, duration_seconds, session_start,
+                     real_address, virtual_address, last_activity) in updated:
+                    row_id = self._open_rows.get(name)
+                    if row_id is None:
+                        cursor.execute('''
+                            INSERT INTO traffic_history
+                            (client_name, bytes_sent, bytes_received, duration_seconds, session_start, session_end, real_address, virtual_address)
+                            VALUES (?, ?, ?, ?, ?, NULL, ?, ?)
+                        ''', (name, bytes_sent, bytes_received, duration_seconds, session_start, real_address, virtual_address))
+                        self._open_rows[name] = cursor.lastrowid
+                    else:
+                        open_updates.append((bytes_sent, bytes_received, duration_seconds,
+                                             real_address, virtual_address, row_id))
+                cursor.executemany('''
+                    UPDATE traffic_history
+                    SET bytes_sent = ?, bytes_received = ?, duration_seconds = ?,
+                        real_address = COALESCE(?, real_address),
+                        virtual_address = COALESCE(?, virtual_address),
+                        timestamp = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', open_updates)
+                cursor.executemany('''
+                    UPDATE client_stats
+                    SET last_activity = ?, updated_at = ?
+                    WHERE client_name = ?
+                ''', [(row[7], current_time, row[0]) for row in updated])
+
+                # Disconnected clients - close open rows and add to totals
+                finalized = []
+                finalized_ids = []
+                totals = []
+                for (name, bytes_sent, bytes_received, duration_seconds, session_start, session_end,
+                     real_address, virtual_address, count_totals) in disconnected:
+                    row_id = self._open_rows.pop(name, None)
+                    if row_id is None:
+                        cursor.execute('''
+                            INSERT INTO traffic_history
+                            (client_name, bytes_sent, bytes_received, duration_seconds, session_start, session_end, real_address, virtual_address)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', (name, bytes_sent, bytes_received, duration_seconds, session_start, session_end, real_address, virtual_address))
+                        finalized_ids.append(cursor.lastrowid)
+                    else:
+                        finalized.append((bytes_sent, bytes_received, duration_seconds, session_end,
+                                          real_address, virtual_address, row_id))
+                        finalized_ids.append(row_id)
+                    if not count_totals:
+                        bytes_sent = bytes_received = duration_seconds = 0
+                    totals.append((bytes_sent, bytes_received, duration_seconds,
+                                   session_end, session_end, current_time, name))
+                cursor.executemany('''
+                    UPDATE traffic_history
+                    SET bytes_sent = ?, bytes_received = ?, duration_seconds = ?,
+                        session_end = ?,
+                        real_address = COALESCE(?, real_address),
+                        virtual_address = COALESCE(?, virtual_address),
+                        timestamp = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', finalized)
+                apply_traffic_rollups(cursor, finalized_ids)
+                cursor.executemany('''
+                    UPDATE client_stats
+                    SET total_bytes_sent = total_bytes_sent + ?,
+                        total_bytes_received = total_bytes_received + ?,
+                        total_duration_seconds = total_duration_seconds + ?,
+                        session_count = session_count + 1,
+                        last_connection = ?,
+                        last_activity = ?,
+                        is_online = 0,
+                        current_session_start = NULL,
+                        updated_at = ?
+                    WHERE client_name = ?
+                ''', totals)
+
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                # Cached ids may point at rows that were just rolled back
+                self._open_rows = None
+                raise
+            finally:
+                conn.close()
+
+session_writer = SessionWriter()
+
+# Session tracking wakes on status file updates; this is the fallback poll interval
+SESSION_POLL_INTERVAL = 30
+# Pause after a status file event so OpenVPN can finish rewriting the file
+STATUS_EVENT_SETTLE_SECONDS = 0.5
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+
+class StatusFileWatcher:
+    """Wakes the session tracker when the OpenVPN status file changes.
+
+    Watches the status file's directory with inotify (through ctypes, Linux
+    only) so rewrites, atomic renames and re-creation are all seen. OpenVPN
+    keeps the status file open and rewrites it in place, so IN_MODIFY is
+    watched as well; wait() lets a burst of writes settle before returning.
+    The path is resolved again every SESSION_POLL_INTERVAL, so a status file
+    that appears at another candidate location after startup is picked up.
+    Without inotify wait() simply times out, which keeps the old polling.
+    """
+
+    def __init__(self, settle=STATUS_EVENT_SETTLE_SECONDS):
+        self.settle = settle
+        self.path = None
+        self.available = False
+        self.sequence = 0  # Bumped on every status file event
+        self._event = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def find_status_file():
+        """The status file get_active_connections reads (first existing candidate)"""
+        for status_file in STATUS_FILE_CANDIDATES:
+            if os.path.exists(status_file):
+                return os.path.abspath(status_file)
+        return None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Wake the tracker now (also used for management interface events)"""
+        self.sequence += 1
+        self._event.set()
+
+    def wait(self, timeout):
+        """Block until the status file changes or timeout passes; True if woken by a change"""
+        fired = self._event.wait(timeout)
+        if fired:
+            time.sleep(self.settle)
+            self._event.clear()
+        return fired
+
+    def _resolve(self):
+        return self.find_status_file() or os.path.abspath(CUSTOM_STATUS_FILE)
+
+    def _run(self):
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError):
+            print("⚠️ inotify is not available, session tracking polls every "
+                  f"{SESSION_POLL_INTERVAL}s")
+            return
+
+        inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+        while True:
+            fd = -1
+            try:
+                path = self._resolve()
+                directory = os.path.dirname(path)
+                if not os.path.isdir(directory):
+                    time.sleep(SESSION_POLL_INTERVAL)
+                    continue
+
+                fd = inotify_init1(os.O_CLOEXEC)
+                if fd < 0 or inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                    raise OSError(ctypes.get_errno(), 'inotify watch failed')
+
+                self.path = path
+                self.available = True
+                print(f"👀 STATUS WATCH: {path}")
+                target = os.fsencode(os.path.basename(path))
+                watching = True
+                next_resolve = time.monotonic() + SESSION_POLL_INTERVAL
+                while watching:
+                    remaining = next_resolve - time.monotonic()
+                    if remaining <= 0:
+                        # Switch over if another candidate resolves now (e.g. it did not exist at startup)
+                        watching = self._resolve() == path
+                        next_resolve = time.monotonic() + SESSION_POLL_INTERVAL
+                        continue
+                    if not select.select([fd], [], [], remaining)[0]:
+                        continue
+                    buffer = os.read(fd, 4096)
+                    offset = 0
+                    while offset + 16 <= len(buffer):
+                        _, event_mask, _, name_length = struct.unpack_from('iIII', buffer, offset)
+                        name = buffer[offset + 16:offset + 16 + name_length].rstrip(b'\0')
+                        offset += 16 + name_length
+                        if event_mask & IN_IGNORED:
+                            # Directory removed or unmounted, resolve the path again
+                            watching = False
+                        elif name == target:
+                            self.notify()
+            except Exception as e:
+                print(f"⚠️ Status file watch error: {e}")
+                self.available = False
+                time.sleep(SESSION_POLL_INTERVAL)
+            finally:
+                if fd >= 0:
+                    os.close(fd)
+
+    def digest(self):
+        """Hash of the connection rows in the status file.
+
+        Returns None when there is no readable, complete status file (the
+        caller then tracks unconditionally). TIME/Updated lines change on
+        every rewrite and are left out so an idle server hashes the same.
+        """
+        path = self.find_status_file()
+        if path is None:
+            return None
+        for _ in range(3):
+            try:
+                with open(path, 'rb') as f:
+                    content = f.read()
+            except OSError:
+                return None
+            if b'\nEND' in content:
+                break
+            time.sleep(self.settle)  # Caught mid-rewrite
+        else:
+            return None
+
+        digest = hashlib.sha1()
+        for line in content.splitlines():
+            if line.startswith(b'TIME,') or line.startswith(b'Updated,'):
+                continue
+            digest.update(line)
+            digest.update(b'\n')
+        return digest.hexdigest()
+
+status_watcher = StatusFileWatcher()
 
 def track_client_sessions():
-    """Background task to track and save client sessions"""
+    """Background task to track and save client sessions; False if the tick was not saved"""
     try:
         current_connections = OpenVPNManager.get_active_connections()
         current_clients = {conn['name']: conn for conn in current_connections}
+        current_time = datetime.now()
+        
+        # Deltas for this tick, written together at the end
+        connected = []
+        updated = []
+        disconnected = []
+        changes = []
         
-        # Check for new connections
+        # Check for new connections (added to active_sessions once the tick is written, so a failed write is retried)
+        new_sessions = {}
         for client_name, conn in current_clients.items():
             if client_name not in active_sessions:
                 # New client connected
-                session_start = datetime.now()
-                active_sessions[client_name] = {
-                    'start_time': session_start,
+                new_sessions[client_name] = {
+                    'start_time': current_time,
                     'initial_sent': int(conn.get('bytes_sent', 0)),
                     'initial_received': int(conn.get('bytes_received', 0)),
                     'real_address': conn.get('real_address', 'Unknown'),
                     'virtual_address': conn.get('virtual_address', 'Unknown')
                 }
-                
-                # Update client stats - mark as online
-                OpenVPNManager.update_client_stats(
-                    client_name=client_name,
-                    session_start=session_start,
-                    is_connection=True
-                )
+                connected.append((client_name, current_time))
+                changes.append(('connect', client_name, {
+                    'real_address': conn.get('real_address', 'Unknown'),
+                    'virtual_address': conn.get('virtual_address', 'Unknown')
+                }))
                 
                 print(f"📊 TRACKING: {client_name} connected - Initial: {int(conn.get('bytes_sent', 0))/1024/1024:.2f}MB sent, {int(conn.get('bytes_received', 0))/1024/1024:.2f}MB received")
         
-        # Update current session data for active clients and SAVE DATA EVERY 30 SECONDS
-        for client_name in list(active_sessions.keys()):
-            if client_name in current_clients:
-                # Update current traffic data
-                current_conn = current_clients[client_name]
-                current_sent = int(current_conn.get('bytes_sent', 0))
-                current_received = int(current_conn.get('bytes_received', 0))
-                
-                active_sessions[client_name]['current_sent'] = current_sent
-                active_sessions[client_name]['current_received'] = current_received
-                
-                # Calculate session traffic from start
-                session_data = active_sessions[client_name]
-                session_start = session_data['start_time']
-                current_time = datetime.now()
-                duration_seconds = int((current_time - session_start).total_seconds())
-                
-                session_sent = max(0, current_sent - session_data['initial_sent'])
-                session_received = max(0, current_received - session_data['initial_received'])
-                
-                # SAVE/UPDATE CURRENT DATA TO DATABASE EVERY 30 SECONDS
-                print(f"💾 SAVING DATA: {client_name} - Duration: {duration_seconds}s, Sent: {session_sent/1024/1024:.2f}MB, Received: {session_received/1024/1024:.2f}MB")
-                
-                # Update existing session record instead of creating new one
-                OpenVPNManager.update_active_session(
-                    client_name=client_name,
-                    bytes_sent=session_sent,
-                    bytes_received=session_received,
-                    duration_seconds=duration_seconds,
-                    session_start=session_start.isoformat(),
-                    session_end=None,  # Keep NULL for active sessions
-                    real_address=session_data.get('real_address', 'Unknown'),
-                    virtual_address=session_data.get('virtual_address', 'Unknown')
-                )
-                
-                # Update last activity in stats
-                OpenVPNManager.update_client_stats(
-                    client_name=client_name,
-                    last_activity=current_time,
-                    is_activity_update=True
-                )
+        # Update current session data for active clients
+        for client_name, session_data in itertools.chain(active_sessions.items(), new_sessions.items()):
+            current_conn = current_clients.get(client_name)
+            if current_conn is None:
+                continue
+            
+            current_sent = int(current_conn.get('bytes_sent', 0))
+            current_received = int(current_conn.get('bytes_received', 0))
+            if 'current_sent' in session_data and (
+                    session_data['current_sent'] != current_sent or session_data['current_received'] != current_received):
+                changes.append(('traffic_update', client_name, {
+                    'bytes_sent': max(0, current_sent - session_data['initial_sent']),
+                    'bytes_received': max(0, current_received - session_data['initial_received'])
+                }))
+            session_data['current_sent'] = current_sent
+            session_data['current_received'] = current_received
+            
+            # Calculate session traffic from start
+            session_start = session_data['start_time']
+            updated.append((
+                client_name,
+                max(0, current_sent - session_data['initial_sent']),
+                max(0, current_received - session_data['initial_received']),
+                int((current_time - session_start).total_seconds()),
+                session_start.isoformat(),
+                session_data.get('real_address', 'Unknown'),
+                session_data.get('virtual_address', 'Unknown'),
+                current_time
+            ))
         
         # Check for disconnected clients
-        disconnected_clients = []
-        for client_name in active_sessions:
-            if client_name not in current_clients:
-                disconnected_clients.append(client_name)
-        
-        # Save sessions for disconnected clients
+        disconnected_clients = [name for name in active_sessions if name not in current_clients]
         for client_name in disconnected_clients:
+            # Left in active_sessions until the tick is written, so a failed write is retried
             session_data = active_sessions[client_name]
             session_start = session_data['start_time']
-            session_end = datetime.now()
-            duration_seconds = int((session_end - session_start).total_seconds())
+            duration_seconds = int((current_time - session_start).total_seconds())
             
-            # Calculate actual traffic used during this session
+            # Calculate session traffic (difference from initial)
             final_sent = session_data.get('current_sent', session_data['initial_sent'])
             final_received = session_data.get('current_received', session_data['initial_received'])
-            
-            # Calculate session traffic (difference from initial)
             session_sent = max(0, final_sent - session_data['initial_sent'])
             session_received = max(0, final_received - session_data['initial_received'])
             
-            # Only save if session was longer than 10 seconds
-            if duration_seconds > 10:
+            # Only count towards totals if session was longer than 10 seconds
+            count_totals = duration_seconds > 10
+            if count_totals:
                 print(f"💾 DISCONNECTED: {client_name} - Session: {duration_seconds}s, {session_sent/1024/1024:.2f}MB sent, {session_received/1024/1024:.2f}MB received")
-                
-                # Finalize active session by setting session_end
-                OpenVPNManager.finalize_session(
-                    client_name=client_name,
-                    bytes_sent=session_sent,
-                    bytes_received=session_received,
-                    duration_seconds=duration_seconds,
-                    session_start=session_start.isoformat(),
-                    session_end=session_end.isoformat(),
-                    real_address=session_data.get('real_address', 'Unknown'),
-                    virtual_address=session_data.get('virtual_address', 'Unknown')
-                )
-                
-                # Update aggregated client stats
-                OpenVPNManager.update_client_stats(
-                    client_name=client_name,
-                    session_end=session_end,
-                    bytes_sent=session_sent,
-                    bytes_received=session_received,
-                    duration_seconds=duration_seconds,
-                    is_disconnection=True
-                )
             else:
                 print(f"⏭️ SKIPPED: {client_name} - Session too short ({duration_seconds}s)")
-                # Still finalize the session even if short
-                OpenVPNManager.finalize_session(
-                    client_name=client_name,
-                    bytes_sent=session_sent,
-                    bytes_received=session_received,
-                    duration_seconds=duration_seconds,
-                    session_start=session_start.isoformat(),
-                    session_end=session_end.isoformat(),
-                    real_address=session_data.get('real_address', 'Unknown'),
-                    virtual_address=session_data.get('virtual_address', 'Unknown')
-                )
-                # Still mark as offline
-                OpenVPNManager.update_client_stats(
-                    client_name=client_name,
-                    session_end=session_end,
-                    is_disconnection=True
-                )
             
-            del active_sessions[client_name]
+            disconnected.append((
+                client_name, session_sent, session_received, duration_seconds,
+                session_start.isoformat(), current_time.isoformat(),
+                session_data.get('real_address', 'Unknown'),
+                session_data.get('virtual_address', 'Unknown'),
+                count_totals
+            ))
+            changes.append(('disconnect', client_name, {
+                'bytes_sent': session_sent,
+                'bytes_received': session_received,
+                'duration_seconds': duration_seconds
+            }))
+        
+        session_writer.write_tick(connected, updated, disconnected)
+        active_sessions.update(new_sessions)
+        for client_name in disconnected_clients:
+            active_sessions.pop(client_name, None)
+        change_log.record_many(changes)
+        if updated or disconnected:
+            print(f"💾 SAVED SESSIONS: {len(updated)} active, {len(connected)} connected, {len(disconnected)} disconnected")
+        return True
             
     except Exception as e:
         print(f"💥 Error in track_client_sessions: {e}")
         import traceback
         traceback.print_exc()
+        return False
 
 def check_expired_temporary_clients():
     """Check for expired temporary clients and process them"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Find expired clients
@@ -387,45 +1049,64 @@ def check_expired_temporary_clients():
             print(f"⏰ Found {len(expired_clients)} expired temporary clients")
             for client_name, revoke_at in expired_clients:
                 print(f"🔄 Processing expired client: {client_name} (expired at {revoke_at})")
-                OpenVPNManager.auto_revoke_client(client_name)
+            OpenVPNManager.auto_revoke_clients([client_name for client_name, _ in expired_clients])
         
     except Exception as e:
         print(f"Error checking expired temporary clients: {e}")
 
 def start_session_tracking():
-    """Start background session tracking"""
+    """Start background session tracking, woken by status file updates"""
     def run_tracking():
-        check_counter = 0
-        metrics_counter = 0
+        # Periodic jobs run on wall-clock deadlines, so status file events do not speed them up
+        next_metrics = time.monotonic() + 120
+        next_check = time.monotonic() + 300
+        next_compact = time.monotonic() + 1800
+        last_digest = None
         while True:
             try:
-                track_client_sessions()
+                if management_client.is_live():
+                    # Live table from the management interface, nothing to compare against
+                    track_client_sessions()
+                    last_digest = None
+                else:
+                    digest = status_watcher.digest()
+                    if digest is None or digest != last_digest:
+                        # A failed tick is retried on the next pass even if the file is unchanged
+                        last_digest = digest if track_client_sessions() else None
                 
-                # Save system metrics every 2 minutes (4 cycles * 30 seconds)
-                metrics_counter += 1
-                if metrics_counter >= 4:
+                now = time.monotonic()
+                # Save system metrics every 2 minutes
+                if now >= next_metrics:
                     OpenVPNManager.save_system_metrics()
                     print(f"💾 SYSTEM METRICS: Saved system metrics to database")
-                    metrics_counter = 0
+                    next_metrics = now + 120
                 
-                # Check for expired temporary clients every 5 minutes (10 cycles * 30 seconds)
-                check_counter += 1
-                if check_counter >= 10:
+                # Check for expired temporary clients every 5 minutes
+                if now >= next_check:
                     check_expired_temporary_clients()
-                    check_counter = 0
+                    next_check = now + 300
                 
-                time.sleep(30)  # Check every 30 seconds
+                # Compact old system metrics every 30 minutes
+                if now >= next_compact:
+                    OpenVPNManager.compact_system_metrics()
+                    next_compact = now + 1800
+                
+                # Sleep until the status file changes, polling as a fallback
+                timeout = max(0, min(SESSION_POLL_INTERVAL, next_metrics - now))
+                if status_watcher.wait(timeout):
+                    probe_cache.invalidate('get_active_connections')
             except Exception as e:
                 print(f"Session tracking error: {e}")
                 time.sleep(60)  # Wait longer on error
     
+    status_watcher.start()
     tracking_thread = threading.Thread(target=run_tracking, daemon=True)
     tracking_thread.start()
 
 def restore_temporary_clients():
     """Restore temporary clients from database on startup"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -439,7 +1120,7 @@ def restore_temporary_clients():
         
         current_time = datetime.now()
         restored_count = 0
-        expired_count = 0
+        expired_clients = []
         
         for client_name, revoke_at_str, hours, status in rows:
             try:
@@ -448,35 +1129,24 @@ def restore_temporary_clients():
                 
                 # Check if already expired
                 if revoke_time <= current_time:
-                    OpenVPNManager.auto_revoke_client(client_name)
-                    expired_count += 1
+                    expired_clients.append(client_name)
                 else:
-                    # Calculate remaining time
-                    time_left = revoke_time - current_time
-                    seconds_left = int(time_left.total_seconds())
-                    
-                    if seconds_left > 0:
-                        # Create new timer
-                        timer = threading.Timer(
-                            seconds_left,
-                            OpenVPNManager.auto_revoke_client,
-                            args=[client_name]
-                        )
-                        
-                        # Store in temporary clients tracking
-                        temporary_clients[client_name] = {
-                            'revoke_time': revoke_time,
-                            'timer': timer,
-                            'hours': hours
-                        }
-                        
-                        # Start the timer
-                        timer.start()
-                        
-                        restored_count += 1
+                    # Store in temporary clients tracking and queue for auto-revoke
+                    temporary_clients[client_name] = {
+                        'revoke_time': revoke_time,
+                        'hours': hours
+                    }
+                    expiry_scheduler.schedule(client_name, revoke_time)
+                    restored_count += 1
                     
             except Exception as e:
                 pass
+        
+        # Revoke everything that expired while we were down in one batch
+        OpenVPNManager.auto_revoke_clients(expired_clients)
+        
+        if restored_count or expired_clients:
+            print(f"⏰ Temporary clients: {restored_count} scheduled, {len(expired_clients)} expired while offline")
             
     except Exception as e:
         pass
@@ -485,7 +1155,7 @@ def restore_temporary_clients():
 def restore_traffic_history():
     """Restore active sessions from database on startup"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Find active sessions (those without session_end)
@@ -568,9 +1238,64 @@ users = {
     "admin": generate_password_hash("admin123")  # Логин: admin, Пароль: admin123
 }
 
+# Verified Basic auth credentials are trusted for this long before hashing them again
+AUTH_CACHE_TTL = 120
+AUTH_CACHE_MAX_ENTRIES = 256
+
+class CredentialCache:
+    """Remembers recently verified Basic auth credentials.
+
+    Browsers resend the password with every request, and check_password_hash
+    (PBKDF2) costs tens of milliseconds each time. Entries are keyed by an
+    HMAC of username and password under a per-process random key, so the
+    plaintext is never kept, and record the password hash they were checked
+    against: changing a user's password invalidates them. Only successful
+    checks are cached, so guessing passwords still pays the full hash cost.
+    Past max_entries the least recently used entries are dropped.
+    """
+
+    def __init__(self, ttl=AUTH_CACHE_TTL, max_entries=AUTH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._key = os.urandom(32)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # {digest: (username, password_hash, expires_at)}
+
+    def _digest(self, username, password):
+        return hmac.new(self._key, f"{username}\0{password}".encode('utf-8'), hashlib.sha256).digest()
+
+    def check(self, username, password, password_hash):
+        """True if these credentials were verified against password_hash within the TTL"""
+        digest = self._digest(username, password)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return False
+            if entry[0] != username or entry[1] != password_hash or entry[2] <= time.monotonic():
+                del self._entries[digest]
+                return False
+            self._entries.move_to_end(digest)
+            return True
+
+    def remember(self, username, password, password_hash):
+        digest = self._digest(username, password)
+        with self._lock:
+            self._entries[digest] = (username, password_hash, time.monotonic() + self.ttl)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+credential_cache = CredentialCache()
+
 @auth.verify_password
 def verify_password(username, password):
-    if username in users and check_password_hash(users.get(username), password):
+    password_hash = users.get(username)
+    if password_hash is None or password is None:
+        return None
+    if credential_cache.check(username, password, password_hash):
+        return username
+    if check_password_hash(password_hash, password):
+        credential_cache.remember(username, password, password_hash)
         return username
 
 # Пути к важным файлам OpenVPN
@@ -579,32 +1304,727 @@ EASYRSA_DIR = '/etc/openvpn/server/easy-rsa'
 INDEX_FILE = '/etc/openvpn/server/easy-rsa/pki/index.txt'
 SCRIPT_PATH = './openvpn-install.sh'
 
+# Held only around the steps that rewrite shared PKI files (easyrsa
+# sign/revoke/gen-crl, the in-process signer, index.txt purges)
+pki_lock = threading.RLock()
+
+# Directory holding the generated <client>.ovpn files (the directory the app starts in)
+CLIENT_CONFIG_DIR = os.path.abspath('.')
+
+def client_config_file(client_name):
+    """Absolute path of a client's .ovpn file"""
+    return os.path.join(CLIENT_CONFIG_DIR, f'{client_name}.ovpn')
+
+class PKILocks:
+    """Per-client locks for PKI operations, which run easyrsa with cwd=EASYRSA_DIR instead of chdir().
+
+    Every client name has its own lock, so operations on different clients
+    run in parallel; the steps that rewrite index.txt, serial or crl.pem
+    additionally take pki_lock.
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._clients = {}
+
+    @contextmanager
+    def client(self, *client_names):
+        """Hold the locks of client_names (taken in sorted order to avoid deadlocks)"""
+        names = sorted(set(client_names))
+        with self._guard:
+            locks = []
+            for name in names:
+                entry = self._clients.setdefault(name, [threading.RLock(), 0])
+                entry[1] += 1
+                locks.append(entry[0])
+
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+            with self._guard:
+                for name in names:
+                    entry = self._clients[name]
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self._clients[name]
+
+pki_locks = PKILocks()
+
+def with_pki_lock(func):
+    """Decorator running a PKI operation under the per-client locks of its first argument (a name or a list of names)"""
+    @functools.wraps(func)
+    def wrapper(client_names, *args, **kwargs):
+        names = [client_names] if isinstance(client_names, str) else client_names
+        with pki_locks.client(*(re.sub(r'[^0-9a-zA-Z_-]', '_', name) for name in names)):
+            return func(client_names, *args, **kwargs)
+    return wrapper
+
 # Пользовательский путь к файлу статуса (можно настроить)
 CUSTOM_STATUS_FILE = '/var/log/openvpn/openvpn-status.log'
 
+# Possible status file locations, in lookup order
+STATUS_FILE_CANDIDATES = [
+    CUSTOM_STATUS_FILE,  # Пользовательский путь в первую очередь
+    '/var/log/openvpn/openvpn-status.log',
+    '/etc/openvpn/server/openvpn-status.log',
+    '/tmp/openvpn-status.log',
+    '/run/openvpn-server/status-server.log',
+    '/var/log/openvpn-status.log',
+    '/etc/openvpn/openvpn-status.log',
+    '/home/openvpn-status.log',
+    './openvpn-status.log',
+    '/usr/local/etc/openvpn/openvpn-status.log'
+]
+
 # Configuration file paths
 SERVER_CONF_PATH = '/etc/openvpn/server/server.conf'
 CLIENT_COMMON_PATH = '/etc/openvpn/server/client-common.txt'
+TLS_CRYPT_KEY_PATH = '/etc/openvpn/server/tc.key'
+
+# Matches the CN component of an index.txt distinguished name (/CN=name, CN = name)
+CN_PATTERN = re.compile(r'CN\s*=\s*([^/,]+)')
+
+class ClientRecord:
+    """Parsed index.txt row for a single client certificate"""
+    __slots__ = ('name', 'status', 'expiry', 'formatted_expiry', 'serial',
+                 'revoke_date', 'has_config', 'group')
+
+    def __init__(self, name, status, expiry, formatted_expiry, serial, revoke_date):
+        self.name = name
+        self.status = status
+        self.expiry = expiry
+        self.formatted_expiry = formatted_expiry
+        self.serial = serial
+        self.revoke_date = revoke_date
+        self.has_config = False
+        self.group = ''
+
+    def expiry_info(self, today):
+        """Return (days_until_expiry, expiry_status) relative to today"""
+        if self.expiry is None:
+            return None, 'unknown'
+
+        days_until_expiry = (self.expiry - today).days
+        if days_until_expiry < 0:
+            expiry_status = 'expired'
+        elif days_until_expiry == 0:
+            expiry_status = 'expires_today'
+        elif days_until_expiry <= 1:
+            expiry_status = 'expiring_very_soon'
+        elif days_until_expiry <= 7:
+            expiry_status = 'expiring_soon'
+        elif days_until_expiry <= 30:
+            expiry_status = 'expiring_in_month'
+        elif days_until_expiry <= 90:
+            expiry_status = 'expiring_in_3_months'
+        else:
+            expiry_status = 'valid'
+        return days_until_expiry, expiry_status
+
+    def to_dict(self, today):
+        days_until_expiry, expiry_status = self.expiry_info(today)
+        return {
+            'name': self.name,
+            'status': self.status,
+            'expiry_date': self.formatted_expiry,
+            'days_until_expiry': days_until_expiry,
+            'expiry_status': expiry_status,
+            'serial': self.serial,
+            'has_config': self.has_config,
+            'revoke_date': self.revoke_date,
+            'group': self.group,
+            'profile': 'standard'  # Default profile
+        }
+
+# Paginated client queries (/api/clients?offset=&limit=&sort=...)
+CLIENT_SORT_KEYS = ('name', 'expiry', 'status', 'group', 'last_activity')
+CLIENT_QUERY_DEFAULT_LIMIT = 50
+CLIENT_QUERY_MAX_LIMIT = 1000
+
+class ClientRegistry:
+    """In-process cache of parsed index.txt records.
+
+    index.txt is only re-read when its (mtime, size, inode) signature changes;
+    otherwise listing clients costs a single stat call. Group assignments are
+    loaded with one query and config presence with one directory scan. Sort
+    orders and filter sets for paginated queries are built once per change.
+    """
+
+    def __init__(self, index_file=INDEX_FILE, config_dir=CLIENT_CONFIG_DIR):
+        self.index_file = index_file
+        self.config_dir = config_dir
+        self._lock = threading.Lock()
+        self._signature = None
+        self._records = []
+        self._groups_loaded = False
+        self._version = 0
+        self._indexes = None
 
-class OpenVPNManager:
-    @staticmethod
-    def is_openvpn_installed():
-        """Check if OpenVPN is installed"""
-        return os.path.exists(f'{OPENVPN_DIR}/server.conf')
-    
     @staticmethod
-    def get_server_status():
-        """Get OpenVPN server status"""
+    def parse_index_line(line):
+        """Parse one index.txt line into a ClientRecord (None for non-client rows)"""
+        line = line.strip()
+        if not line or line.startswith('#'):
+            return None
+
+        parts = line.split('\t')
+        if len(parts) < 6:
+            return None
+
+        # Format: status, expiry_date, revoke_date, serial_number, file_path, distinguished_name
+        status = parts[0].strip()
+        expiry_date = parts[1].strip()
+        revoke_date = parts[2].strip()
+        serial = parts[3].strip()
+        file_path = parts[4].strip()
+        dn_part = parts[5].strip()
+
+        # Extract client name from DN (Distinguished Name)
+        client_name = None
+        cn_match = CN_PATTERN.search(dn_part)
+        if cn_match:
+            client_name = cn_match.group(1).strip()
+
+        if not client_name and file_path:
+            # If CN extraction fails, try to get name from file path
+            for part in reversed(file_path.split('/')):
+                if part and part != 'unknown':
+                    client_name = part.replace('.pem', '').replace('.crt', '')
+                    break
+
+        if not client_name or client_name.lower() == 'server':  # Exclude server certificate
+            return None
+
+        # Format: YYMMDDHHMMSSZ -> readable date
+        expiry = None
+        formatted_expiry = 'N/A'
+        if expiry_date and len(expiry_date) >= 12:
+            try:
+                expiry = datetime(int('20' + expiry_date[:2]), int(expiry_date[2:4]), int(expiry_date[4:6])).date()
+                formatted_expiry = expiry.isoformat()
+            except ValueError:
+                formatted_expiry = expiry_date[:8]  # Fallback
+
+        formatted_revoke_date = None
+        if revoke_date and len(revoke_date) >= 12:
+            try:
+                formatted_revoke_date = (
+                    f"{int('20' + revoke_date[:2])}-{int(revoke_date[2:4]):02d}-{int(revoke_date[4:6]):02d} "
+                    f"{int(revoke_date[6:8]):02d}:{int(revoke_date[8:10]):02d}"
+                )
+            except ValueError:
+                formatted_revoke_date = revoke_date[:12]  # Fallback
+
+        return ClientRecord(
+            client_name,
+            'active' if status == 'V' else 'revoked',
+            expiry,
+            formatted_expiry,
+            serial,
+            formatted_revoke_date
+        )
+
+    def _load_groups(self):
+        groups = {}
         try:
-            result = subprocess.run(['systemctl', 'is-active', 'openvpn-server@server.service'], 
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute('SELECT client_name, group_name FROM client_groups')
+                groups = dict(cursor.fetchall())
+            finally:
+                conn.close()
+        except Exception:
+            pass  # Group info not critical
+        return groups
+
+    @staticmethod
+    def _scan_names(directory, suffix):
+        names = set()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(suffix):
+                        names.add(entry.name[:-len(suffix)])
+        except OSError:
+            pass
+        return names
+
+    def _load_config_names(self):
+        """Clients with a downloadable config: rendered from issued cert + key, or a stored .ovpn"""
+        pki_dir = os.path.dirname(self.index_file)
+        renderable = (ClientRegistry._scan_names(os.path.join(pki_dir, 'issued'), '.crt') &
+                      ClientRegistry._scan_names(os.path.join(pki_dir, 'private'), '.key'))
+        return renderable | ClientRegistry._scan_names(self.config_dir, '.ovpn')
+
+    def _refresh(self):
+        """Reload index.txt if its signature changed. Caller holds the lock."""
+        try:
+            st = os.stat(self.index_file)
+        except OSError:
+            self._signature = None
+            self._records = []
+            return
+
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if signature == self._signature and self._groups_loaded:
+            return
+
+        if signature != self._signature:
+            records = []
+            try:
+                with open(self.index_file, 'r') as f:
+                    for line in f:
+                        record = ClientRegistry.parse_index_line(line)
+                        if record is not None:
+                            records.append(record)
+            except Exception as e:
+                print(f"💥 Error reading client list: {e}")
+                return
+
+            config_names = self._load_config_names()
+            for record in records:
+                record.has_config = record.name in config_names
+            self._records = records
+            self._signature = signature
+
+        groups = self._load_groups()
+        for record in self._records:
+            record.group = groups.get(record.name, '')
+        self._groups_loaded = True
+        self._version += 1
+
+    def records(self):
+        """Return the current list of ClientRecord objects"""
+        with self._lock:
+            self._refresh()
+            return self._records
+
+    def version(self):
+        """Counter bumped whenever index.txt or the group assignments change"""
+        with self._lock:
+            self._refresh()
+            return self._version
+
+    def list_clients(self):
+        """Return client dictionaries in index.txt order"""
+        today = datetime.now().date()
+        return [record.to_dict(today) for record in self.records()]
+
+    def _build_indexes(self, today):
+        """Sorted orders and filter sets for query(). Caller holds the lock."""
+        key = (self._version, today)
+        if self._indexes is not None and self._indexes['key'] == key:
+            return self._indexes
+
+        records = self._records
+        positions = range(len(records))
+        expiry_statuses = [record.expiry_info(today)[1] for record in records]
+        indexes = {
+            'key': key,
+            'order': {
+                'name': sorted(positions, key=lambda i: records[i].name),
+                'expiry': sorted(positions, key=lambda i: (records[i].expiry is None, records[i].expiry or today, records[i].name)),
+                'status': sorted(positions, key=lambda i: (records[i].status, records[i].name)),
+                'group': sorted(positions, key=lambda i: (records[i].group == '', records[i].group, records[i].name))
+            },
+            'status': defaultdict(set),
+            'group': defaultdict(set),
+            'expiry_status': defaultdict(set)
+        }
+        for i, record in enumerate(records):
+            indexes['status'][record.status].add(i)
+            indexes['group'][record.group].add(i)
+            indexes['expiry_status'][expiry_statuses[i]].add(i)
+
+        self._indexes = indexes
+        return indexes
+
+    def query(self, offset=0, limit=50, sort='name', descending=False, status=None, group=None,
+              expiry_status=None, online=None, search=None, online_names=None, last_activity=None):
+        """Return (total_matches, page_of_records) for a filtered, sorted view.
+
+        Sorting and filtering on registry fields use indexes rebuilt only when
+        the records change (or the day rolls over). `online` filters against
+        online_names; sorting by 'last_activity' needs the last_activity map.
+        """
+        today = datetime.now().date()
+        online_names = online_names or set()
+        with self._lock:
+            self._refresh()
+            records = self._records
+            indexes = self._build_indexes(today)
+
+            if sort == 'last_activity':
+                last_activity = last_activity or {}
+                # Online clients count as the most recently active
+                order = sorted(range(len(records)), key=lambda i: (
+                    records[i].name in online_names,
+                    last_activity.get(records[i].name) or '',
+                    records[i].name
+                ), reverse=descending)
+                descending = False
+            else:
+                order = indexes['order'][sort]
+
+            allowed = None
+            for field, value in (('status', status), ('group', group), ('expiry_status', expiry_status)):
+                if value is not None:
+                    matches = indexes[field].get(value, set())
+                    allowed = matches if allowed is None else allowed & matches
+
+        if descending:
+            order = reversed(order)
+        if search:
+            search = search.lower()
+
+        total = 0
+        page = []
+        for i in order:
+            if allowed is not None and i not in allowed:
+                continue
+            record = records[i]
+            if online is not None and (record.name in online_names) != online:
+                continue
+            if search and search not in record.name.lower():
+                continue
+            if offset <= total < offset + limit:
+                page.append(record)
+            total += 1
+        return total, page
+
+    def invalidate(self):
+        """Force the next read to re-parse index.txt and reload groups"""
+        with self._lock:
+            self._signature = None
+            self._groups_loaded = False
+        probe_cache.invalidate('get_clients')
+
+    def invalidate_groups(self):
+        """Force the next read to reload group assignments only"""
+        with self._lock:
+            self._groups_loaded = False
+        probe_cache.invalidate('get_clients')
+
+client_registry = ClientRegistry()
+
+class ConfigRenderer:
+    """Assembles client .ovpn files on demand.
+
+    client-common.txt, the CA certificate and the tls-crypt key are the same
+    for every client, so they are cached and re-read only when their
+    (mtime, size, inode) signature changes. Rendering a config then reads
+    just the client certificate and key instead of storing a full copy of
+    the shared material per client.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shared = None
+
+    @staticmethod
+    def shared_files():
+        return [
+            (CLIENT_COMMON_PATH, 'client common config'),
+            (f'{EASYRSA_DIR}/pki/ca.crt', 'CA certificate'),
+            (TLS_CRYPT_KEY_PATH, 'TLS auth key')
+        ]
+
+    @staticmethod
+    def client_files(client_name):
+        return [
+            (f'{EASYRSA_DIR}/pki/issued/{client_name}.crt', 'client certificate'),
+            (f'{EASYRSA_DIR}/pki/private/{client_name}.key', 'client private key')
+        ]
+
+    @staticmethod
+    def _read(path):
+        with open(path, 'r') as f:
+            return f.read()
+
+    def missing_files(self, client_name):
+        """Descriptions of the files a config for client_name still lacks"""
+        return [f"{name} ({path})" for path, name in self.shared_files() + self.client_files(client_name)
+                if not os.path.exists(path)]
+
+    def shared(self):
+        """Return (common_config, ca_cert, tls_crypt_key), reloading whatever changed"""
+        paths = [path for path, _ in self.shared_files()]
+        signature = []
+        for path in paths:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size, st.st_ino))
+        signature = tuple(signature)
+
+        with self._lock:
+            if self._shared is not None and self._shared[0] == signature:
+                return self._shared[1]
+
+        parts = tuple(ConfigRenderer._read(path) for path in paths)
+        if not parts[0].strip():
+            raise ValueError("Client common config is empty")
+
+        with self._lock:
+            self._shared = (signature, parts)
+        return parts
+
+    def render(self, client_name):
+        """Return an iterator over the .ovpn text for client_name.
+
+        All files are read before the first chunk, so a missing certificate
+        raises here rather than in the middle of a streamed response.
+        """
+        common_config, ca_cert, tls_crypt = self.shared()
+        client_cert, client_key = [ConfigRenderer._read(path) for path, _ in self.client_files(client_name)]
+        return iter((
+            f"{common_config}\n<ca>\n", ca_cert,
+            "</ca>\n<cert>\n", client_cert,
+            "</cert>\n<key>\n", client_key,
+            "</key>\n<tls-crypt>\n", tls_crypt,
+            "</tls-crypt>\n"
+        ))
+
+    def render_text(self, client_name):
+        return ''.join(self.render(client_name))
+
+config_renderer = ConfigRenderer()
+
+class ZipStreamBuffer:
+    """Write-only sink for zipfile that hands out what was written so far.
+
+    It has no tell()/seek(), so zipfile writes entries with data descriptors
+    and never needs to go back; the archive can be sent while it is built.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_configs_zip(client_names):
+    """Yield a ZIP archive of the clients' .ovpn files, one entry at a time"""
+    buffer = ZipStreamBuffer()
+    missing = []
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for client_name in client_names:
+            try:
+                content = config_renderer.render_text(client_name)
+            except FileNotFoundError:
+                config_path = client_config_file(client_name)
+                if not os.path.exists(config_path):
+                    missing.append(client_name)
+                    continue
+                with open(config_path, 'r') as f:
+                    content = f.read()
+            except Exception as e:
+                missing.append(f"{client_name}: {e}")
+                continue
+
+            archive.writestr(f'{client_name}.ovpn', content)
+            yield buffer.drain()
+
+        if missing:
+            archive.writestr('MISSING.txt', ''.join(f'{name}\n' for name in missing))
+    yield buffer.drain()
+
+# Cross-request TTLs (seconds) for OpenVPNManager probes; 0 = per-request only
+PROBE_CACHE_TTLS = {
+    'get_server_status': 5,
+    'get_server_info': 0,  # Cached by ServerIdentityCache until server.conf/addresses change
+    'get_active_connections': 2,
+    'get_clients': 0,
+    'get_server_stats': 5
+}
+
+class ProbeCache:
+    """Memoizes expensive OpenVPNManager probes.
+
+    Inside a Flask request each probe runs at most once (results live on
+    flask.g); an optional TTL also shares results across requests and with
+    background threads. Hits return a shallow copy so callers can keep
+    mutating the dicts they get back.
+    """
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(ttls or {})
+        self._lock = threading.Lock()
+        self._shared = {}  # {key: (expires_at, value)}
+        self._stats = defaultdict(lambda: {'request_hits': 0, 'ttl_hits': 0, 'misses': 0})
+
+    def cached(self, func):
+        """Decorator for a probe; the TTL is looked up by function name"""
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            request_cache = self._request_cache()
+
+            if request_cache is not None and key in request_cache:
+                self._count(name, 'request_hits')
+                return ProbeCache._copy(request_cache[key])
+
+            ttl = self.ttls.get(name, 0)
+            if ttl > 0:
+                with self._lock:
+                    entry = self._shared.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self._count(name, 'ttl_hits')
+                    if request_cache is not None:
+                        request_cache[key] = entry[1]
+                    return ProbeCache._copy(entry[1])
+
+            self._count(name, 'misses')
+            value = func(*args, **kwargs)
+            if request_cache is not None:
+                request_cache[key] = value
+            if ttl > 0:
+                with self._lock:
+                    self._shared[key] = (time.monotonic() + ttl, value)
+            return ProbeCache._copy(value)
+
+        return wrapper
+
+    @staticmethod
+    def _request_cache():
+        if not has_request_context():
+            return None
+        if not hasattr(g, 'probe_cache'):
+            g.probe_cache = {}
+        return g.probe_cache
+
+    @staticmethod
+    def _copy(value):
+        if isinstance(value, list):
+            return [dict(item) if isinstance(item, dict) else item for item in value]
+        if isinstance(value, dict):
+            return dict(value)
+        return value
+
+    def _count(self, name, field):
+        with self._lock:
+            self._stats[name][field] += 1
+
+    def invalidate(self, *names):
+        """Drop cached results for the given probes (all probes if none given)"""
+        with self._lock:
+            for key in list(self._shared):
+                if not names or key[0] in names:
+                    del self._shared[key]
+        request_cache = self._request_cache()
+        if request_cache is not None:
+            for key in list(request_cache):
+                if not names or key[0] in names:
+                    del request_cache[key]
+
+    def stats(self):
+        """Hit/miss counters per probe"""
+        with self._lock:
+            result = {}
+            for name, counters in self._stats.items():
+                total = counters['request_hits'] + counters['ttl_hits'] + counters['misses']
+                result[name] = dict(counters)
+                result[name]['ttl_seconds'] = self.ttls.get(name, 0)
+                result[name]['hit_rate'] = round((total - counters['misses']) / total * 100, 1) if total else 0
+            return result
+
+probe_cache = ProbeCache(PROBE_CACHE_TTLS)
+
+class ServerIdentityCache:
+    """Caches the server identity (port, protocol, local IP) from get_server_info.
+
+    Finding the local IP can fork hostname/ip when server.conf has no 'local'
+    directive, so the result is kept until server.conf changes (stat
+    signature) or the host's interface addresses change (getifaddrs via
+    psutil, no subprocess).
+    """
+
+    def __init__(self, config_path=SERVER_CONF_PATH):
+        self.config_path = config_path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._info = None
+
+    def _current_signature(self):
+        try:
+            st = os.stat(self.config_path)
+            config_signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            config_signature = None
+
+        try:
+            addresses = tuple(sorted(
+                (interface, address.address)
+                for interface, interface_addresses in psutil.net_if_addrs().items()
+                for address in interface_addresses
+                if address.family in (socket.AF_INET, socket.AF_INET6)
+            ))
+        except Exception:
+            addresses = None
+
+        return (config_signature, addresses)
+
+    def get(self, loader):
+        """Return cached identity, calling loader() when the signature changed"""
+        signature = self._current_signature()
+        with self._lock:
+            if self._info is not None and signature == self._signature:
+                return dict(self._info)
+
+        info = loader()
+        with self._lock:
+            self._signature = signature
+            self._info = info
+        return dict(info)
+
+    def invalidate(self):
+        with self._lock:
+            self._info = None
+
+server_identity = ServerIdentityCache()
+
+class OpenVPNManager:
+    @staticmethod
+    def is_openvpn_installed():
+        """Check if OpenVPN is installed"""
+        return os.path.exists(f'{OPENVPN_DIR}/server.conf')
+    
+    @staticmethod
+    @probe_cache.cached
+    def get_server_status():
+        """Get OpenVPN server status"""
+        try:
+            result = subprocess.run(['systemctl', 'is-active', 'openvpn-server@server.service'], 
                                   capture_output=True, text=True)
             return result.stdout.strip() == 'active'
         except:
             return False
     
     @staticmethod
+    @probe_cache.cached
     def get_server_info():
         """Get server information from configuration"""
+        return server_identity.get(OpenVPNManager.probe_server_info)
+    
+    @staticmethod
+    def probe_server_info():
+        """Read server.conf and detect the local IP (may run hostname/ip)"""
         info = {}
         try:
             with open(f'{OPENVPN_DIR}/server.conf', 'r') as f:
@@ -676,175 +2096,30 @@ class OpenVPNManager:
         return info
     
     @staticmethod
+    @probe_cache.cached
     def get_clients():
         """Get list of all clients"""
-        clients = []
-        if not os.path.exists(INDEX_FILE):
-            return clients
-        
         try:
-            with open(INDEX_FILE, 'r') as f:
-                lines = f.readlines()
-            
-            for line_num, line in enumerate(lines, 1):
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                    
-                parts = line.split('\t')
-                
-                if len(parts) >= 6:
-                    # Format: status, expiry_date, revoke_date, serial_number, file_path, distinguished_name
-                    status = parts[0].strip()
-                    expiry_date = parts[1].strip()
-                    revoke_date = parts[2].strip() if parts[2].strip() else None
-                    serial = parts[3].strip() if len(parts) > 3 else ''
-                    file_path = parts[4].strip() if len(parts) > 4 else ''
-                    dn_part = parts[5].strip() if len(parts) > 5 else ''
-                    
-                    # Extract client name from DN (Distinguished Name)
-                    client_name = None
-                    
-                    # Try different CN patterns
-                    cn_patterns = [
-                        r'CN=([^/,]+)',  # Standard CN=name format
-                        r'/CN=([^/,]+)',  # With leading slash
-                        r'CN\s*=\s*([^/,]+)',  # With spaces
-                    ]
-                    
-                    for pattern in cn_patterns:
-                        cn_match = re.search(pattern, dn_part)
-                        if cn_match:
-                            client_name = cn_match.group(1).strip()
-                            break
-                    
-                    if not client_name:
-                        # If CN extraction fails, try to get name from file path
-                        if file_path:
-                            path_parts = file_path.split('/')
-                            for part in reversed(path_parts):
-                                if part and part != 'unknown':
-                                    client_name = part.replace('.pem', '').replace('.crt', '')
-                                    break
-                    
-                    if client_name and client_name.lower() != 'server':  # Exclude server certificate
-                        # Determine actual status
-                        cert_status = 'active' if status == 'V' else 'revoked'
-                        
-                        # Check if config file exists
-                        config_exists = os.path.exists(f'./{client_name}.ovpn')
-                        
-                        # Format expiry date and calculate days until expiry
-                        formatted_expiry = 'N/A'
-                        days_until_expiry = None
-                        expiry_status = 'unknown'
-                        
-                        if expiry_date and len(expiry_date) >= 12:
-                            try:
-                                # Format: YYMMDDHHMMSSZ -> readable date
-                                year = int('20' + expiry_date[:2])
-                                month = int(expiry_date[2:4])
-                                day = int(expiry_date[4:6])
-                                formatted_expiry = f"{year}-{month:02d}-{day:02d}"
-                                
-                                # Calculate days until expiry
-                                from datetime import datetime, date
-                                expiry_datetime = date(year, month, day)
-                                today = date.today()
-                                days_until_expiry = (expiry_datetime - today).days
-                                
-                                # Determine expiry status
-                                if days_until_expiry < 0:
-                                    expiry_status = 'expired'
-                                elif days_until_expiry == 0:
-                                    expiry_status = 'expires_today'
-                                elif days_until_expiry <= 1:
-                                    expiry_status = 'expiring_very_soon' 
-                                elif days_until_expiry <= 7:
-                                    expiry_status = 'expiring_soon'
-                                elif days_until_expiry <= 30:
-                                    expiry_status = 'expiring_in_month'
-                                elif days_until_expiry <= 90:
-                                    expiry_status = 'expiring_in_3_months'
-                                else:
-                                    expiry_status = 'valid'
-                                    
-                            except:
-                                formatted_expiry = expiry_date[:8]  # Fallback
-                        
-                        # Format revoke date
-                        formatted_revoke_date = None
-                        if revoke_date and len(revoke_date) >= 12:
-                            try:
-                                # Format: YYMMDDHHMMSSZ -> readable date
-                                year = int('20' + revoke_date[:2])
-                                month = int(revoke_date[2:4])
-                                day = int(revoke_date[4:6])
-                                hour = int(revoke_date[6:8])
-                                minute = int(revoke_date[8:10])
-                                formatted_revoke_date = f"{year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}"
-                            except:
-                                formatted_revoke_date = revoke_date[:12]  # Fallback
-                        
-                        # Get client group from database if available
-                        client_group = ''
-                        try:
-                            conn = sqlite3.connect(DATABASE_PATH)
-                            cursor = conn.cursor()
-                            cursor.execute('SELECT group_name FROM client_groups WHERE client_name = ?', (client_name,))
-                            result = cursor.fetchone()
-                            if result:
-                                client_group = result[0]
-                            conn.close()
-                        except Exception as e:
-                            pass  # Group info not critical
-                        
-                        client_info = {
-                            'name': client_name,
-                            'status': cert_status,
-                            'expiry_date': formatted_expiry,
-                            'days_until_expiry': days_until_expiry,
-                            'expiry_status': expiry_status,
-                            'serial': serial,
-                            'has_config': config_exists,
-                            'revoke_date': formatted_revoke_date,
-                            'group': client_group,
-                            'profile': 'standard'  # Default profile
-                        }
-                        
-                        clients.append(client_info)
-                        pass
-                    else:
-                        pass
-                else:
-                    pass
-                    
+            return client_registry.list_clients()
         except Exception as e:
             print(f"💥 Error reading client list: {e}")
             import traceback
             traceback.print_exc()
-        
-        return clients
+            return []
     
     @staticmethod
+    @probe_cache.cached
     def get_active_connections():
-        """Parse OpenVPN status file to get active client connections"""
+        """Get active client connections from the management interface, falling back to the status file"""
+        connections = management_client.get_connections()
+        if connections is not None:
+            return connections
+
         active_connections = []
         
         try:
             # List of possible status file locations
-            status_files = [
-                CUSTOM_STATUS_FILE,  # Пользовательский путь в первую очередь
-                '/var/log/openvpn/openvpn-status.log',
-                '/etc/openvpn/server/openvpn-status.log',  
-                '/tmp/openvpn-status.log',
-                '/run/openvpn-server/status-server.log',
-                '/var/log/openvpn-status.log',
-                '/etc/openvpn/openvpn-status.log',
-                '/home/openvpn-status.log',
-                './openvpn-status.log',
-                '/usr/local/etc/openvpn/openvpn-status.log'
-            ]
+            status_files = STATUS_FILE_CANDIDATES
             
             status_content = None
             for status_file in status_files:
@@ -864,39 +2139,72 @@ class OpenVPNManager:
                     if not line:
                         continue
                         
-                    # Parse CLIENT_LIST format: CLIENT_LIST,name,real_ip:port,virtual_ip,ipv6,bytes_recv,bytes_sent,connected_since,time_t,username,client_id,peer_id,cipher
                     if line.startswith('CLIENT_LIST,'):
-                        parts = line.split(',')
-                        
-                        if len(parts) >= 8:
-                            client_name = parts[1].strip()
-                            real_address = parts[2].strip()
-                            virtual_address = parts[3].strip() if parts[3].strip() else 'N/A'
-                            bytes_received = parts[5].strip() if len(parts) > 5 else '0'
-                            bytes_sent = parts[6].strip() if len(parts) > 6 else '0'
-                            connected_since = parts[7].strip() if len(parts) > 7 else 'N/A'
-                            
-                            if client_name and client_name != 'UNDEF':
-                                # Calculate connection duration
-                                connection_duration = OpenVPNManager.calculate_connection_duration(connected_since)
-                                
-                                active_connections.append({
-                                    'name': client_name,
-                                    'real_address': real_address,
-                                    'virtual_address': virtual_address,
-                                    'bytes_received': bytes_received,
-                                    'bytes_sent': bytes_sent,
-                                    'connected_since': connected_since,
-                                    'connection_duration': connection_duration,
-                                    'duration_seconds': connection_duration.get('total_seconds', 0),
-                                    'duration_formatted': connection_duration.get('formatted', 'N/A')
-                                })
+                        client = OpenVPNManager.parse_client_list_fields(line.split(','))
+                        if client is not None:
+                            active_connections.append(OpenVPNManager.build_connection_entry(client))
                     
         except Exception as e:
             pass
         
         return active_connections
     
+    @staticmethod
+    def parse_client_list_fields(parts):
+        """Parse a split CLIENT_LIST row from the status file or "status 3" output"""
+        # CLIENT_LIST,name,real_ip:port,virtual_ip,ipv6,bytes_recv,bytes_sent,connected_since,time_t,username,client_id,peer_id,cipher
+        if len(parts) < 8:
+            return None
+        
+        client_name = parts[1].strip()
+        if not client_name or client_name == 'UNDEF':
+            return None
+        
+        return {
+            'name': client_name,
+            'real_address': parts[2].strip(),
+            'virtual_address': parts[3].strip() if parts[3].strip() else 'N/A',
+            'bytes_received': parts[5].strip() if len(parts) > 5 else '0',
+            'bytes_sent': parts[6].strip() if len(parts) > 6 else '0',
+            'connected_since': parts[7].strip() if len(parts) > 7 else 'N/A'
+        }
+    
+    @staticmethod
+    def build_connection_entry(client):
+        """Add connection duration fields to a parsed CLIENT_LIST entry"""
+        # Calculate connection duration
+        connection_duration = OpenVPNManager.calculate_connection_duration(client['connected_since'])
+        client['connection_duration'] = connection_duration
+        client['duration_seconds'] = connection_duration.get('total_seconds', 0)
+        client['duration_formatted'] = connection_duration.get('formatted', 'N/A')
+        return client
+    
+    @staticmethod
+    def get_last_activity(client_names=None):
+        """Map client name -> last_activity from client_stats (all clients, or just client_names)"""
+        activity = {}
+        try:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                if client_names is None:
+                    cursor.execute('SELECT client_name, last_activity FROM client_stats')
+                    activity.update(cursor.fetchall())
+                else:
+                    client_names = list(client_names)
+                    for start in range(0, len(client_names), 500):
+                        chunk = client_names[start:start + 500]
+                        cursor.execute(f'''
+                            SELECT client_name, last_activity FROM client_stats
+                            WHERE client_name IN ({','.join('?' * len(chunk))})
+                        ''', chunk)
+                        activity.update(cursor.fetchall())
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ Error reading last activity: {e}")
+        return {name: str(value) if value is not None else None for name, value in activity.items()}
+    
     @staticmethod
     def get_client_activity():
         """Get last activity for each client from logs"""
@@ -948,18 +2256,7 @@ class OpenVPNManager:
                         continue
             
             # Try to get connection info from status file as well
-            status_files = [
-                CUSTOM_STATUS_FILE,  # Пользовательский путь в первую очередь
-                '/var/log/openvpn/openvpn-status.log',
-                '/etc/openvpn/server/openvpn-status.log',  
-                '/tmp/openvpn-status.log',
-                '/run/openvpn-server/status-server.log',
-                '/var/log/openvpn-status.log',
-                '/etc/openvpn/openvpn-status.log',
-                '/home/openvpn-status.log',
-                './openvpn-status.log',
-                '/usr/local/etc/openvpn/openvpn-status.log'
-            ]
+            status_files = STATUS_FILE_CANDIDATES
             
             for status_file in status_files:
                 if os.path.exists(status_file):
@@ -986,6 +2283,7 @@ class OpenVPNManager:
         return activity_data
     
     @staticmethod
+    @probe_cache.cached
     def get_server_stats():
         """Get overall server statistics"""
         stats = {
@@ -1109,6 +2407,8 @@ class OpenVPNManager:
                 f.write(content)
             
             print(f"📝 Added status directive: status {status_file_path} 10")
+            server_identity.invalidate()
+            probe_cache.invalidate('get_server_info')
             
             # Restart OpenVPN service to apply changes
             print("🔄 Restarting OpenVPN service...")
@@ -1133,8 +2433,12 @@ class OpenVPNManager:
             return False, f"Error enabling status file: {str(e)}"
     
     @staticmethod
-    def add_client_direct(client_name, expiry_days=3650, client_group='', client_profile='standard'):
-        """Add client directly using EasyRSA commands with group and profile support"""
+    @with_pki_lock
+    def add_client_direct(client_name, expiry_days=3650, client_group='', client_profile='standard', key=None):
+        """Add client directly using EasyRSA commands with group and profile support
+
+        key: optional pre-generated private key to sign instead of taking one from keypair_pool
+        """
         try:
             clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
             
@@ -1155,22 +2459,47 @@ class OpenVPNManager:
             if not os.path.exists(easyrsa_script):
                 return False, f"EasyRSA script not found: {easyrsa_script}"
             
-            # Change to EasyRSA directory
-            old_cwd = os.getcwd()
-            os.chdir(EASYRSA_DIR)
+            # Clean up any existing intermediate files for this client
+            cleanup_success, cleanup_msg = OpenVPNManager.cleanup_client_files(clean_name)
             
-            try:
-                # Clean up any existing intermediate files for this client
-                cleanup_success, cleanup_msg = OpenVPNManager.cleanup_client_files(clean_name, old_cwd)
-                
-                # Create client certificate
-                cmd = ['./easyrsa', '--batch', f'--days={expiry_days}', 'build-client-full', clean_name, 'nopass']
+            # Create client certificate: sign a pre-generated key when the pool has one
+            signed_in_process = False
+            if pki_signer.is_enabled():
+                try:
+                    pki_signer.issue(clean_name, expiry_days, key=key if key is not None else keypair_pool.claim())
+                    signed_in_process = True
+                except Exception as e:
+                    print(f"⚠️ In-process signing failed, falling back to EasyRSA: {e}")
+                    OpenVPNManager.cleanup_client_files(clean_name)
+            
+            if not signed_in_process:
+                full_cmd = ['./easyrsa', '--batch', f'--days={expiry_days}', 'build-client-full', clean_name, 'nopass']
+                cmd = full_cmd
+                pooled_key = key if key is not None else keypair_pool.claim()
+                if pooled_key is not None:
+                    try:
+                        KeypairPool.write_request(pooled_key, clean_name, os.path.join(EASYRSA_DIR, 'pki'))
+                        cmd = ['./easyrsa', '--batch', f'--days={expiry_days}', 'sign-req', 'client', clean_name]
+                    except Exception as e:
+                        print(f"⚠️ Could not use pooled key: {e}")
+                        pooled_key = None
                 print(f"🔧 Running command: {' '.join(cmd)}")
                 
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True, text=True, timeout=60
-                )
+                with pki_lock:
+                    result = subprocess.run(
+                        cmd,
+                        capture_output=True, text=True, timeout=60, cwd=EASYRSA_DIR
+                    )
+                
+                if result.returncode != 0 and pooled_key is not None:
+                    print(f"🔄 sign-req failed, falling back to build-client-full...")
+                    OpenVPNManager.cleanup_client_files(clean_name)
+                    cmd = full_cmd
+                    with pki_lock:
+                        result = subprocess.run(
+                            cmd,
+                            capture_output=True, text=True, timeout=60, cwd=EASYRSA_DIR
+                        )
                 
                 print(f"📤 Command return code: {result.returncode}")
                 print(f"📄 STDOUT: {result.stdout}")
@@ -1187,14 +2516,15 @@ class OpenVPNManager:
                         print(f"🔄 Attempting additional cleanup and retry...")
                         
                         # Run cleanup again (more thorough with wildcards)
-                        OpenVPNManager.cleanup_client_files(clean_name, old_cwd)
+                        OpenVPNManager.cleanup_client_files(clean_name)
                         
                         # Retry the command once
                         print(f"🔄 Retrying certificate creation...")
-                        result = subprocess.run(
-                            cmd,
-                            capture_output=True, text=True, timeout=60
-                        )
+                        with pki_lock:
+                            result = subprocess.run(
+                                cmd,
+                                capture_output=True, text=True, timeout=60, cwd=EASYRSA_DIR
+                            )
                         
                         print(f"📤 Retry return code: {result.returncode}")
                         if result.returncode != 0:
@@ -1204,110 +2534,28 @@ class OpenVPNManager:
                             return False, f"Failed to create certificate after cleanup: {error_msg}"
                     else:
                         return False, f"Failed to create certificate: {error_msg}"
-                
-                # Create .ovpn file
-                client_config_path = f'{old_cwd}/{clean_name}.ovpn'
-                
-                # Read client-common.txt
-                common_config = ""
-                common_config_path = '/etc/openvpn/server/client-common.txt'
-                
-                if not os.path.exists(common_config_path):
-                    return False, f"Client common config not found: {common_config_path}"
-                
-                try:
-                    with open(common_config_path, 'r') as f:
-                        common_config = f.read()
-                    print(f"✅ Client common config read ({len(common_config)} chars)")
-                    
-                    if not common_config.strip():
-                        return False, "Client common config is empty"
-                        
-                except Exception as e:
-                    return False, f"Cannot read client-common.txt: {str(e)}"
-                
-                # Check if all required certificate files exist
-                ca_crt_path = f'pki/ca.crt'
-                client_crt_path = f'pki/issued/{clean_name}.crt'
-                client_key_path = f'pki/private/{clean_name}.key'
-                tls_auth_path = '/etc/openvpn/server/tc.key'
-                
-                missing_files = []
-                for file_path, name in [(ca_crt_path, 'CA certificate'), 
-                                      (client_crt_path, 'client certificate'),
-                                      (client_key_path, 'client private key'),
-                                      (tls_auth_path, 'TLS auth key')]:
-                    if not os.path.exists(file_path):
-                        missing_files.append(f"{name} ({file_path})")
-                
-                if missing_files:
-                    return False, f"Missing certificate files: {', '.join(missing_files)}"
-                
-                # Read client certificates and key
-                try:
-                    print(f"📄 Reading certificate files...")
-                    
-                    with open(ca_crt_path, 'r') as f:
-                        ca_cert = f.read()
-                    print(f"✅ CA certificate read ({len(ca_cert)} chars)")
-                    
-                    with open(client_crt_path, 'r') as f:
-                        client_cert = f.read()
-                    print(f"✅ Client certificate read ({len(client_cert)} chars)")
-                    
-                    with open(client_key_path, 'r') as f:
-                        client_key = f.read()
-                    print(f"✅ Client private key read ({len(client_key)} chars)")
-                    
-                    with open(tls_auth_path, 'r') as f:
-                        tls_auth = f.read()
-                    print(f"✅ TLS auth key read ({len(tls_auth)} chars)")
-                    
-                except Exception as e:
-                    return False, f"Cannot read certificates: {str(e)}"
-                
-                # Create .ovpn file content
-                ovpn_content = f"""{common_config}
-<ca>
-{ca_cert}</ca>
-<cert>
-{client_cert}</cert>
-<key>
-{client_key}</key>
-<tls-crypt>
-{tls_auth}</tls-crypt>
-"""
-                
-                # Write .ovpn file
-                try:
-                    with open(client_config_path, 'w') as f:
-                        f.write(ovpn_content)
-                    print(f"✅ OVPN config file created: {client_config_path} ({len(ovpn_content)} chars)")
-                    
-                    # Verify the file was created and is readable
-                    if not os.path.exists(client_config_path):
-                        return False, f"OVPN config file was not created: {client_config_path}"
-                    
-                    file_size = os.path.getsize(client_config_path)
-                    if file_size == 0:
-                        return False, f"OVPN config file is empty: {client_config_path}"
-                    
-                    print(f"✅ OVPN config verification passed (size: {file_size} bytes)")
-                    
-                except Exception as e:
-                    return False, f"Cannot create OVPN config file: {str(e)}"
-                
-                print(f"✅ Client {clean_name} created successfully")
-                return True, f"Client {clean_name} successfully added"
-                
-            finally:
-                os.chdir(old_cwd)
-                
+            
+            # The .ovpn file is rendered on download; make sure every part is there
+            missing_files = config_renderer.missing_files(clean_name)
+            if missing_files:
+                return False, f"Missing certificate files: {', '.join(missing_files)}"
+            
+            try:
+                config_renderer.render(clean_name)
+            except Exception as e:
+                return False, f"Cannot read client configuration material: {str(e)}"
+            
+            client_registry.invalidate()
+            change_log.record('create', clean_name, expiry_days=expiry_days)
+            print(f"✅ Client {clean_name} created successfully")
+            return True, f"Client {clean_name} successfully added"
+            
         except Exception as e:
             print(f"💥 Exception in add_client_direct: {str(e)}")
             return False, f"Error: {str(e)}"
 
     @staticmethod
+    @with_pki_lock
     def renew_client(client_name, expiry_days=3650):
         """Renew client certificate (revoke old + create new)"""
         try:
@@ -1371,90 +2619,63 @@ class OpenVPNManager:
     @staticmethod
     def auto_revoke_client(client_name):
         """Automatically revoke a client certificate"""
-        print(f"🔄 Auto-revoking client: {client_name}")
+        OpenVPNManager.auto_revoke_clients([client_name])
+
+    @staticmethod
+    def _set_temporary_status(client_names, status, only_active=False):
+        """Update temporary_clients status for several clients in one transaction"""
+        if not client_names:
+            return
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            query = 'UPDATE temporary_clients SET status = ? WHERE client_name = ?'
+            if only_active:
+                query += " AND status = 'active'"
+            cursor.executemany(query, [(status, name) for name in client_names])
+            conn.commit()
+            conn.close()
+            print(f"💾 Updated database status to '{status}' for {len(client_names)} client(s)")
+        except Exception as db_e:
+            print(f"⚠️ Database status update failed: {db_e}")
+
+    @staticmethod
+    def auto_revoke_clients(client_names):
+        """Automatically revoke a batch of temporary clients that expired together"""
+        client_names = list(dict.fromkeys(client_names))
+        if not client_names:
+            return
+        print(f"🔄 Auto-revoking {len(client_names)} client(s): {', '.join(client_names)}")
         
+        # Update database status first
+        OpenVPNManager._set_temporary_status(client_names, 'revoking', only_active=True)
+        
+        # Perform the actual revocation (one CRL and one OpenVPN signal for the batch)
         try:
-            # Update database status first
-            try:
-                conn = sqlite3.connect(DATABASE_PATH)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE temporary_clients 
-                    SET status = 'revoking' 
-                    WHERE client_name = ? AND status = 'active'
-                ''', (client_name,))
-                conn.commit()
-                conn.close()
-                print(f"📝 Updated database status to 'revoking' for {client_name}")
-            except Exception as db_e:
-                print(f"⚠️ Database update failed: {db_e}")
-            
-            # Perform the actual revocation
-            success, message = OpenVPNManager.revoke_client_direct(client_name)
-            
-            if success:
-                print(f"✅ Auto-revoked client {client_name}: {message}")
-                
-                # Update database status to revoked
-                try:
-                    conn = sqlite3.connect(DATABASE_PATH)
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        UPDATE temporary_clients 
-                        SET status = 'revoked' 
-                        WHERE client_name = ?
-                    ''', (client_name,))
-                    conn.commit()
-                    conn.close()
-                    print(f"💾 Updated database status to 'revoked' for {client_name}")
-                except Exception as db_e:
-                    print(f"⚠️ Database status update failed: {db_e}")
-                
-                # Force disconnect specific client only
-                try:
-                    OpenVPNManager.force_disconnect_client(client_name)
-                    print(f"🔄 Auto-revoke: forced disconnect of client {client_name}")
-                except Exception as e:
-                    print(f"⚠️ Auto-revoke client disconnect error: {e}")
-                
-                # Remove from temporary clients tracking
-                if client_name in temporary_clients:
-                    del temporary_clients[client_name]
-                    print(f"🗑️ Removed {client_name} from active tracking")
-                    
-            else:
-                print(f"❌ Failed to auto-revoke client {client_name}: {message}")
-                
-                # Update database status to failed
-                try:
-                    conn = sqlite3.connect(DATABASE_PATH)
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        UPDATE temporary_clients 
-                        SET status = 'failed' 
-                        WHERE client_name = ?
-                    ''', (client_name,))
-                    conn.commit()
-                    conn.close()
-                except Exception as db_e:
-                    print(f"⚠️ Database status update failed: {db_e}")
-                
+            result = OpenVPNManager.revoke_clients_bulk(client_names)
         except Exception as e:
-            print(f"💥 Error in auto-revoke for {client_name}: {str(e)}")
-            
-            # Update database status to error
-            try:
-                conn = sqlite3.connect(DATABASE_PATH)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE temporary_clients 
-                    SET status = 'error' 
-                    WHERE client_name = ?
-                ''', (client_name,))
-                conn.commit()
-                conn.close()
-            except Exception as db_e:
-                print(f"⚠️ Database error status update failed: {db_e}")
+            print(f"💥 Error in auto-revoke: {str(e)}")
+            OpenVPNManager._set_temporary_status(client_names, 'error')
+            return
+        
+        # revoke_clients_bulk reports sanitized names; temporary_clients is keyed by the raw ones
+        clean_names = {name: re.sub(r'[^0-9a-zA-Z_-]', '_', name) for name in client_names}
+        revoked = [name for name in client_names if clean_names[name] in result['revoked']]
+        failed = [name for name in client_names if clean_names[name] not in result['revoked']]
+        for client_name in revoked:
+            print(f"✅ Auto-revoked client {client_name}")
+        for client_name in failed:
+            message = result['failed'].get(clean_names[client_name], 'Invalid client name')
+            print(f"❌ Failed to auto-revoke client {client_name}: {message}")
+        
+        OpenVPNManager._set_temporary_status(revoked, 'revoked')
+        OpenVPNManager._set_temporary_status(failed, 'error' if result['error'] else 'failed')
+        
+        for client_name in revoked:
+            # Remove from temporary clients tracking
+            if temporary_clients.pop(client_name, None) is not None:
+                print(f"🗑️ Removed {client_name} from active tracking")
+            expiry_scheduler.cancel(client_name)
 
     @staticmethod
     def schedule_auto_revoke(client_name, hours):
@@ -1466,7 +2687,7 @@ class OpenVPNManager:
         
         # Save to database
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -1481,22 +2702,12 @@ class OpenVPNManager:
         except Exception as e:
             print(f"❌ Failed to save temporary client to database: {e}")
         
-        # Create timer for auto-revoke
-        timer = threading.Timer(
-            hours * 3600,  # Convert hours to seconds
-            OpenVPNManager.auto_revoke_client,
-            args=[client_name]
-        )
-        
-        # Store in temporary clients tracking
+        # Store in temporary clients tracking and queue for auto-revoke
         temporary_clients[client_name] = {
             'revoke_time': revoke_time,
-            'timer': timer,
             'hours': hours
         }
-        
-        # Start the timer
-        timer.start()
+        expiry_scheduler.schedule(client_name, revoke_time)
         
         print(f"✅ Auto-revoke scheduled for {client_name} at {revoke_time.strftime('%Y-%m-%d %H:%M:%S')}")
         return True
@@ -1506,17 +2717,15 @@ class OpenVPNManager:
         """Cancel scheduled auto-revoke for a client"""
         cancelled = False
         
-        # Cancel timer if exists
-        if client_name in temporary_clients:
-            timer = temporary_clients[client_name]['timer']
-            timer.cancel()
-            del temporary_clients[client_name]
-            print(f"🚫 Cancelled timer for {client_name}")
+        # Cancel scheduled revocation if exists
+        expiry_scheduler.cancel(client_name)
+        if temporary_clients.pop(client_name, None) is not None:
+            print(f"🚫 Cancelled scheduled revocation for {client_name}")
             cancelled = True
         
         # Remove from database
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE temporary_clients 
@@ -1564,6 +2773,7 @@ class OpenVPNManager:
         return {'is_temporary': False}
 
     @staticmethod
+    @with_pki_lock
     def restore_client(client_name, expiry_days=3650):
         """Restore a revoked client with new certificate"""
         try:
@@ -1593,7 +2803,7 @@ class OpenVPNManager:
             actual_expiry_days = 1 if auto_hours else expiry_days
             
             # Remove old config file if it exists (cleanup)
-            old_config_path = f'./{clean_name}.ovpn'
+            old_config_path = client_config_file(clean_name)
             
             try:
                 if os.path.exists(old_config_path):
@@ -1662,7 +2872,7 @@ class OpenVPNManager:
                 (f'{pki_dir}/ca.crt', 'CA certificate'),
                 (f'{pki_dir}/index.txt', 'Certificate index'),
                 ('/etc/openvpn/server/client-common.txt', 'Client common config'),
-                ('/etc/openvpn/server/tc.key', 'TLS auth key')
+                (TLS_CRYPT_KEY_PATH, 'TLS auth key')
             ]
             
             for file_path, description in required_files:
@@ -1679,18 +2889,13 @@ class OpenVPNManager:
             # Test EasyRSA command
             if diagnosis['easyrsa_status'] == 'executable':
                 try:
-                    old_cwd = os.getcwd()
-                    os.chdir(EASYRSA_DIR)
-                    
                     result = subprocess.run(['./easyrsa', 'help'], 
-                                          capture_output=True, text=True, timeout=10)
+                                          capture_output=True, text=True, timeout=10, cwd=EASYRSA_DIR)
                     
                     if result.returncode == 0:
                         diagnosis['easyrsa_status'] = 'working'
                     else:
                         diagnosis['errors'].append(f"EasyRSA command failed: {result.stderr}")
-                        
-                    os.chdir(old_cwd)
                     
                 except Exception as e:
                     diagnosis['errors'].append(f"Cannot test EasyRSA: {str(e)}")
@@ -1714,21 +2919,22 @@ class OpenVPNManager:
         try:
             import glob
             
-            # Use current working directory if not specified
+            # .ovpn files live in CLIENT_CONFIG_DIR unless told otherwise
             if working_dir is None:
-                working_dir = os.getcwd()
+                working_dir = CLIENT_CONFIG_DIR
             
             print(f"🧹 Cleaning up existing files for {client_name}...")
             
             # List of file patterns to clean up
+            pki_dir = f'{EASYRSA_DIR}/pki'
             cleanup_patterns = [
-                f'pki/reqs/{client_name}.req',
-                f'pki/reqs/{client_name}.*',
-                f'pki/private/{client_name}.key', 
-                f'pki/private/{client_name}.*',
-                f'pki/issued/{client_name}.crt',
-                f'pki/issued/{client_name}.*',
-                f'pki/certs_by_serial/{client_name}.pem',
+                f'{pki_dir}/reqs/{client_name}.req',
+                f'{pki_dir}/reqs/{client_name}.*',
+                f'{pki_dir}/private/{client_name}.key', 
+                f'{pki_dir}/private/{client_name}.*',
+                f'{pki_dir}/issued/{client_name}.crt',
+                f'{pki_dir}/issued/{client_name}.*',
+                f'{pki_dir}/certs_by_serial/{client_name}.pem',
                 f'{working_dir}/{client_name}.ovpn'
             ]
             
@@ -1959,6 +3165,7 @@ class OpenVPNManager:
         return None
 
     @staticmethod
+    @with_pki_lock
     def force_create_client(client_name, expiry_days=3650):
         """Force create client by cleaning up all existing files first"""
         try:
@@ -1969,18 +3176,9 @@ class OpenVPNManager:
             
             print(f"🔧 Force creating client: {clean_name}")
             
-            # Clean up files from current working directory first
+            # Clean up PKI and config files left over for this name
             cleanup_success, cleanup_msg = OpenVPNManager.cleanup_client_files(clean_name)
             
-            # Change to EasyRSA directory and clean up there too
-            if os.path.exists(EASYRSA_DIR):
-                old_cwd = os.getcwd()
-                os.chdir(EASYRSA_DIR)
-                try:
-                    OpenVPNManager.cleanup_client_files(clean_name, old_cwd)
-                finally:
-                    os.chdir(old_cwd)
-            
             # Now try to create the client
             return OpenVPNManager.add_client_direct(clean_name, expiry_days)
             
@@ -2058,68 +3256,131 @@ class OpenVPNManager:
     @staticmethod
     def revoke_client_direct(client_name):
         """Revoke client directly using EasyRSA commands"""
-        try:
+        clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
+        result = OpenVPNManager.revoke_clients_bulk([client_name])
+        
+        if clean_name in result['revoked']:
+            return True, f"Client {clean_name} successfully revoked"
+        return False, result['failed'].get(clean_name, result.get('error') or "Invalid client name")
+
+    @staticmethod
+    @with_pki_lock
+    def revoke_clients_bulk(client_names):
+        """Revoke several clients with one CRL regeneration and one OpenVPN signal.
+
+        Returns {'revoked': [names], 'failed': {name: message}, 'error': message or None}
+        """
+        result = {'revoked': [], 'failed': {}, 'error': None}
+        
+        candidates = []
+        for client_name in client_names:
             clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
-            
             if not clean_name:
-                return False, "Invalid client name"
-            
+                continue
+            if clean_name in candidates or clean_name in result['failed']:
+                continue
             if not os.path.exists(f'{EASYRSA_DIR}/pki/issued/{clean_name}.crt'):
-                return False, "Client certificate not found"
-            
-            print(f"🔧 Revoking client directly: {clean_name}")
-            
-            # Change to EasyRSA directory
-            old_cwd = os.getcwd()
-            os.chdir(EASYRSA_DIR)
-            
-            try:
-                # Revoke client certificate
-                result = subprocess.run(
-                    ['./easyrsa', '--batch', 'revoke', clean_name],
-                    capture_output=True, text=True, timeout=30
-                )
-                
-                if result.returncode != 0:
-                    return False, f"Failed to revoke certificate: {result.stderr}"
-                
-                # Generate new CRL
-                result = subprocess.run(
-                    ['./easyrsa', '--batch', '--days=3650', 'gen-crl'],
-                    capture_output=True, text=True, timeout=30
-                )
+                result['failed'][clean_name] = "Client certificate not found"
+                continue
+            candidates.append(clean_name)
+        
+        if not candidates:
+            return result
+        
+        print(f"🔧 Revoking {len(candidates)} client(s) directly: {', '.join(candidates)}")
+        
+        try:
+            with pki_lock:
+                # Revoke client certificates
+                revoked = None
+                if pki_signer.is_enabled():
+                    try:
+                        revoked, failures = pki_signer.revoke(candidates)
+                        result['failed'].update(failures)
+                    except Exception as e:
+                        print(f"⚠️ In-process revoke failed, falling back to EasyRSA: {e}")
+                        revoked = None
                 
-                if result.returncode != 0:
-                    return False, f"Failed to generate CRL: {result.stderr}"
+                if revoked is None:
+                    revoked = []
+                    for clean_name in candidates:
+                        proc = subprocess.run(
+                            ['./easyrsa', '--batch', 'revoke', clean_name],
+                            capture_output=True, text=True, timeout=30, cwd=EASYRSA_DIR
+                        )
+                        if proc.returncode != 0:
+                            result['failed'][clean_name] = f"Failed to revoke certificate: {proc.stderr}"
+                        else:
+                            revoked.append(clean_name)
                 
-                # Copy CRL to OpenVPN directory
-                try:
-                    subprocess.run(['cp', 'pki/crl.pem', '/etc/openvpn/server/crl.pem'], check=True)
-                    subprocess.run(['chown', 'nobody:nogroup', '/etc/openvpn/server/crl.pem'], check=True)
-                except:
-                    pass  # Continue if chown fails
+                if not revoked:
+                    return result
                 
-                # Remove client config file
-                config_path = f'{old_cwd}/{clean_name}.ovpn'
-                if os.path.exists(config_path):
-                    os.remove(config_path)
+                # Generate and install the new CRL once for the whole batch
+                success, message = OpenVPNManager.install_crl()
+                if not success:
+                    for clean_name in revoked:
+                        result['failed'][clean_name] = message
+                    result['error'] = message
+                    return result
                 
-                # Force disconnect specific client only
+                # Remove client config files
+                for clean_name in revoked:
+                    config_path = client_config_file(clean_name)
+                    if os.path.exists(config_path):
+                        os.remove(config_path)
+                client_registry.invalidate()
+                change_log.record_many([('revoke', clean_name, {}) for clean_name in revoked])
+                result['revoked'] = revoked
+            
+            # Drop live sessions, then ask OpenVPN to reread the CRL once
+            for clean_name in revoked:
                 try:
-                    OpenVPNManager.force_disconnect_client(clean_name)
-                    print(f"🔄 Forced disconnect of client {clean_name}")
+                    OpenVPNManager.disconnect_client_session(clean_name)
                 except Exception as e:
                     print(f"⚠️ Client disconnect error: {e}")
-                
-                print(f"✅ Client {clean_name} revoked successfully")
-                return True, f"Client {clean_name} successfully revoked"
-                
-            finally:
-                os.chdir(old_cwd)
-                
+            OpenVPNManager.signal_crl_reload()
+            
+            print(f"✅ Revoked {len(revoked)} client(s), {len(result['failed'])} failed")
+            return result
+            
         except Exception as e:
-            print(f"💥 Exception in revoke_client_direct: {str(e)}")
-            return False, f"Error: {str(e)}"
+            print(f"💥 Exception in revoke_clients_bulk: {str(e)}")
+            result['error'] = f"Error: {str(e)}"
+            for clean_name in candidates:
+                if clean_name not in result['revoked']:
+                    result['failed'].setdefault(clean_name, result['error'])
+            return result
+
+    @staticmethod
+    def install_crl():
+        """Regenerate the CRL and copy it to the OpenVPN directory"""
+        with pki_lock:
+            generated = False
+            if pki_signer.is_enabled():
+                try:
+                    pki_signer.write_crl()
+                    generated = True
+                except Exception as e:
+                    print(f"⚠️ In-process CRL generation failed, falling back to EasyRSA: {e}")
+            
+            if not generated:
+                result = subprocess.run(
+                    ['./easyrsa', '--batch', f'--days={CRL_VALIDITY_DAYS}', 'gen-crl'],
+                    capture_output=True, text=True, timeout=30, cwd=EASYRSA_DIR
+                )
+                
+                if result.returncode != 0:
+                    return False, f"Failed to generate CRL: {result.stderr}"
+            
+            # Copy CRL to OpenVPN directory
+            try:
+                subprocess.run(['cp', f'{EASYRSA_DIR}/pki/crl.pem', '/etc/openvpn/server/crl.pem'], check=True)
+                subprocess.run(['chown', 'nobody:nogroup', '/etc/openvpn/server/crl.pem'], check=True)
+            except:
+                pass  # Continue if chown fails
+        
+        return True, "CRL updated"
 
     @staticmethod
     def revoke_client(client_name):
@@ -2203,74 +3464,84 @@ class OpenVPNManager:
             # CPU usage
             cpu_percent = psutil.cpu_percent(interval=1)
             
-            # Memory usage
-            memory = psutil.virtual_memory()
-            memory_percent = memory.percent
-            memory_available = memory.available
-            memory_total = memory.total
-            memory_used = memory.used
-            
-            # Network statistics
-            network_io = psutil.net_io_counters()
-            network_sent = network_io.bytes_sent
-            network_received = network_io.bytes_recv
-            
-            # Disk usage (root partition)
-            disk = psutil.disk_usage('/')
-            disk_percent = (disk.used / disk.total) * 100
-            
-            # Active network connections
-            connections = psutil.net_connections()
-            
             # Get current active VPN connections count
             active_vpn_connections = len(OpenVPNManager.get_active_connections())
             
-            return {
-                'cpu': {
-                    'percent': round(cpu_percent, 1),
-                    'status': 'high' if cpu_percent > 80 else 'normal' if cpu_percent > 50 else 'low'
-                },
-                'memory': {
-                    'percent': round(memory_percent, 1),
-                    'available': memory_available,
-                    'total': memory_total,
-                    'used': memory_used,
-                    'available_gb': round(memory_available / 1024 / 1024 / 1024, 1),
-                    'total_gb': round(memory_total / 1024 / 1024 / 1024, 1),
-                    'used_gb': round(memory_used / 1024 / 1024 / 1024, 1),
-                    'status': 'high' if memory_percent > 85 else 'normal' if memory_percent > 60 else 'low'
-                },
-                'network': {
-                    'bytes_sent': network_sent,
-                    'bytes_received': network_received,
-                    'sent_mb': round(network_sent / 1024 / 1024, 1),
-                    'received_mb': round(network_received / 1024 / 1024, 1),
-                    'sent_gb': round(network_sent / 1024 / 1024 / 1024, 2),
-                    'received_gb': round(network_received / 1024 / 1024 / 1024, 2)
-                },
-                'disk': {
-                    'percent': round(disk_percent, 1),
-                    'free': disk.free,
-                    'total': disk.total,
-                    'used': disk.used,
-                    'free_gb': round(disk.free / 1024 / 1024 / 1024, 1),
-                    'total_gb': round(disk.total / 1024 / 1024 / 1024, 1),
-                    'status': 'high' if disk_percent > 90 else 'normal' if disk_percent > 70 else 'low'
-                },
-                'vpn_connections': active_vpn_connections,
-                'timestamp': datetime.now().isoformat()
-            }
+            return OpenVPNManager.format_system_metrics(
+                cpu_percent,
+                psutil.virtual_memory(),
+                psutil.disk_usage('/'),
+                psutil.net_io_counters(),
+                active_vpn_connections
+            )
             
         except Exception as e:
             print(f"Error getting system metrics: {e}")
-            return {
-                'cpu': {'percent': 0, 'status': 'unknown'},
-                'memory': {'percent': 0, 'available': 0, 'total': 0, 'status': 'unknown'},
-                'network': {'bytes_sent': 0, 'bytes_received': 0},
-                'disk': {'percent': 0, 'free': 0, 'total': 0, 'status': 'unknown'},
-                'vpn_connections': 0,
-                'timestamp': datetime.now().isoformat()
-            }
+            return OpenVPNManager.empty_system_metrics()
+    
+    @staticmethod
+    def format_system_metrics(cpu_percent, memory, disk, network_io, vpn_connections, timestamp=None):
+        """Build the system metrics payload from raw psutil readings"""
+        # Memory usage
+        memory_percent = memory.percent
+        memory_available = memory.available
+        memory_total = memory.total
+        memory_used = memory.used
+        
+        # Network statistics
+        network_sent = network_io.bytes_sent
+        network_received = network_io.bytes_recv
+        
+        # Disk usage (root partition)
+        disk_percent = (disk.used / disk.total) * 100
+        
+        return {
+            'cpu': {
+                'percent': round(cpu_percent, 1),
+                'status': 'high' if cpu_percent > 80 else 'normal' if cpu_percent > 50 else 'low'
+            },
+            'memory': {
+                'percent': round(memory_percent, 1),
+                'available': memory_available,
+                'total': memory_total,
+                'used': memory_used,
+                'available_gb': round(memory_available / 1024 / 1024 / 1024, 1),
+                'total_gb': round(memory_total / 1024 / 1024 / 1024, 1),
+                'used_gb': round(memory_used / 1024 / 1024 / 1024, 1),
+                'status': 'high' if memory_percent > 85 else 'normal' if memory_percent > 60 else 'low'
+            },
+            'network': {
+                'bytes_sent': network_sent,
+                'bytes_received': network_received,
+                'sent_mb': round(network_sent / 1024 / 1024, 1),
+                'received_mb': round(network_received / 1024 / 1024, 1),
+                'sent_gb': round(network_sent / 1024 / 1024 / 1024, 2),
+                'received_gb': round(network_received / 1024 / 1024 / 1024, 2)
+            },
+            'disk': {
+                'percent': round(disk_percent, 1),
+                'free': disk.free,
+                'total': disk.total,
+                'used': disk.used,
+                'free_gb': round(disk.free / 1024 / 1024 / 1024, 1),
+                'total_gb': round(disk.total / 1024 / 1024 / 1024, 1),
+                'status': 'high' if disk_percent > 90 else 'normal' if disk_percent > 70 else 'low'
+            },
+            'vpn_connections': vpn_connections,
+            'timestamp': (timestamp or datetime.now()).isoformat()
+        }
+    
+    @staticmethod
+    def empty_system_metrics():
+        """Fallback system metrics payload used when sampling fails"""
+        return {
+            'cpu': {'percent': 0, 'status': 'unknown'},
+            'memory': {'percent': 0, 'available': 0, 'total': 0, 'status': 'unknown'},
+            'network': {'bytes_sent': 0, 'bytes_received': 0},
+            'disk': {'percent': 0, 'free': 0, 'total': 0, 'status': 'unknown'},
+            'vpn_connections': 0,
+            'timestamp': datetime.now().isoformat()
+        }
     
     @staticmethod
     def get_network_bandwidth():
@@ -2285,31 +3556,31 @@ class OpenVPNManager:
             upload_speed = net2.bytes_sent - net1.bytes_sent
             download_speed = net2.bytes_recv - net1.bytes_recv
             
-            return {
-                'upload_bps': upload_speed,
-                'download_bps': download_speed,
-                'upload_kbps': round(upload_speed / 1024, 2),
-                'download_kbps': round(download_speed / 1024, 2),
-                'upload_mbps': round(upload_speed / 1024 / 1024, 3),
-                'download_mbps': round(download_speed / 1024 / 1024, 3),
-                'timestamp': datetime.now().isoformat()
-            }
+            return OpenVPNManager.format_network_bandwidth(upload_speed, download_speed)
         except Exception as e:
             print(f"Error getting network bandwidth: {e}")
-            return {
-                'upload_bps': 0, 'download_bps': 0,
-                'upload_kbps': 0, 'download_kbps': 0,
-                'upload_mbps': 0.0, 'download_mbps': 0.0,
-                'timestamp': datetime.now().isoformat()
-            }
+            return OpenVPNManager.format_network_bandwidth(0, 0)
+    
+    @staticmethod
+    def format_network_bandwidth(upload_speed, download_speed, timestamp=None):
+        """Build the bandwidth payload from bytes-per-second rates"""
+        return {
+            'upload_bps': upload_speed,
+            'download_bps': download_speed,
+            'upload_kbps': round(upload_speed / 1024, 2),
+            'download_kbps': round(download_speed / 1024, 2),
+            'upload_mbps': round(upload_speed / 1024 / 1024, 3),
+            'download_mbps': round(download_speed / 1024 / 1024, 3),
+            'timestamp': (timestamp or datetime.now()).isoformat()
+        }
     
     @staticmethod
     def save_system_metrics():
         """Save current system metrics to database"""
         try:
-            metrics = OpenVPNManager.get_system_metrics()
+            metrics = metrics_sampler.snapshot()['system_metrics']
             
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection('metrics')
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -2332,11 +3603,157 @@ class OpenVPNManager:
             print(f"Error saving system metrics: {e}")
             return False
     
+    @staticmethod
+    def _metrics_bucket_sql(column, resolution):
+        """SQL expression truncating a timestamp column to a 5m/1h bucket"""
+        if resolution == '1h':
+            return f"strftime('%Y-%m-%d %H:00:00', {column})"
+        return (f"strftime('%Y-%m-%d %H:', {column}) || "
+                f"printf('%02d', (CAST(strftime('%M', {column}) AS INTEGER) / 5) * 5) || ':00'")
+    
+    @staticmethod
+    def _metrics_rollup_select(table, bucket_column, resolution, where):
+        """SELECT producing rollup columns from raw samples or a finer rollup table"""
+        bucket = OpenVPNManager._metrics_bucket_sql(bucket_column, resolution)
+        if table == 'system_metrics':
+            return f'''
+                SELECT {bucket} AS bucket, 1 AS sample_count,
+                       cpu_percent AS cpu_sum, cpu_percent AS cpu_max,
+                       memory_percent AS memory_sum, memory_percent AS memory_max,
+                       memory_available AS memory_available_min,
+                       network_sent, network_received,
+                       active_connections AS connections_sum, active_connections AS connections_max
+                FROM system_metrics WHERE {where}
+            '''
+        return f'''
+            SELECT {bucket} AS bucket, sample_count, cpu_sum, cpu_max, memory_sum, memory_max,
+                   memory_available_min, network_sent, network_received, connections_sum, connections_max
+            FROM {table} WHERE {where}
+        '''
+    
+    @staticmethod
+    def compact_system_metrics():
+        """Fold aged system_metrics samples into 5-minute and hourly rollups"""
+        try:
+            conn = get_db_connection('metrics')
+            cursor = conn.cursor()
+            
+            raw_cutoff = (datetime.utcnow() - timedelta(hours=SYSTEM_METRICS_RAW_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
+            fine_cutoff = (datetime.utcnow() - timedelta(days=SYSTEM_METRICS_5M_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+            
+            # raw -> 5m, then 5m -> 1h; buckets split across runs are merged by the upsert
+            compacted = {}
+            for source, column, target, resolution, cutoff in (
+                ('system_metrics', 'timestamp', 'system_metrics_5m', '5m', raw_cutoff),
+                ('system_metrics_5m', 'bucket', 'system_metrics_1h', '1h', fine_cutoff)
+            ):
+                where = f'{column} < ?'
+                cursor.execute(f'''
+                    INSERT INTO {target}
+                    (bucket, sample_count, cpu_sum, cpu_max, memory_sum, memory_max,
+                     memory_available_min, network_sent, network_received, connections_sum, connections_max)
+                    SELECT bucket, SUM(sample_count), SUM(cpu_sum), MAX(cpu_max), SUM(memory_sum), MAX(memory_max),
+                           MIN(memory_available_min), MAX(network_sent), MAX(network_received),
+                           SUM(connections_sum), MAX(connections_max)
+                    FROM ({OpenVPNManager._metrics_rollup_select(source, column, resolution, where)})
+                    WHERE 1
+                    GROUP BY bucket
+                    ON CONFLICT(bucket) DO UPDATE SET
+                        sample_count = sample_count + excluded.sample_count,
+                        cpu_sum = cpu_sum + excluded.cpu_sum,
+                        cpu_max = MAX(cpu_max, excluded.cpu_max),
+                        memory_sum = memory_sum + excluded.memory_sum,
+                        memory_max = MAX(memory_max, excluded.memory_max),
+                        memory_available_min = MIN(memory_available_min, excluded.memory_available_min),
+                        network_sent = MAX(network_sent, excluded.network_sent),
+                        network_received = MAX(network_received, excluded.network_received),
+                        connections_sum = connections_sum + excluded.connections_sum,
+                        connections_max = MAX(connections_max, excluded.connections_max)
+                ''', (cutoff,))
+                cursor.execute(f'DELETE FROM {source} WHERE {where}', (cutoff,))
+                compacted[source] = cursor.rowcount
+            
+            conn.commit()
+            conn.close()
+            
+            if any(compacted.values()):
+                print(f"🗜️ SYSTEM METRICS: Compacted {compacted['system_metrics']} raw samples and {compacted['system_metrics_5m']} 5-minute buckets")
+            return True
+        except Exception as e:
+            print(f"Error compacting system metrics: {e}")
+            return False
+    
+    @staticmethod
+    def get_system_metrics_history(hours=24):
+        """Get system metrics for the last N hours at a resolution fitting the range"""
+        if hours <= SYSTEM_METRICS_RAW_HOURS:
+            resolution = 'raw'
+        elif hours <= SYSTEM_METRICS_5M_DAYS * 24:
+            resolution = '5m'
+        else:
+            resolution = '1h'
+        
+        since = (datetime.utcnow() - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+        
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            if resolution == 'raw':
+                cursor.execute('''
+                    SELECT timestamp, 1, cpu_percent, cpu_percent, memory_percent, memory_percent,
+                           memory_available, network_sent, network_received, active_connections, active_connections
+                    FROM system_metrics
+                    WHERE timestamp >= ?
+                    ORDER BY timestamp
+                ''', (since,))
+            else:
+                # Recent data still lives in finer tables; bucket everything to the target resolution
+                sources = [('system_metrics', 'timestamp'), ('system_metrics_5m', 'bucket')]
+                if resolution == '1h':
+                    sources.append(('system_metrics_1h', 'bucket'))
+                union = ' UNION ALL '.join(
+                    OpenVPNManager._metrics_rollup_select(table, column, resolution, f'{column} >= ?')
+                    for table, column in sources
+                )
+                cursor.execute(f'''
+                    SELECT bucket, SUM(sample_count), SUM(cpu_sum), MAX(cpu_max), SUM(memory_sum), MAX(memory_max),
+                           MIN(memory_available_min), MAX(network_sent), MAX(network_received),
+                           SUM(connections_sum), MAX(connections_max)
+                    FROM ({union})
+                    GROUP BY bucket
+                    ORDER BY bucket
+                ''', [since] * len(sources))
+            
+            points = []
+            for (bucket, sample_count, cpu_sum, cpu_max, memory_sum, memory_max, memory_available_min,
+                 network_sent, network_received, connections_sum, connections_max) in cursor.fetchall():
+                sample_count = sample_count or 1
+                points.append({
+                    'timestamp': bucket,
+                    'samples': sample_count,
+                    'cpu_avg': round((cpu_sum or 0) / sample_count, 1),
+                    'cpu_max': cpu_max or 0,
+                    'memory_avg': round((memory_sum or 0) / sample_count, 1),
+                    'memory_max': memory_max or 0,
+                    'memory_available_min': memory_available_min or 0,
+                    'network_sent': network_sent or 0,
+                    'network_received': network_received or 0,
+                    'connections_avg': round((connections_sum or 0) / sample_count, 1),
+                    'connections_max': connections_max or 0
+                })
+            
+            conn.close()
+            return {'resolution': resolution, 'hours': hours, 'points': points}
+        except Exception as e:
+            print(f"Error reading system metrics history: {e}")
+            return {'resolution': resolution, 'hours': hours, 'points': []}
+    
     @staticmethod
     def get_client_traffic_history(client_name, days=30):
         """Get traffic history for specific client"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -2407,7 +3824,7 @@ class OpenVPNManager:
     def update_active_session(client_name, bytes_sent, bytes_received, duration_seconds, session_start=None, session_end=None, real_address=None, virtual_address=None):
         """Update or create active session record"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             # Check if active session exists for this client (no session_end set yet)
@@ -2454,21 +3871,24 @@ class OpenVPNManager:
     def finalize_session(client_name, bytes_sent, bytes_received, duration_seconds, session_start=None, session_end=None, real_address=None, virtual_address=None):
         """Finalize active session by setting session_end"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             # Find and update the active session for this client
-            cursor.execute('''
+            cursor.execute('SELECT id FROM traffic_history WHERE client_name = ? AND session_end IS NULL', (client_name,))
+            open_ids = [row[0] for row in cursor.fetchall()]
+            cursor.executemany('''
                 UPDATE traffic_history 
                 SET bytes_sent = ?, bytes_received = ?, duration_seconds = ?, 
                     session_end = ?, 
                     real_address = COALESCE(?, real_address),
                     virtual_address = COALESCE(?, virtual_address),
                     timestamp = CURRENT_TIMESTAMP
-                WHERE client_name = ? AND session_end IS NULL
-            ''', (bytes_sent, bytes_received, duration_seconds, session_end or datetime.now().isoformat(), real_address, virtual_address, client_name))
+                WHERE id = ?
+            ''', [(bytes_sent, bytes_received, duration_seconds, session_end or datetime.now().isoformat(), real_address, virtual_address, row_id)
+                  for row_id in open_ids])
             
-            if cursor.rowcount > 0:
+            if open_ids:
                 print(f"💾 FINALIZED SESSION: {client_name} from {real_address} - Final: {bytes_sent/1024/1024:.2f}MB sent, {bytes_received/1024/1024:.2f}MB received")
             else:
                 # No active session found, create new completed session
@@ -2479,10 +3899,13 @@ class OpenVPNManager:
                     (client_name, bytes_sent, bytes_received, duration_seconds, session_start, session_end, real_address, virtual_address)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (client_name, bytes_sent, bytes_received, duration_seconds, actual_session_start, actual_session_end, real_address, virtual_address))
+                open_ids = [cursor.lastrowid]
                 print(f"💾 CREATED FINAL SESSION: {client_name} from {real_address} -> {virtual_address} - {bytes_sent/1024/1024:.2f}MB sent, {bytes_received/1024/1024:.2f}MB received")
             
+            apply_traffic_rollups(cursor, open_ids)
             conn.commit()
             conn.close()
+            session_writer.forget(client_name)
             return True
             
         except Exception as e:
@@ -2497,7 +3920,7 @@ class OpenVPNManager:
         try:
             print(f"💾 SAVING SESSION: {client_name} - Sent: {bytes_sent/1024/1024:.2f}MB, Received: {bytes_received/1024/1024:.2f}MB, Duration: {duration_seconds}s")
             
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -2505,6 +3928,8 @@ class OpenVPNManager:
                 (client_name, bytes_sent, bytes_received, duration_seconds, session_start, session_end)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (client_name, bytes_sent, bytes_received, duration_seconds, session_start, session_end))
+            if session_end:
+                apply_traffic_rollups(cursor, [cursor.lastrowid])
             
             conn.commit()
             
@@ -2552,7 +3977,7 @@ class OpenVPNManager:
                            last_activity=None, is_connection=False, is_disconnection=False, is_activity_update=False):
         """Update aggregated client statistics"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             current_time = datetime.now()
             
@@ -2620,60 +4045,70 @@ class OpenVPNManager:
     
     @staticmethod
     def get_all_clients_traffic_summary():
-        """Get traffic summary for all clients from traffic history"""
+        """Get traffic summary for all clients from the rollup totals plus open sessions"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
-            # Get aggregated data directly from traffic_history
+            # Finalized sessions, one precomputed row per client
             cursor.execute('''
-                SELECT 
-                    client_name,
-                    SUM(COALESCE(bytes_sent, 0)) as total_sent,
-                    SUM(COALESCE(bytes_received, 0)) as total_received,
-                    SUM(COALESCE(duration_seconds, 0)) as total_duration,
-                    COUNT(*) as session_count,
-                    MIN(session_start) as first_connection,
-                    MAX(COALESCE(session_end, session_start)) as last_activity,
-                    MAX(CASE WHEN session_end IS NULL THEN 1 ELSE 0 END) as has_active_session
-                FROM traffic_history 
-                GROUP BY client_name
-                ORDER BY (SUM(COALESCE(bytes_sent, 0)) + SUM(COALESCE(bytes_received, 0))) DESC
+                SELECT client_name, bytes_sent, bytes_received, duration_seconds,
+                       session_count, first_connection, last_activity
+                FROM client_traffic_totals
+            ''')
+            totals = {}
+            for row in cursor.fetchall():
+                totals[row[0]] = {
+                    'sent': row[1] or 0, 'received': row[2] or 0, 'duration': row[3] or 0,
+                    'sessions': row[4] or 0, 'first': row[5], 'last': row[6], 'active_start': None
+                }
+            
+            # Open sessions (partial index on session_end IS NULL)
+            cursor.execute('''
+                SELECT client_name, bytes_sent, bytes_received, duration_seconds, session_start
+                FROM traffic_history
+                WHERE session_end IS NULL
+                ORDER BY id
             ''')
+            for client_name, bytes_sent, bytes_received, duration_seconds, session_start in cursor.fetchall():
+                entry = totals.setdefault(client_name, {
+                    'sent': 0, 'received': 0, 'duration': 0, 'sessions': 0,
+                    'first': None, 'last': None, 'active_start': None
+                })
+                entry['sent'] += bytes_sent or 0
+                entry['received'] += bytes_received or 0
+                entry['duration'] += duration_seconds or 0
+                entry['sessions'] += 1
+                if session_start:
+                    if entry['first'] is None or session_start < entry['first']:
+                        entry['first'] = session_start
+                    if entry['last'] is None or session_start > entry['last']:
+                        entry['last'] = session_start
+                entry['active_start'] = session_start or ''
+            
+            conn.close()
             
             summary = []
             current_time = datetime.now()
             
-            for row in cursor.fetchall():
-                (client_name, total_sent, total_received, total_duration, session_count,
-                 first_connection, last_activity, has_active_session) = row
-                
-                total_sent = total_sent or 0
-                total_received = total_received or 0
-                total_duration = total_duration or 0
+            for client_name, entry in totals.items():
+                total_sent = entry['sent']
+                total_received = entry['received']
+                total_duration = entry['duration']
                 total_bytes = total_sent + total_received
+                last_activity = entry['last']
                 
                 # Check if client is currently online
-                is_online = bool(has_active_session)
-                
-                # Debug log for traffic summary
-                print(f"📊 Traffic Summary for {client_name}: sent={total_sent/1024/1024:.2f}MB, received={total_received/1024/1024:.2f}MB, sessions={session_count}, online={is_online}")
+                is_online = entry['active_start'] is not None
                 
                 # Get current session duration if online
                 current_session_duration = 0
-                if is_online:
-                    cursor.execute('''
-                        SELECT session_start FROM traffic_history 
-                        WHERE client_name = ? AND session_end IS NULL
-                        ORDER BY timestamp DESC LIMIT 1
-                    ''', (client_name,))
-                    active_session = cursor.fetchone()
-                    if active_session and active_session[0]:
-                        try:
-                            session_start_dt = datetime.fromisoformat(active_session[0])
-                            current_session_duration = int((current_time - session_start_dt).total_seconds())
-                        except:
-                            current_session_duration = 0
+                if is_online and entry['active_start']:
+                    try:
+                        session_start_dt = datetime.fromisoformat(entry['active_start'])
+                        current_session_duration = int((current_time - session_start_dt).total_seconds())
+                    except:
+                        current_session_duration = 0
                 
                 # Determine display status
                 if is_online:
@@ -2694,8 +4129,8 @@ class OpenVPNManager:
                     'total_gb': round(total_bytes / 1024 / 1024 / 1024, 2),
                     'total_duration': total_duration,
                     'duration_formatted': OpenVPNManager.format_duration(total_duration),
-                    'session_count': session_count,
-                    'first_connection': first_connection,
+                    'session_count': entry['sessions'],
+                    'first_connection': entry['first'],
                     'last_connection': last_activity,
                     'last_session': last_activity,  # For compatibility with old template
                     'last_activity': last_activity,
@@ -2704,7 +4139,7 @@ class OpenVPNManager:
                     'current_session_duration': current_session_duration
                 })
             
-            conn.close()
+            summary.sort(key=lambda item: item['total_bytes'], reverse=True)
             return summary
             
         except Exception as e:
@@ -2713,6 +4148,48 @@ class OpenVPNManager:
             traceback.print_exc()
             return []
     
+    @staticmethod
+    def get_traffic_timeline(period='daily', days=30, client_name=None):
+        """Get traffic per hour/day bucket from the rollup tables"""
+        table = 'client_traffic_hourly' if period == 'hourly' else 'client_traffic_daily'
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:00:00')
+        if table == 'client_traffic_daily':
+            since = since[:10]
+        
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            query = f'''
+                SELECT bucket, SUM(bytes_sent), SUM(bytes_received), SUM(duration_seconds), SUM(session_count)
+                FROM {table}
+                WHERE bucket >= ?
+            '''
+            params = [since]
+            if client_name:
+                query += ' AND client_name = ?'
+                params.append(client_name)
+            query += ' GROUP BY bucket ORDER BY bucket'
+            
+            cursor.execute(query, params)
+            timeline = []
+            for bucket, bytes_sent, bytes_received, duration_seconds, session_count in cursor.fetchall():
+                timeline.append({
+                    'bucket': bucket,
+                    'bytes_sent': bytes_sent or 0,
+                    'bytes_received': bytes_received or 0,
+                    'total_bytes': (bytes_sent or 0) + (bytes_received or 0),
+                    'duration_seconds': duration_seconds or 0,
+                    'session_count': session_count or 0
+                })
+            
+            conn.close()
+            return timeline
+            
+        except Exception as e:
+            print(f"Error getting traffic timeline: {e}")
+            return []
+    
     @staticmethod
     def permanently_delete_revoked_clients():
         """Permanently delete all revoked clients and their history"""
@@ -2726,24 +4203,13 @@ class OpenVPNManager:
             if not revoked_clients:
                 return True, "No revoked clients found to delete"
             
-            deleted_count = 0
-            errors = []
-            
-            for client in revoked_clients:
-                try:
-                    success, message = OpenVPNManager.permanently_delete_client(client['name'])
-                    if success:
-                        deleted_count += 1
-                        print(f"✅ Permanently deleted: {client['name']}")
-                    else:
-                        errors.append(f"{client['name']}: {message}")
-                        print(f"❌ Failed to delete {client['name']}: {message}")
-                        
-                except Exception as e:
-                    errors.append(f"{client['name']}: {str(e)}")
-                    print(f"💥 Error deleting {client['name']}: {str(e)}")
+            deleted, errors = OpenVPNManager.permanently_delete_clients(
+                [client['name'] for client in revoked_clients]
+            )
+            for client_name, message in errors.items():
+                print(f"❌ Failed to delete {client_name}: {message}")
             
-            result_message = f"Permanently deleted {deleted_count} revoked clients"
+            result_message = f"Permanently deleted {len(deleted)} revoked clients"
             if errors:
                 result_message += f". Errors: {len(errors)}"
             
@@ -2758,215 +4224,261 @@ class OpenVPNManager:
     @staticmethod
     def permanently_delete_client(client_name):
         """Permanently delete a client and all associated data"""
-        try:
+        clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
+        deleted, errors = OpenVPNManager.permanently_delete_clients([client_name])
+        
+        if clean_name in deleted:
+            return True, f"Client {clean_name} permanently deleted"
+        return False, errors.get(clean_name, f"Error permanently deleting client {client_name}")
+    
+    @staticmethod
+    @with_pki_lock
+    def permanently_delete_clients(client_names):
+        """Permanently delete clients and all associated data with one CRL update.
+
+        Returns (deleted_names, {name: error_message})
+        """
+        clean_names = []
+        for client_name in client_names:
             clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
-            print(f"🗑️ Permanently deleting client: {clean_name}")
+            if clean_name and clean_name not in clean_names:
+                clean_names.append(clean_name)
+        
+        if not clean_names:
+            return [], {}
+        
+        try:
+            print(f"🗑️ Permanently deleting {len(clean_names)} client(s): {', '.join(clean_names)}")
             
-            # Step 1: Remove from index.txt file
-            if os.path.exists(INDEX_FILE):
+            # Step 1: Remove from index.txt file (one pass, atomic rename)
+            with pki_lock:
                 try:
-                    with open(INDEX_FILE, 'r') as f:
-                        lines = f.readlines()
-                    
-                    # Filter out lines containing this client
-                    filtered_lines = []
-                    removed_lines = 0
-                    
-                    for line in lines:
-                        if clean_name in line:
-                            print(f"📝 Removing from index.txt: {line.strip()}")
-                            removed_lines += 1
-                        else:
-                            filtered_lines.append(line)
-                    
-                    # Write back filtered content
-                    if removed_lines > 0:
-                        with open(INDEX_FILE, 'w') as f:
-                            f.writelines(filtered_lines)
-                        print(f"✅ Removed {removed_lines} entries from index.txt")
-                    
+                    removed_serials = OpenVPNManager.purge_index_entries(clean_names)
+                    print(f"✅ Removed {len(removed_serials)} entries from index.txt")
                 except Exception as e:
+                    removed_serials = []
                     print(f"⚠️ Error updating index.txt: {e}")
             
-            # Step 2: Remove certificate files
-            old_cwd = os.getcwd()
-            
-            try:
-                os.chdir(EASYRSA_DIR)
-                
-                cert_files = [
-                    f'pki/issued/{clean_name}.crt',
-                    f'pki/private/{clean_name}.key',
-                    f'pki/reqs/{clean_name}.req',
-                    f'pki/revoked/certs_by_serial/{clean_name}.crt',
-                    f'pki/revoked/private_by_serial/{clean_name}.key',
-                    f'pki/revoked/reqs_by_serial/{clean_name}.req'
+            # Step 2: Remove certificate files, by name and by the purged serials
+            pki_dir = f'{EASYRSA_DIR}/pki'
+            cert_files = []
+            for clean_name in clean_names:
+                cert_files += [
+                    f'{pki_dir}/issued/{clean_name}.crt',
+                    f'{pki_dir}/private/{clean_name}.key',
+                    f'{pki_dir}/reqs/{clean_name}.req',
+                    f'{pki_dir}/revoked/certs_by_serial/{clean_name}.crt',
+                    f'{pki_dir}/revoked/private_by_serial/{clean_name}.key',
+                    f'{pki_dir}/revoked/reqs_by_serial/{clean_name}.req'
+                ]
+            for serial in removed_serials:
+                cert_files += [
+                    f'{pki_dir}/certs_by_serial/{serial}.pem',
+                    f'{pki_dir}/revoked/certs_by_serial/{serial}.crt',
+                    f'{pki_dir}/revoked/private_by_serial/{serial}.key',
+                    f'{pki_dir}/revoked/reqs_by_serial/{serial}.req'
                 ]
-                
-                removed_files = 0
-                for file_path in cert_files:
-                    if os.path.exists(file_path):
-                        try:
-                            os.remove(file_path)
-                            print(f"🗑️ Removed certificate file: {file_path}")
-                            removed_files += 1
-                        except Exception as e:
-                            print(f"⚠️ Could not remove {file_path}: {e}")
-                
-                print(f"✅ Removed {removed_files} certificate files")
-                
-            finally:
-                os.chdir(old_cwd)
             
-            # Step 3: Remove config file
-            config_path = f'./{clean_name}.ovpn'
-            if os.path.exists(config_path):
+            removed_files = 0
+            for file_path in cert_files:
                 try:
-                    os.remove(config_path)
-                    print(f"🗑️ Removed config file: {config_path}")
+                    os.remove(file_path)
+                    removed_files += 1
+                except FileNotFoundError:
+                    pass
                 except Exception as e:
-                    print(f"⚠️ Could not remove config file: {e}")
+                    print(f"⚠️ Could not remove {file_path}: {e}")
             
-            # Step 4: Generate new CRL to update revocation list
-            try:
-                os.chdir(EASYRSA_DIR)
-                
-                # Generate new CRL
-                result = subprocess.run(
-                    ['./easyrsa', '--batch', '--days=3650', 'gen-crl'],
-                    capture_output=True, text=True, timeout=30
-                )
-                
-                if result.returncode == 0:
-                    # Copy CRL to OpenVPN directory
+            print(f"✅ Removed {removed_files} certificate files")
+            
+            # Step 3: Remove config files
+            for clean_name in clean_names:
+                config_path = client_config_file(clean_name)
+                if os.path.exists(config_path):
                     try:
-                        subprocess.run(['cp', 'pki/crl.pem', '/etc/openvpn/server/crl.pem'], check=True)
-                        subprocess.run(['chown', 'nobody:nogroup', '/etc/openvpn/server/crl.pem'], check=True)
-                        print(f"✅ CRL updated and copied to OpenVPN")
-                    except:
-                        pass  # Continue if chown fails
+                        os.remove(config_path)
+                        print(f"🗑️ Removed config file: {config_path}")
+                    except Exception as e:
+                        print(f"⚠️ Could not remove config file: {e}")
+            
+            # Step 4: Generate new CRL to update revocation list (once for the batch)
+            try:
+                success, message = OpenVPNManager.install_crl()
+                if success:
+                    print(f"✅ CRL updated and copied to OpenVPN")
                 else:
-                    print(f"⚠️ Failed to generate CRL: {result.stderr}")
+                    print(f"⚠️ {message}")
                     
             except Exception as e:
                 print(f"⚠️ CRL generation error: {e}")
-            finally:
-                os.chdir(old_cwd)
             
             # Step 5: Remove from database (traffic history and stats)
             try:
-                conn = sqlite3.connect(DATABASE_PATH)
+                conn = get_db_connection()
                 cursor = conn.cursor()
                 
-                # Remove traffic history
-                cursor.execute('DELETE FROM traffic_history WHERE client_name = ?', (clean_name,))
-                traffic_deleted = cursor.rowcount
+                # Remove traffic history with its rollups
+                traffic_deleted = delete_client_traffic(cursor, clean_names)
                 
-                # Remove client stats
-                cursor.execute('DELETE FROM client_stats WHERE client_name = ?', (clean_name,))
-                stats_deleted = cursor.rowcount
-                
-                # Remove temporary client records
-                cursor.execute('DELETE FROM temporary_clients WHERE client_name = ?', (clean_name,))
-                temp_deleted = cursor.rowcount
+                # Remove client stats and temporary client records
+                stats_deleted = temp_deleted = 0
+                for start in range(0, len(clean_names), 500):
+                    chunk = clean_names[start:start + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(f'DELETE FROM client_stats WHERE client_name IN ({placeholders})', chunk)
+                    stats_deleted += cursor.rowcount
+                    cursor.execute(f'DELETE FROM temporary_clients WHERE client_name IN ({placeholders})', chunk)
+                    temp_deleted += cursor.rowcount
                 
                 conn.commit()
                 conn.close()
                 
+                for clean_name in clean_names:
+                    session_writer.forget(clean_name)
                 print(f"💾 Removed {traffic_deleted} traffic records, {stats_deleted} client stats, and {temp_deleted} temporary client records")
                 
             except Exception as e:
                 print(f"⚠️ Database cleanup error: {e}")
             
-            # Step 6: Cancel any active timers
-            try:
-                OpenVPNManager.cancel_auto_revoke(clean_name)
-            except Exception as e:
-                print(f"⚠️ Timer cleanup error: {e}")
-            
-            # Step 7: Remove from active sessions tracking
-            if clean_name in active_sessions:
-                del active_sessions[clean_name]
-                print(f"🗑️ Removed from active sessions tracking")
-            
-            # Step 8: Force disconnect specific client only
-            try:
-                OpenVPNManager.force_disconnect_client(clean_name)
-                print(f"🔄 Forced disconnect of client {clean_name}")
-            except Exception as e:
-                print(f"⚠️ Client disconnect error: {e}")
+            for clean_name in clean_names:
+                # Step 6: Cancel any scheduled revocation (its database row is already gone)
+                expiry_scheduler.cancel(clean_name)
+                temporary_clients.pop(clean_name, None)
+                
+                # Step 7: Remove from active sessions tracking
+                if clean_name in active_sessions:
+                    del active_sessions[clean_name]
+                    print(f"🗑️ Removed {clean_name} from active sessions tracking")
+                
+                # Step 8: Force disconnect specific client only
+                try:
+                    OpenVPNManager.disconnect_client_session(clean_name)
+                except Exception as e:
+                    print(f"⚠️ Client disconnect error: {e}")
             
-            print(f"✅ Successfully permanently deleted client: {clean_name}")
-            return True, f"Client {clean_name} permanently deleted"
+            OpenVPNManager.signal_crl_reload()
+            client_registry.invalidate()
+            change_log.record_many([('delete', clean_name, {}) for clean_name in clean_names])
+            print(f"✅ Successfully permanently deleted {len(clean_names)} client(s)")
+            return clean_names, {}
             
         except Exception as e:
-            error_msg = f"Error permanently deleting client {client_name}: {str(e)}"
+            error_msg = f"Error permanently deleting clients: {str(e)}"
             print(f"💥 {error_msg}")
-            return False, error_msg
+            return [], {clean_name: error_msg for clean_name in clean_names}
     
     @staticmethod
-    def force_disconnect_client(client_name):
-        """Force disconnect a specific client from VPN using management interface"""
+    def purge_index_entries(client_names):
+        """Drop every index.txt row whose CN is in client_names, in one pass.
+
+        The kept rows are streamed into a temp file next to index.txt, which
+        is then renamed over it, so readers never see a partial index.
+        Returns the serials of the removed rows. Caller holds pki_lock.
+        """
+        names = set(client_names)
+        removed_serials = []
+        if not os.path.exists(INDEX_FILE):
+            return removed_serials
+        
+        fd, tmp_path = tempfile.mkstemp(prefix='.index.txt.', dir=os.path.dirname(INDEX_FILE))
         try:
-            clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
-            disconnected = False
+            with os.fdopen(fd, 'w') as out, open(INDEX_FILE, 'r') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    cn_match = CN_PATTERN.search(parts[5]) if len(parts) >= 6 else None
+                    if cn_match and cn_match.group(1).strip() in names:
+                        removed_serials.append(parts[3].strip())
+                        continue
+                    out.write(line)
             
-            # Method 1: Try OpenVPN management interface (if available)
-            management_ports = [7505, 7506, 1195]  # Common management ports
-            for port in management_ports:
-                try:
-                    import socket
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    sock.settimeout(2)
-                    result = sock.connect_ex(('127.0.0.1', port))
-                    if result == 0:
-                        # Connected to management interface
-                        sock.send(f"kill {clean_name}\n".encode())
-                        response = sock.recv(1024).decode()
-                        sock.close()
-                        if "SUCCESS" in response:
-                            print(f"✅ Disconnected {clean_name} via management interface on port {port}")
-                            disconnected = True
-                            break
-                    else:
-                        sock.close()
-                except:
-                    try:
-                        sock.close()
-                    except:
-                        pass
+            if removed_serials:
+                shutil.copymode(INDEX_FILE, tmp_path)
+                os.replace(tmp_path, INDEX_FILE)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        return removed_serials
+    
+    @staticmethod
+    def force_disconnect_client(client_name):
+        """Force disconnect a specific client from VPN using management interface"""
+        try:
+            OpenVPNManager.disconnect_client_session(client_name)
+            OpenVPNManager.signal_crl_reload()
+            return True
             
-            # Method 2: Find and terminate by process (safer approach)
-            if not disconnected:
+        except Exception as e:
+            print(f"⚠️ Error forcing disconnect for {client_name}: {e}")
+            return False
+    
+    @staticmethod
+    def disconnect_client_session(client_name):
+        """Drop a client's live session (management interface kill, then process signal)"""
+        clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
+        disconnected = False
+        
+        # Method 1: Try OpenVPN management interface (if available)
+        # The persistent connection holds the management socket, so use it first
+        killed = management_client.kill(clean_name)
+        if killed is not None:
+            if killed:
+                print(f"✅ Disconnected {clean_name} via management interface")
+                disconnected = True
+            management_ports = []
+        else:
+            management_ports = [7505, 7506, 1195]  # Common management ports
+        for port in management_ports:
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.settimeout(2)
+                result = sock.connect_ex(('127.0.0.1', port))
+                if result == 0:
+                    # Connected to management interface
+                    sock.send(f"kill {clean_name}\n".encode())
+                    response = sock.recv(1024).decode()
+                    sock.close()
+                    if "SUCCESS" in response:
+                        print(f"✅ Disconnected {clean_name} via management interface on port {port}")
+                        disconnected = True
+                        break
+                else:
+                    sock.close()
+            except:
                 try:
-                    # Look for client-specific processes
-                    result = subprocess.run(['pgrep', '-f', f'{clean_name}'], 
-                                          capture_output=True, text=True, timeout=5)
-                    if result.stdout.strip():
-                        pids = result.stdout.strip().split('\n')
-                        for pid in pids:
-                            if pid.strip():
-                                subprocess.run(['kill', '-TERM', pid.strip()], 
-                                             capture_output=True, text=True, timeout=5)
-                                print(f"🔌 Sent TERM signal to process {pid} for {clean_name}")
-                                disconnected = True
+                    sock.close()
                 except:
                     pass
-            
-            # Method 3: Signal OpenVPN to reread CRL (gentle approach)
+        
+        # Method 2: Find and terminate by process (safer approach)
+        if not disconnected:
             try:
-                # Send USR1 signal to OpenVPN to reread CRL without full restart
-                result = subprocess.run(['pkill', '-USR1', 'openvpn'], 
+                # Look for client-specific processes
+                result = subprocess.run(['pgrep', '-f', f'{clean_name}'], 
                                       capture_output=True, text=True, timeout=5)
-                print(f"📡 Sent USR1 signal to OpenVPN to reread CRL")
+                if result.stdout.strip():
+                    pids = result.stdout.strip().split('\n')
+                    for pid in pids:
+                        if pid.strip():
+                            subprocess.run(['kill', '-TERM', pid.strip()], 
+                                         capture_output=True, text=True, timeout=5)
+                            print(f"🔌 Sent TERM signal to process {pid} for {clean_name}")
+                            disconnected = True
             except:
                 pass
-            
-            return True
-            
-        except Exception as e:
-            print(f"⚠️ Error forcing disconnect for {client_name}: {e}")
-            return False
+        
+        return disconnected
+    
+    @staticmethod
+    def signal_crl_reload():
+        """Signal OpenVPN to reread CRL (gentle approach)"""
+        try:
+            # Send USR1 signal to OpenVPN to reread CRL without full restart
+            result = subprocess.run(['pkill', '-USR1', 'openvpn'], 
+                                  capture_output=True, text=True, timeout=5)
+            print(f"📡 Sent USR1 signal to OpenVPN to reread CRL")
+        except:
+            pass
     
     @staticmethod  
     def restart_openvpn_service():
@@ -2975,6 +4487,7 @@ class OpenVPNManager:
             # Try systemctl restart
             result = subprocess.run(['systemctl', 'restart', 'openvpn-server@server.service'], 
                                   capture_output=True, text=True, timeout=30)
+            probe_cache.invalidate('get_server_status', 'get_server_stats', 'get_active_connections')
             
             if result.returncode == 0:
                 print(f"✅ OpenVPN service restarted successfully")
@@ -3118,6 +4631,8 @@ class OpenVPNManager:
             # Write to file
             with open(SERVER_CONF_PATH, 'w') as f:
                 f.write('\n'.join(config_lines))
+            server_identity.invalidate()
+            probe_cache.invalidate('get_server_info')
             
             return {'success': True, 'backup': backup_path}
         except Exception as e:
@@ -3483,7 +4998,7 @@ class ClusterManager:
     def get_cluster_servers():
         """Get all servers in the cluster"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -3520,7 +5035,7 @@ class ClusterManager:
     def add_server(server_data):
         """Add a new server to the cluster"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -3568,7 +5083,7 @@ class ClusterManager:
     def remove_server(server_id):
         """Remove a server from the cluster"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             # Get server info before deletion
@@ -3649,7 +5164,7 @@ class ClusterManager:
         """Execute a command on a remote server"""
         try:
             import io
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -3737,7 +5252,7 @@ class ClusterManager:
     def assign_client_to_server(client_name, server_id, strategy='manual'):
         """Assign a client to a specific server"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             # Check if assignment already exists
@@ -3792,7 +5307,7 @@ class ClusterManager:
     def get_client_assignments():
         """Get all client assignments"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -3827,7 +5342,7 @@ class ClusterManager:
     def log_activity(server_id=None, activity_type='', description='', details=None, user_id='system'):
         """Log cluster activity"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -3845,7 +5360,7 @@ class ClusterManager:
     def get_cluster_activity(limit=50):
         """Get recent cluster activity"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -3877,80 +5392,1430 @@ class ClusterManager:
             return []
     
     @staticmethod
-    def get_cluster_status():
-        """Get overall cluster status"""
-        try:
-            servers = ClusterManager.get_cluster_servers()
-            assignments = ClusterManager.get_client_assignments()
-            
-            # Calculate statistics
-            total_servers = len(servers)
-            online_servers = len([s for s in servers if s['status'] == 'online'])
-            total_clients = len(assignments)
-            
-            # Mock active connections for now
-            active_connections = sum([15, 23, 8, 12][:online_servers])
-            
-            return {
-                'servers': servers,
-                'total_servers': total_servers,
-                'online_servers': online_servers,
-                'total_clients': total_clients,
-                'active_connections': active_connections,
-                'assignments': assignments,
-                'load_balancer': {
-                    'status': 'active' if online_servers > 0 else 'inactive',
-                    'next_server': servers[0]['id'] if servers else None
-                }
-            }
-            
-        except Exception as e:
-            print(f"Error getting cluster status: {e}")
-            return {
-                'servers': [],
-                'total_servers': 0,
-                'online_servers': 0,
-                'total_clients': 0,
-                'active_connections': 0,
-                'assignments': [],
-                'load_balancer': {'status': 'inactive', 'next_server': None}
-            }
-    
+    def get_cluster_status():
+        """Get overall cluster status"""
+        try:
+            servers = ClusterManager.get_cluster_servers()
+            assignments = ClusterManager.get_client_assignments()
+            
+            # Calculate statistics
+            total_servers = len(servers)
+            online_servers = len([s for s in servers if s['status'] == 'online'])
+            total_clients = len(assignments)
+            
+            # Mock active connections for now
+            active_connections = sum([15, 23, 8, 12][:online_servers])
+            
+            return {
+                'servers': servers,
+                'total_servers': total_servers,
+                'online_servers': online_servers,
+                'total_clients': total_clients,
+                'active_connections': active_connections,
+                'assignments': assignments,
+                'load_balancer': {
+                    'status': 'active' if online_servers > 0 else 'inactive',
+                    'next_server': servers[0]['id'] if servers else None
+                }
+            }
+            
+        except Exception as e:
+            print(f"Error getting cluster status: {e}")
+            return {
+                'servers': [],
+                'total_servers': 0,
+                'online_servers': 0,
+                'total_clients': 0,
+                'active_connections': 0,
+                'assignments': [],
+                'load_balancer': {'status': 'inactive', 'next_server': None}
+            }
+    
+    @staticmethod
+    def ping_all_servers():
+        """Ping all servers to check their status"""
+        servers = ClusterManager.get_cluster_servers()
+        
+        def ping_server(server):
+            try:
+                # Simple ping test
+                result = subprocess.run(['ping', '-c', '1', '-W', '3', server['host']], 
+                                      capture_output=True, text=True, timeout=5)
+                is_online = result.returncode == 0
+                
+                # Update server status
+                conn = get_db_connection()
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE cluster_servers 
+                    SET status = ?, last_ping = CURRENT_TIMESTAMP
+                    WHERE server_id = ?
+                ''', ('online' if is_online else 'offline', server['id']))
+                conn.commit()
+                conn.close()
+                
+                return server['id'], is_online
+                
+            except Exception as e:
+                print(f"Error pinging server {server['id']}: {e}")
+                return server['id'], False
+        
+        # Ping all servers in parallel
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            futures = [executor.submit(ping_server, server) for server in servers]
+            results = [future.result() for future in as_completed(futures)]
+        
+        return results
+
+# ======================== BACKGROUND METRICS SAMPLER ========================
+
+# How often the background sampler refreshes host metrics (seconds)
+METRICS_SAMPLE_INTERVAL = 2
+
+class MetricsSampler:
+    """Background thread keeping a rolling snapshot of host metrics.
+
+    psutil.cpu_percent(interval=1) and the two-reading bandwidth probe block the
+    caller for a second each, so request handlers read the latest snapshot
+    instead and the sampler derives bandwidth from consecutive NIC counters.
+    """
+
+    def __init__(self, interval=METRICS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._snapshot = None
+        self._last_net = None
+        self._last_sample_time = None
+
+    def start(self):
+        """Start the sampler thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # Prime cpu_percent so the next non-blocking call has a reference point
+            psutil.cpu_percent(interval=None)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"⚠️ Metrics sampler error: {e}")
+            time.sleep(self.interval)
+
+    def sample(self):
+        """Take one reading and publish it as the current snapshot"""
+        now = time.time()
+        sampled_at = datetime.now()
+
+        network_io = psutil.net_io_counters()
+        system_metrics = OpenVPNManager.format_system_metrics(
+            psutil.cpu_percent(interval=None),
+            psutil.virtual_memory(),
+            psutil.disk_usage('/'),
+            network_io,
+            len(OpenVPNManager.get_active_connections()),
+            timestamp=sampled_at
+        )
+
+        # Derive bandwidth from the previous sample's NIC counters
+        upload_speed = download_speed = 0
+        if self._last_net is not None and now > self._last_sample_time:
+            elapsed = now - self._last_sample_time
+            upload_speed = int(max(0, network_io.bytes_sent - self._last_net.bytes_sent) / elapsed)
+            download_speed = int(max(0, network_io.bytes_recv - self._last_net.bytes_recv) / elapsed)
+        self._last_net = network_io
+        self._last_sample_time = now
+
+        network_bandwidth = OpenVPNManager.format_network_bandwidth(
+            upload_speed, download_speed, timestamp=sampled_at
+        )
+
+        with self._lock:
+            self._snapshot = {
+                'system_metrics': system_metrics,
+                'network_bandwidth': network_bandwidth,
+                'sampled_at': now
+            }
+
+    def snapshot(self):
+        """Return the latest snapshot with its age in seconds"""
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+
+        with self._lock:
+            current = self._snapshot
+
+        if current is None:
+            # First request after startup: take a reading inline (non-blocking)
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"⚠️ Metrics sampler error: {e}")
+                return {
+                    'system_metrics': OpenVPNManager.empty_system_metrics(),
+                    'network_bandwidth': OpenVPNManager.format_network_bandwidth(0, 0),
+                    'sampled_at': None,
+                    'age_seconds': None
+                }
+            with self._lock:
+                current = self._snapshot
+
+        result = dict(current)
+        result['age_seconds'] = round(time.time() - current['sampled_at'], 3)
+        result['sampled_at'] = datetime.fromtimestamp(current['sampled_at']).isoformat()
+        return result
+
+metrics_sampler = MetricsSampler()
+
+# ======================== CHANGE FEED ========================
+
+# Events kept for /api/changes; older cursors get a full snapshot instead
+CHANGE_LOG_SIZE = 10000
+CHANGES_DEFAULT_LIMIT = 500
+CHANGES_MAX_LIMIT = 5000
+# Event types kept outside the ring buffer, latest one per client only
+CHANGE_LOG_COALESCED_TYPES = ('traffic_update',)
+# Event types that end a client's coalesced events
+CHANGE_LOG_FINAL_TYPES = ('disconnect', 'delete')
+
+class ChangeLog:
+    """Ring buffer of client events served by /api/changes.
+
+    Event types: connect, disconnect, traffic_update, create, revoke and
+    delete. Every event gets the next sequence number, so a client only
+    keeps the last number it saw as its cursor. Numbering starts from the
+    wall clock in microseconds: cursors handed out before a restart are
+    older than anything in the new buffer and get a snapshot instead of
+    silently missing events.
+
+    traffic_update events arrive every tracking tick for every active
+    client, so they are kept outside the ring, latest per client, and
+    dropped once the client disconnects or is deleted. They cannot push
+    connect/revoke/create events out of the buffer.
+    """
+
+    def __init__(self, size=CHANGE_LOG_SIZE):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=size)
+        self._latest = {}  # {client_name: coalesced event}
+        self._seq = int(time.time() * 1000000)
+        self._evicted_seq = self._seq  # Cursors below this have missed events
+
+    def record(self, event_type, client_name, **data):
+        self.record_many([(event_type, client_name, data)])
+
+    def record_many(self, events):
+        """Append (event_type, client_name, data) tuples in order"""
+        timestamp = datetime.now().isoformat()
+        with self._lock:
+            for event_type, client_name, data in events:
+                self._seq += 1
+                event = {
+                    'seq': self._seq,
+                    'type': event_type,
+                    'client': client_name,
+                    'timestamp': timestamp,
+                    'data': data
+                }
+                if event_type in CHANGE_LOG_COALESCED_TYPES:
+                    self._latest[client_name] = event
+                    continue
+                if event_type in CHANGE_LOG_FINAL_TYPES:
+                    self._latest.pop(client_name, None)
+                if len(self._events) == self._events.maxlen:
+                    self._evicted_seq = self._events[0]['seq']
+                self._events.append(event)
+
+    def cursor(self):
+        """Sequence number of the latest event"""
+        with self._lock:
+            return self._seq
+
+    def since(self, cursor, limit=CHANGES_DEFAULT_LIMIT):
+        """Events after cursor as (events, next_cursor, has_more).
+
+        Returns None when the cursor is unknown: evicted from the buffer,
+        or from a previous run of the server.
+        """
+        with self._lock:
+            if cursor > self._seq or cursor < self._evicted_seq:
+                return None
+            # Ring sequence numbers increase but have gaps where coalesced events were numbered
+            low, high = 0, len(self._events)
+            while low < high:
+                middle = (low + high) // 2
+                if self._events[middle]['seq'] <= cursor:
+                    low = middle + 1
+                else:
+                    high = middle
+            ring = itertools.islice(self._events, low, low + limit + 1)
+            latest = sorted((event for event in self._latest.values() if event['seq'] > cursor),
+                            key=lambda event: event['seq'])
+            events = list(itertools.islice(heapq.merge(ring, latest, key=lambda event: event['seq']), limit + 1))
+            has_more = len(events) > limit
+            if has_more:
+                events = events[:limit]
+                return events, events[-1]['seq'], True
+            return events, self._seq, False
+
+change_log = ChangeLog()
+
+# ======================== LIVE ACTIVITY STREAM ========================
+
+# Seconds between collection cycles while /api/stream has subscribers
+STREAM_INTERVAL = 2
+# Comment line sent when nothing changed, keeps proxies from closing idle streams
+STREAM_KEEPALIVE_SECONDS = 15
+# Browser reconnect delay sent with the stream
+STREAM_RETRY_MS = 5000
+# Events buffered per subscriber before it is resynced with a snapshot
+STREAM_QUEUE_SIZE = 64
+# Connection fields recomputed from the clock on every cycle, ignored when diffing
+STREAM_VOLATILE_FIELDS = ('connection_duration', 'duration_seconds', 'duration_formatted')
+
+class ActivityStream:
+    """Shared collector behind /api/stream (server-sent events).
+
+    While anyone is subscribed, one thread builds the /api/activity payload
+    every STREAM_INTERVAL seconds and pushes only what changed to every
+    subscriber queue, so open tabs share a single collection cycle. A new
+    subscriber first gets the latest full payload as a "snapshot" event,
+    then "delta" events. A subscriber that falls behind is resynced with a
+    fresh snapshot instead of growing its queue.
+    """
+
+    def __init__(self, interval=STREAM_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._state = None  # Last full payload
+        self._snapshot_event = None  # self._state formatted as an SSE event
+
+    @staticmethod
+    def format_event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    @staticmethod
+    def connection_key(connection):
+        return f"{connection.get('name')}|{connection.get('real_address')}"
+
+    @staticmethod
+    def diff(old, new):
+        """Changes between two /api/activity payloads, or None if nothing changed"""
+        delta = {}
+
+        def stable(connection):
+            return {key: value for key, value in connection.items() if key not in STREAM_VOLATILE_FIELDS}
+
+        old_rows = {ActivityStream.connection_key(row): row for row in old['active_connections']}
+        new_rows = {ActivityStream.connection_key(row): row for row in new['active_connections']}
+        upsert = [row for key, row in new_rows.items()
+                  if key not in old_rows or stable(old_rows[key]) != stable(row)]
+        removed = [key for key in old_rows if key not in new_rows]
+        if upsert or removed:
+            delta['connections'] = {'upsert': upsert, 'removed': removed}
+
+        old_activity, new_activity = old['client_activity'], new['client_activity']
+        changed = {name: value for name, value in new_activity.items() if old_activity.get(name) != value}
+        gone = [name for name in old_activity if name not in new_activity]
+        if changed or gone:
+            delta['client_activity'] = {'changed': changed, 'removed': gone}
+
+        for key in ('server_stats', 'client_stats'):
+            if old[key] != new[key]:
+                delta[key] = new[key]
+
+        if old['metrics_sampled_at'] != new['metrics_sampled_at']:
+            for key in ('system_metrics', 'network_bandwidth', 'metrics_sampled_at'):
+                delta[key] = new[key]
+
+        if not delta:
+            return None
+        delta['timestamp'] = new['timestamp']
+        return delta
+
+    def subscribe(self):
+        """Register a subscriber; returns the queue its formatted events arrive on"""
+        subscriber = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._state is not None:
+                subscriber.put_nowait(self._snapshot())
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _snapshot(self):
+        if self._snapshot_event is None:
+            self._snapshot_event = ActivityStream.format_event('snapshot', self._state)
+        return self._snapshot_event
+
+    def _offer(self, subscriber, event):
+        try:
+            subscriber.put_nowait(event)
+        except queue.Full:
+            # Too slow to keep up: drop the backlog and start it over from a snapshot
+            while True:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    break
+            subscriber.put_nowait(self._snapshot())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Nobody is listening; the next subscriber starts a new collector
+                    self._thread = None
+                    self._state = None
+                    self._snapshot_event = None
+                    return
+
+            try:
+                payload = build_activity_payload()
+            except Exception as e:
+                print(f"⚠️ Activity stream collection error: {e}")
+                time.sleep(self.interval)
+                continue
+
+            with self._lock:
+                previous = self._state
+                self._state = payload
+                self._snapshot_event = None
+                if previous is None:
+                    event = self._snapshot()
+                else:
+                    delta = ActivityStream.diff(previous, payload)
+                    event = ActivityStream.format_event('delta', delta) if delta else None
+                if event is not None:
+                    for subscriber in list(self._subscribers):
+                        self._offer(subscriber, event)
+
+            time.sleep(self.interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'collecting': self._thread is not None,
+                'interval_seconds': self.interval
+            }
+
+activity_stream = ActivityStream()
+
+# ======================== RESPONSE ENCODING ========================
+
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+GZIP_COMPRESSION_LEVEL = 6
+ZSTD_COMPRESSION_LEVEL = 3
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/csv', 'text/plain', 'text/css', 'application/javascript')
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() through orjson when it is installed.
+
+    Keys stay sorted and dates go through Flask's default(), as with the
+    stdlib provider. Objects orjson refuses (integers wider than 64 bits,
+    for instance) and debug-mode pretty printing use the stdlib encoder.
+    """
+
+    def response(self, *args, **kwargs):
+        if not ORJSON_AVAILABLE or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        try:
+            body = orjson.dumps(obj, default=self.default, option=options)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+app.json = FastJSONProvider(app)
+
+def negotiate_encoding():
+    """Best Content-Encoding the client accepts: zstd, gzip or None"""
+    if not has_request_context():
+        return None
+    accepted = request.accept_encodings
+    if ZSTD_AVAILABLE and accepted['zstd']:
+        return 'zstd'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response, encoding):
+    """Compress a buffered text response in place with encoding (see negotiate_encoding)"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if encoding is None or len(body) < COMPRESSION_MIN_SIZE:
+        return response
+
+    if encoding == 'zstd':
+        # Compressor objects are not thread-safe, and creating one is cheap
+        body = zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL).compress(body)
+    else:
+        body = gzip.compress(body, GZIP_COMPRESSION_LEVEL)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.after_request
+def compress_after_request(response):
+    return compress_response(response, negotiate_encoding())
+
+# Derived fields dropped by ?compact=1; each can be computed from the raw values kept
+CLIENT_DERIVED_FIELDS = ('days_until_expiry', 'expiry_status', 'profile')
+CONNECTION_DERIVED_FIELDS = ('connection_duration', 'duration_formatted')
+TRAFFIC_SUMMARY_DERIVED_FIELDS = ('sent_mb', 'received_mb', 'total_mb', 'sent_gb', 'received_gb', 'total_gb',
+                                  'duration_formatted', 'last_connection', 'last_session')
+
+def compact_requested():
+    return request.args.get('compact', '').lower() in ('1', 'true', 'yes')
+
+def drop_fields(items, fields):
+    """Copies of the dicts in items without fields"""
+    return [{key: value for key, value in item.items() if key not in fields} for item in items]
+
+# ======================== CONDITIONAL RESPONSES ========================
+
+# Serialized bodies kept per URL for requests that arrive without If-None-Match
+RESPONSE_CACHE_SIZE = 64
+# Part of every ETag, so tags handed out by an earlier run never match
+RESPONSE_VERSION_SALT = os.urandom(8).hex()
+
+def file_version(path):
+    """(mtime_ns, size, inode) of path, or None when it is missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def connections_version():
+    """Changes whenever get_active_connections may return something new"""
+    if status_watcher.available and not management_client.is_live():
+        return ('status', status_watcher.sequence)
+    # No file events to go by: follow the probe cache TTL instead
+    ttl = PROBE_CACHE_TTLS['get_active_connections'] or 1
+    return ('time', int(time.time() // ttl))
+
+class ResponseCache:
+    """Last serialized 200 body per URL and encoding, tagged with the ETag it was built for"""
+
+    def __init__(self, size=RESPONSE_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # {(url, encoding): (etag, body, mimetype, content_encoding)}
+
+    def get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, response):
+        entry = (etag, response.get_data(), response.mimetype, response.headers.get('Content-Encoding'))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+response_cache = ResponseCache()
+
+def versioned(*sources):
+    """Serve a GET endpoint with a strong ETag computed from version sources.
+
+    Each source is a callable returning the current version of something
+    the response depends on (a file signature, a write generation...). The
+    versions are read before the view runs; while they are unchanged,
+    If-None-Match gets a bodiless 304 and other requests get the body
+    serialized (and compressed) last time, so the view is not called at all.
+    Each content encoding has its own ETag, as strong validators require.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            url = request.full_path
+            encoding = negotiate_encoding()
+            versions = tuple(source() for source in sources)
+            etag = hashlib.sha1(repr((RESPONSE_VERSION_SALT, url, encoding, versions)).encode()).hexdigest()
+            
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.vary.add('Accept-Encoding')
+            else:
+                cached = response_cache.get((url, encoding), etag)
+                if cached is not None:
+                    _, body, mimetype, content_encoding = cached
+                    response = Response(body, mimetype=mimetype)
+                    response.vary.add('Accept-Encoding')
+                    if content_encoding:
+                        response.headers['Content-Encoding'] = content_encoding
+                else:
+                    response = app.make_response(func(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    response_cache.put((url, encoding), etag, compress_response(response, encoding))
+            
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+# OpenVPN management interface (server.conf: "management 127.0.0.1 7505")
+MANAGEMENT_HOST = '127.0.0.1'
+MANAGEMENT_PORT = 7505
+MANAGEMENT_PASSWORD = None  # Set if the management directive uses a password file
+MANAGEMENT_BYTECOUNT_INTERVAL = 5
+MANAGEMENT_STATUS_INTERVAL = 15
+MANAGEMENT_RECONNECT_DELAY = 10
+
+class ManagementInterfaceClient:
+    """Long-lived connection to the OpenVPN management interface.
+
+    Subscribes to >CLIENT: and >BYTECOUNT_CLI: notifications and keeps the live
+    connection table in memory; a periodic "status 3" reconciles the table in
+    case notifications are not emitted (they need management-client-auth on
+    some OpenVPN versions). OpenVPN serves one management client at a time, so
+    commands such as kill have to go through this connection while it is up.
+    """
+
+    def __init__(self, host=MANAGEMENT_HOST, port=MANAGEMENT_PORT, password=MANAGEMENT_PASSWORD):
+        self.host = host
+        self.port = port
+        self.password = password
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self._sock = None
+        self._connected = False
+        self._table_ready = False
+        self._clients = {}  # {client_id: connection fields as parsed from CLIENT_LIST}
+        self._pending = deque()  # Commands waiting for their response, in send order
+        self._client_event = None  # (event, client_id, env) while >CLIENT:ENV lines arrive
+        self._last_status_request = 0
+
+    def start(self):
+        """Start the connection thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def is_connected(self):
+        return self._connected
+
+    def _run(self):
+        while True:
+            try:
+                self._session()
+            except Exception as e:
+                if self._connected:
+                    print(f"⚠️ Management interface connection lost: {e}")
+            self._reset_connection()
+            time.sleep(MANAGEMENT_RECONNECT_DELAY)
+
+    def _reset_connection(self):
+        with self._send_lock:
+            sock, self._sock = self._sock, None
+            pending, self._pending = self._pending, deque()
+        if sock is not None:
+            try:
+                sock.close()
+            except Exception:
+                pass
+        with self._lock:
+            self._connected = False
+            self._table_ready = False
+            self._clients = {}
+            self._client_event = None
+        for entry in pending:
+            entry['done'].set()
+
+    def _session(self):
+        sock = socket.create_connection((self.host, self.port), timeout=5)
+        sock.settimeout(1)
+        with self._send_lock:
+            self._sock = sock
+        buffer = b''
+
+        while True:
+            if self._connected and time.time() - self._last_status_request >= MANAGEMENT_STATUS_INTERVAL:
+                self._request_status()
+
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                continue
+            if not data:
+                raise ConnectionError('management interface closed the connection')
+            buffer += data
+
+            # Password prompt is not newline-terminated
+            if buffer.startswith(b'ENTER PASSWORD:'):
+                buffer = buffer[len(b'ENTER PASSWORD:'):]
+                sock.sendall(f"{self.password or ''}\n".encode())
+
+            while b'\n' in buffer:
+                raw_line, buffer = buffer.split(b'\n', 1)
+                self._handle_line(raw_line.decode('utf-8', 'replace').rstrip('\r'))
+
+    def _send(self, command, multiline=False, callback=None):
+        """Queue a command; the reader thread matches responses in send order"""
+        entry = {'multiline': multiline, 'lines': [], 'result': None,
+                 'callback': callback, 'done': threading.Event()}
+        with self._send_lock:
+            if self._sock is None:
+                return None
+            self._pending.append(entry)
+            try:
+                self._sock.sendall(f"{command}\n".encode())
+            except OSError:
+                self._pending.remove(entry)
+                return None
+        return entry
+
+    def _request_status(self):
+        self._last_status_request = time.time()
+        self._send('status 3', multiline=True, callback=self._apply_status)
+
+    def _handle_line(self, line):
+        if line.startswith('>'):
+            self._handle_notification(line)
+            return
+
+        if not self._pending:
+            return
+        entry = self._pending[0]
+        if entry['multiline']:
+            if line == 'END' or line.startswith('ERROR:'):
+                entry['result'] = line
+            else:
+                entry['lines'].append(line)
+                return
+        elif line.startswith('SUCCESS:') or line.startswith('ERROR:'):
+            entry['result'] = line
+        else:
+            return
+
+        self._pending.popleft()
+        if entry['callback'] is not None and entry['result'] == 'END':
+            try:
+                entry['callback'](entry['lines'])
+            except Exception as e:
+                print(f"⚠️ Management interface response error: {e}")
+        entry['done'].set()
+
+    def _handle_notification(self, line):
+        if line.startswith('>INFO:'):
+            # Banner: authenticated and ready for commands
+            with self._lock:
+                self._connected = True
+            print(f"🔌 Connected to OpenVPN management interface on {self.host}:{self.port}")
+            self._send(f'bytecount {MANAGEMENT_BYTECOUNT_INTERVAL}')
+            self._request_status()
+
+        elif line.startswith('>BYTECOUNT_CLI:'):
+            parts = line[len('>BYTECOUNT_CLI:'):].split(',')
+            if len(parts) >= 3:
+                with self._lock:
+                    client = self._clients.get(parts[0])
+                    if client is not None:
+                        client['bytes_received'] = parts[1]
+                        client['bytes_sent'] = parts[2]
+
+        elif line.startswith('>CLIENT:ENV,'):
+            if self._client_event is None:
+                return
+            env_line = line[len('>CLIENT:ENV,'):]
+            if env_line == 'END':
+                event, client_id, env = self._client_event
+                self._client_event = None
+                self._apply_client_event(event, client_id, env)
+            else:
+                key, _, value = env_line.partition('=')
+                self._client_event[2][key] = value
+
+        elif line.startswith('>CLIENT:'):
+            parts = line[len('>CLIENT:'):].split(',')
+            if len(parts) >= 2 and parts[0] in ('CONNECT', 'REAUTH', 'ESTABLISHED', 'DISCONNECT'):
+                self._client_event = (parts[0], parts[1], {})
+
+    def _apply_client_event(self, event, client_id, env):
+        with self._lock:
+            if event == 'ESTABLISHED':
+                name = env.get('common_name', '')
+                if not name or name == 'UNDEF':
+                    return
+                real_address = env.get('trusted_ip', '')
+                if env.get('trusted_port'):
+                    real_address = f"{real_address}:{env['trusted_port']}"
+                connected_since = env.get('time_ascii', '')
+                if not connected_since and env.get('time_unix', '').isdigit():
+                    connected_since = datetime.fromtimestamp(int(env['time_unix'])).strftime('%Y-%m-%d %H:%M:%S')
+                self._clients[client_id] = {
+                    'name': name,
+                    'real_address': real_address,
+                    'virtual_address': env.get('ifconfig_pool_remote_ip') or 'N/A',
+                    'bytes_received': '0',
+                    'bytes_sent': '0',
+                    'connected_since': connected_since or 'N/A'
+                }
+            elif event == 'DISCONNECT':
+                self._clients.pop(client_id, None)
+            else:
+                return
+        status_watcher.notify()
+
+    def _apply_status(self, lines):
+        clients = {}
+        for line in lines:
+            parts = line.split('\t')
+            if parts[0] != 'CLIENT_LIST':
+                continue
+            client = OpenVPNManager.parse_client_list_fields(parts)
+            if client is not None:
+                client_id = parts[10].strip() if len(parts) > 10 and parts[10].strip() else client['name']
+                clients[client_id] = client
+        with self._lock:
+            self._clients = clients
+            self._table_ready = True
+
+    def is_live(self):
+        """True while the connection table is being kept up to date"""
+        return self._connected and self._table_ready
+
+    def get_connections(self):
+        """Current connections in get_active_connections format, or None if unavailable"""
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+
+        with self._lock:
+            if not self._connected or not self._table_ready:
+                return None
+            clients = [dict(client) for client in self._clients.values()]
+
+        return [OpenVPNManager.build_connection_entry(client) for client in clients]
+
+    def kill(self, common_name, timeout=5):
+        """Disconnect a client by common name.
+
+        Returns True/False for the management response, or None when no
+        management connection is available.
+        """
+        if not self._connected:
+            return None
+        entry = self._send(f'kill {common_name}')
+        if entry is None or not entry['done'].wait(timeout) or entry['result'] is None:
+            return None
+        if entry['result'].startswith('SUCCESS'):
+            with self._lock:
+                self._clients = {client_id: client for client_id, client in self._clients.items()
+                                 if client['name'] != common_name}
+            return True
+        return False
+
+management_client = ManagementInterfaceClient()
+
+# ======================== PRE-GENERATED KEYPAIR POOL ========================
+
+# Client keys kept ready for signing (EasyRSA default: RSA 2048, nopass)
+KEYPAIR_POOL_SIZE = 8
+KEYPAIR_RSA_BITS = 2048
+KEYPAIR_POOL_IDLE_DELAY = 3  # seconds without a claim before refilling
+
+try:
+    from cryptography import x509
+    from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    CRYPTOGRAPHY_AVAILABLE = True
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+
+class KeypairPool:
+    """Background pool of pre-generated client private keys.
+
+    Key generation is most of the time spent in `easyrsa build-client-full`,
+    so the pool keeps keys ready and client creation only writes the key and
+    a CSR into the PKI and runs `easyrsa sign-req`. Refilling waits until no
+    client has been created for a few seconds so it stays off the hot path.
+    Keys only live in memory and are lost on restart.
+    """
+
+    def __init__(self, size=KEYPAIR_POOL_SIZE, bits=KEYPAIR_RSA_BITS, idle_delay=KEYPAIR_POOL_IDLE_DELAY):
+        self.size = size
+        self.bits = bits
+        self.idle_delay = idle_delay
+        self._keys = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_claim = 0
+        self._generated = 0
+        self._claimed = 0
+        self._misses = 0
+        self._generation_seconds = 0.0
+        self._last_refill = None
+
+    def is_available(self):
+        return CRYPTOGRAPHY_AVAILABLE and self.size > 0
+
+    def start(self):
+        """Start the refill thread (idempotent)"""
+        if not self.is_available():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while len(self._keys) >= self.size:
+                    self._cond.wait()
+                idle_for = time.time() - self._last_claim
+                if idle_for < self.idle_delay:
+                    self._cond.wait(self.idle_delay - idle_for)
+                    continue
+
+            try:
+                started = time.time()
+                key = self.generate()
+                elapsed = time.time() - started
+            except Exception as e:
+                print(f"⚠️ Keypair pool generation error: {e}")
+                time.sleep(self.idle_delay)
+                continue
+
+            with self._cond:
+                self._keys.append(key)
+                self._generated += 1
+                self._generation_seconds += elapsed
+                self._last_refill = datetime.now()
+
+    def generate(self):
+        """Generate a key now, bypassing the pool"""
+        return rsa.generate_private_key(public_exponent=65537, key_size=self.bits)
+
+    def claim(self):
+        """Take a pre-generated key, or None when the pool is empty"""
+        if not self.is_available():
+            return None
+        self.start()
+        with self._cond:
+            self._last_claim = time.time()
+            if not self._keys:
+                self._misses += 1
+                return None
+            key = self._keys.popleft()
+            self._claimed += 1
+            self._cond.notify_all()
+            return key
+
+    @staticmethod
+    def write_request(key, client_name, pki_dir):
+        """Write key and CSR for client_name where `easyrsa sign-req` expects them"""
+        key_pem = key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        csr = x509.CertificateSigningRequestBuilder().subject_name(
+            x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, client_name)])
+        ).sign(key, hashes.SHA256())
+
+        key_path = os.path.join(pki_dir, 'private', f'{client_name}.key')
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key_pem)
+        with open(os.path.join(pki_dir, 'reqs', f'{client_name}.req'), 'wb') as f:
+            f.write(csr.public_bytes(serialization.Encoding.PEM))
+
+    def stats(self):
+        """Pool depth and refill counters"""
+        with self._cond:
+            generated = self._generated
+            return {
+                'available': self.is_available(),
+                'running': self._thread is not None and self._thread.is_alive(),
+                'depth': len(self._keys),
+                'target_depth': self.size,
+                'key_bits': self.bits,
+                'generated': generated,
+                'claimed': self._claimed,
+                'misses': self._misses,
+                'avg_generation_ms': round(self._generation_seconds / generated * 1000, 1) if generated else None,
+                'refill_rate_per_minute': round(60 / (self._generation_seconds / generated), 1) if generated and self._generation_seconds else None,
+                'idle_delay_seconds': self.idle_delay,
+                'last_refill': self._last_refill.isoformat() if self._last_refill else None
+            }
+
+keypair_pool = KeypairPool()
+
+# Certificate backend for issue/revoke/gen-crl: 'easyrsa' forks the EasyRSA
+# script, 'python' signs in-process with the CA key (requires an unencrypted
+# pki/private/ca.key, as created by openvpn-install.sh with nopass)
+PKI_SIGNING_BACKEND = 'easyrsa'
+CRL_VALIDITY_DAYS = 3650
+
+class InProcessSigner:
+    """In-process replacement for `easyrsa sign-req`, `revoke` and `gen-crl`.
+
+    The CA certificate and key are loaded once and reloaded only when the
+    files change. Certificates use the EasyRSA client profile (CN-only
+    subject, clientAuth, SHA-256) and the PKI is updated in the layout the
+    script itself produces: index.txt rows, random serials in pki/serial,
+    certs_by_serial copies, the revoked/*_by_serial moves and pki/crl.pem.
+    EasyRSA can keep operating on the same PKI.
+    """
+
+    def __init__(self):
+        # Shared with easyrsa invocations so both backends never interleave
+        self._lock = pki_lock
+        self._ca = None
+
+    def is_enabled(self):
+        return PKI_SIGNING_BACKEND == 'python' and CRYPTOGRAPHY_AVAILABLE
+
+    @staticmethod
+    def _pki_path(*parts):
+        return os.path.join(EASYRSA_DIR, 'pki', *parts)
+
+    @staticmethod
+    def _format_time(value):
+        """index.txt timestamp (UTCTime before 2050, GeneralizedTime after)"""
+        return value.strftime('%y%m%d%H%M%SZ' if value.year < 2050 else '%Y%m%d%H%M%SZ')
+
+    @staticmethod
+    def _parse_time(value):
+        value = value.split(',')[0]
+        return datetime.strptime(value, '%y%m%d%H%M%SZ' if len(value) == 13 else '%Y%m%d%H%M%SZ')
+
+    @staticmethod
+    def _format_serial(serial):
+        serial_hex = format(serial, 'X')
+        return serial_hex if len(serial_hex) % 2 == 0 else '0' + serial_hex
+
+    @staticmethod
+    def _write_atomic(path, data, mode=0o644):
+        tmp_path = f'{path}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _load_ca(self):
+        """Return (ca_cert, ca_key), re-reading them only when the files change"""
+        cert_path = self._pki_path('ca.crt')
+        key_path = self._pki_path('private', 'ca.key')
+        cert_stat, key_stat = os.stat(cert_path), os.stat(key_path)
+        signature = (cert_path, cert_stat.st_mtime_ns, cert_stat.st_ino, key_stat.st_mtime_ns, key_stat.st_ino)
+
+        if self._ca is None or self._ca[0] != signature:
+            with open(cert_path, 'rb') as f:
+                ca_cert = x509.load_pem_x509_certificate(f.read())
+            with open(key_path, 'rb') as f:
+                ca_key = serialization.load_pem_private_key(f.read(), password=None)
+            self._ca = (signature, ca_cert, ca_key)
+            print(f"🔑 CA loaded for in-process signing: {ca_cert.subject.rfc4514_string()}")
+
+        return self._ca[1], self._ca[2]
+
+    def _read_index(self):
+        with open(self._pki_path('index.txt'), 'r') as f:
+            return f.read().splitlines()
+
+    def _write_index(self, lines):
+        """Replace index.txt atomically, keeping index.txt.old like openssl ca.
+
+        index.txt is never missing, even briefly: ClientRegistry reads it
+        without pki_lock.
+        """
+        index_path = self._pki_path('index.txt')
+        if os.path.exists(index_path):
+            shutil.copy2(index_path, f'{index_path}.old')
+        fd, tmp_path = tempfile.mkstemp(prefix='.index.txt.', dir=os.path.dirname(index_path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(''.join(f'{line}\n' for line in lines))
+            if os.path.exists(index_path):
+                shutil.copymode(index_path, tmp_path)
+            os.replace(tmp_path, index_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def issue(self, client_name, days, key=None):
+        """Sign a client certificate for client_name and record it in the PKI; returns the serial"""
+        with self._lock:
+            ca_cert, ca_key = self._load_ca()
+            if key is None:
+                key = rsa.generate_private_key(public_exponent=65537, key_size=KEYPAIR_RSA_BITS)
+
+            lines = self._read_index()
+            used_serials = {line.split('\t')[3] for line in lines if line.count('\t') >= 5}
+            while True:
+                # EasyRSA default: random 128-bit serial
+                serial = int.from_bytes(os.urandom(16), 'big') >> 1
+                serial_hex = self._format_serial(serial)
+                if serial and serial_hex not in used_serials:
+                    break
+
+            now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+            not_after = now + timedelta(days=int(days))
+            subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, client_name)])
+
+            cert = x509.CertificateBuilder().subject_name(
+                subject
+            ).issuer_name(
+                ca_cert.subject
+            ).public_key(
+                key.public_key()
+            ).serial_number(
+                serial
+            ).not_valid_before(
+                now
+            ).not_valid_after(
+                not_after
+            ).add_extension(
+                x509.BasicConstraints(ca=False, path_length=None), critical=False
+            ).add_extension(
+                x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False
+            ).add_extension(
+                x509.AuthorityKeyIdentifier(
+                    key_identifier=x509.SubjectKeyIdentifier.from_public_key(ca_key.public_key()).digest,
+                    authority_cert_issuer=[x509.DirectoryName(ca_cert.issuer)],
+                    authority_cert_serial_number=ca_cert.serial_number
+                ), critical=False
+            ).add_extension(
+                x509.ExtendedKeyUsage([ExtendedKeyUsageOID.CLIENT_AUTH]), critical=False
+            ).add_extension(
+                x509.KeyUsage(digital_signature=True, content_commitment=False, key_encipherment=False,
+                              data_encipherment=False, key_agreement=False, key_cert_sign=False,
+                              crl_sign=False, encipher_only=False, decipher_only=False), critical=False
+            ).sign(ca_key, hashes.SHA256())
+
+            cert_pem = cert.public_bytes(serialization.Encoding.PEM)
+            KeypairPool.write_request(key, client_name, self._pki_path())
+            self._write_atomic(self._pki_path('issued', f'{client_name}.crt'), cert_pem)
+            self._write_atomic(self._pki_path('certs_by_serial', f'{serial_hex}.pem'), cert_pem)
+
+            lines.append('\t'.join(['V', self._format_time(not_after), '', serial_hex, 'unknown', f'/CN={client_name}']))
+            self._write_index(lines)
+            self._write_atomic(self._pki_path('serial'), f'{self._format_serial(serial + 1)}\n'.encode())
+
+            print(f"✅ Signed in-process: {client_name} (serial {serial_hex})")
+            return serial_hex
+
+    def revoke(self, client_names):
+        """Mark the issued certificates of client_names revoked; returns (revoked, {name: error})"""
+        revoked, failed = [], {}
+        with self._lock:
+            targets = {}
+            for client_name in client_names:
+                try:
+                    with open(self._pki_path('issued', f'{client_name}.crt'), 'rb') as f:
+                        serial = x509.load_pem_x509_certificate(f.read()).serial_number
+                    targets[self._format_serial(serial)] = client_name
+                except Exception as e:
+                    failed[client_name] = f"Cannot read certificate: {e}"
+
+            lines = self._read_index()
+            revoke_time = self._format_time(datetime.now(timezone.utc))
+            for i, line in enumerate(lines):
+                parts = line.split('\t')
+                if len(parts) >= 6 and parts[0] == 'V' and parts[3] in targets:
+                    parts[0], parts[2] = 'R', revoke_time
+                    lines[i] = '\t'.join(parts)
+                    revoked.append((targets.pop(parts[3]), parts[3]))
+
+            for client_name in targets.values():
+                failed[client_name] = "Certificate is not valid in index.txt"
+
+            if revoked:
+                self._write_index(lines)
+
+            # Same file moves as `easyrsa revoke`
+            for client_name, serial_hex in revoked:
+                moves = [
+                    (('issued', f'{client_name}.crt'), ('revoked', 'certs_by_serial', f'{serial_hex}.crt')),
+                    (('private', f'{client_name}.key'), ('revoked', 'private_by_serial', f'{serial_hex}.key')),
+                    (('reqs', f'{client_name}.req'), ('revoked', 'reqs_by_serial', f'{serial_hex}.req'))
+                ]
+                for source, target in moves:
+                    source_path, target_path = self._pki_path(*source), self._pki_path(*target)
+                    try:
+                        if os.path.exists(source_path):
+                            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                            os.replace(source_path, target_path)
+                    except Exception as e:
+                        print(f"⚠️ Could not move {source_path}: {e}")
+                try:
+                    os.remove(self._pki_path('certs_by_serial', f'{serial_hex}.pem'))
+                except FileNotFoundError:
+                    pass
+
+        return [client_name for client_name, _ in revoked], failed
+
+    def write_crl(self, days=CRL_VALIDITY_DAYS):
+        """Regenerate pki/crl.pem from the revoked rows of index.txt"""
+        with self._lock:
+            ca_cert, ca_key = self._load_ca()
+            now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+            builder = x509.CertificateRevocationListBuilder().issuer_name(
+                ca_cert.subject
+            ).last_update(
+                now
+            ).next_update(
+                now + timedelta(days=days)
+            ).add_extension(
+                x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_key.public_key()), critical=False
+            )
+
+            for line in self._read_index():
+                parts = line.split('\t')
+                if len(parts) >= 6 and parts[0] == 'R':
+                    builder = builder.add_revoked_certificate(
+                        x509.RevokedCertificateBuilder().serial_number(
+                            int(parts[3], 16)
+                        ).revocation_date(
+                            self._parse_time(parts[2])
+                        ).build()
+                    )
+
+            # openssl only numbers CRLs when pki/crlnumber exists
+            crlnumber_path = self._pki_path('crlnumber')
+            if os.path.exists(crlnumber_path):
+                with open(crlnumber_path, 'r') as f:
+                    crl_number = int(f.read().strip() or '1', 16)
+                builder = builder.add_extension(x509.CRLNumber(crl_number), critical=False)
+                self._write_atomic(crlnumber_path, f'{self._format_serial(crl_number + 1)}\n'.encode())
+
+            crl = builder.sign(ca_key, hashes.SHA256())
+            self._write_atomic(self._pki_path('crl.pem'), crl.public_bytes(serialization.Encoding.PEM))
+
+pki_signer = InProcessSigner()
+
+# ======================== BULK CLIENT PROVISIONING ========================
+
+BULK_PROVISION_WORKERS = 4
+BULK_PROVISION_MAX_CLIENTS = 10000
+BULK_JOB_HISTORY = 20
+
+class BulkProvisioner:
+    """Background jobs issuing many clients through a bounded worker pool.
+
+    Workers take a pooled key (or generate one) before add_client_direct, so
+    key generation runs in parallel and only signing waits for the index
+    lock. Group assignments are written in one transaction when the job
+    finishes.
+    """
+
+    def __init__(self, workers=BULK_PROVISION_WORKERS, history=BULK_JOB_HISTORY):
+        self.workers = workers
+        self.history = history
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._executor = None
+
+    @staticmethod
+    def parse_csv(text):
+        """Parse "name[,group[,profile[,expiry_days]]]" rows, with an optional header row"""
+        entries = []
+        for row in csv.reader(io.StringIO(text)):
+            row = [cell.strip() for cell in row]
+            if not row or not row[0] or row[0].startswith('#'):
+                continue
+            if not entries and row[0].lower() in ('name', 'client', 'client_name'):
+                continue
+            entry = {'name': row[0]}
+            for field, value in zip(('group', 'profile', 'expiry_days'), row[1:]):
+                if value:
+                    entry[field] = value
+            entries.append(entry)
+        return entries
+
     @staticmethod
-    def ping_all_servers():
-        """Ping all servers to check their status"""
-        servers = ClusterManager.get_cluster_servers()
-        
-        def ping_server(server):
+    def normalize_entries(entries, defaults):
+        """Validate request entries; returns (clients, errors)"""
+        clients, errors, seen = [], [], set()
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'name': entry}
+            if not isinstance(entry, dict):
+                errors.append(f"Invalid entry: {entry!r}")
+                continue
+
+            clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', str(entry.get('name', '')).strip())
+            if not clean_name:
+                errors.append(f"Invalid client name: {entry.get('name')!r}")
+                continue
+            if clean_name in seen:
+                errors.append(f"{clean_name}: duplicate name")
+                continue
+
+            expiry = str(entry.get('expiry_days', defaults.get('expiry_days', 3650)))
+            if not expiry.startswith('auto_'):
+                try:
+                    expiry_days = int(expiry)
+                    if expiry_days <= 0 or expiry_days > 36500:
+                        raise ValueError
+                except ValueError:
+                    errors.append(f"{clean_name}: invalid expiry period {expiry!r}")
+                    continue
+
+            seen.add(clean_name)
+            clients.append({
+                'name': clean_name,
+                'group': str(entry.get('group', defaults.get('group', ''))).strip(),
+                'profile': str(entry.get('profile', defaults.get('profile', 'standard'))).strip() or 'standard',
+                'expiry_days': expiry
+            })
+        return clients, errors
+
+    def submit(self, clients):
+        """Start a job for normalized clients and return its id"""
+        job_id = os.urandom(8).hex()
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'total': len(clients),
+            'completed': 0,
+            'created': [],
+            'failed': {},
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None
+        }
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bulk-provision')
+            self._jobs[job_id] = job
+            finished = [old_id for old_id, old_job in self._jobs.items() if old_job['finished_at']]
+            for old_id in finished[:max(0, len(self._jobs) - self.history)]:
+                del self._jobs[old_id]
+
+        threading.Thread(target=self._run, args=(job, clients), daemon=True).start()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            result = dict(job, created=list(job['created']), failed=dict(job['failed']))
+        result['progress'] = round(result['completed'] / result['total'] * 100, 1) if result['total'] else 100.0
+        return result
+
+    def list_jobs(self):
+        with self._lock:
+            job_ids = list(self._jobs)
+        return [self.get(job_id) for job_id in job_ids]
+
+    @staticmethod
+    def _provision(client):
+        """Issue one client; returns (success, message)"""
+        if os.path.exists(f'{EASYRSA_DIR}/pki/issued/{client["name"]}.crt'):
+            return False, "Client with this name already exists"
+
+        auto_hours = OpenVPNManager.parse_auto_revoke_hours(client['expiry_days'])
+        expiry_days = 1 if auto_hours else int(client['expiry_days'])
+
+        # Key generation is the slow part; do it before queueing for the PKI lock
+        key = keypair_pool.claim()
+        if key is None and keypair_pool.is_available():
+            key = keypair_pool.generate()
+
+        success, message = OpenVPNManager.add_client_direct(
+            client['name'], expiry_days, client['group'], client['profile'], key=key
+        )
+        if success and auto_hours:
+            OpenVPNManager.schedule_auto_revoke(client['name'], auto_hours)
+        return success, message
+
+    def _run(self, job, clients):
+        with self._lock:
+            job['status'] = 'running'
+        print(f"📦 Bulk provisioning job {job['id']}: {len(clients)} client(s)")
+
+        group_rows = []
+        futures = {self._executor.submit(BulkProvisioner._provision, client): client for client in clients}
+        for future in as_completed(futures):
+            client = futures[future]
             try:
-                # Simple ping test
-                result = subprocess.run(['ping', '-c', '1', '-W', '3', server['host']], 
-                                      capture_output=True, text=True, timeout=5)
-                is_online = result.returncode == 0
-                
-                # Update server status
-                conn = sqlite3.connect(DATABASE_PATH)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE cluster_servers 
-                    SET status = ?, last_ping = CURRENT_TIMESTAMP
-                    WHERE server_id = ?
-                ''', ('online' if is_online else 'offline', server['id']))
-                conn.commit()
-                conn.close()
-                
-                return server['id'], is_online
-                
+                success, message = future.result()
             except Exception as e:
-                print(f"Error pinging server {server['id']}: {e}")
-                return server['id'], False
-        
-        # Ping all servers in parallel
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(ping_server, server) for server in servers]
-            results = [future.result() for future in as_completed(futures)]
-        
-        return results
+                success, message = False, f"Error: {e}"
+
+            with self._lock:
+                job['completed'] += 1
+                if success:
+                    job['created'].append(client['name'])
+                else:
+                    job['failed'][client['name']] = message
+            if success and client['group']:
+                group_rows.append((client['name'], client['group']))
+
+        if group_rows:
+            try:
+                conn = get_db_connection()
+                try:
+                    conn.executemany('''
+                        INSERT OR REPLACE INTO client_groups (client_name, group_name, assigned_at)
+                        VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ''', group_rows)
+                    conn.commit()
+                finally:
+                    conn.close()
+                client_registry.invalidate_groups()
+            except Exception as e:
+                print(f"⚠️ Bulk provisioning could not save groups: {e}")
+                with self._lock:
+                    job['group_error'] = str(e)
+
+        with self._lock:
+            job['status'] = 'completed'
+            job['finished_at'] = datetime.now().isoformat()
+        print(f"✅ Bulk provisioning job {job['id']}: {len(job['created'])} created, {len(job['failed'])} failed")
+
+bulk_provisioner = BulkProvisioner()
 
 @app.route('/')
 @auth.login_required
@@ -3984,17 +6849,12 @@ def clients_page():
     client_activity = OpenVPNManager.get_client_activity()
     
     # Merge activity data with client list
+    connections = {conn['name']: conn for conn in active_connections}
     for client in clients:
-        # Check if client is currently connected
-        client['is_online'] = False
-        client['current_connection'] = None
+        conn = connections.get(client['name'])
+        client['is_online'] = conn is not None
+        client['current_connection'] = conn
         client['last_activity'] = client_activity.get(client['name'], 'Never')
-        
-        for conn in active_connections:
-            if conn['name'] == client['name']:
-                client['is_online'] = True
-                client['current_connection'] = conn
-                break
     
     return render_template('clients.html', clients=clients)
 
@@ -4245,13 +7105,25 @@ def restore_client():
 @auth.login_required
 def download_config(client_name):
     """Download client configuration file"""
-    config_path = f'./{client_name}.ovpn'
-    
-    if not os.path.exists(config_path):
+    if re.sub(r'[^0-9a-zA-Z_-]', '_', client_name) != client_name:
         flash('Configuration file not found', 'error')
         return redirect(request.referrer or url_for('clients_page'))
     
-    return send_file(config_path, as_attachment=True, download_name=f'{client_name}.ovpn')
+    try:
+        chunks = config_renderer.render(client_name)
+    except FileNotFoundError:
+        # Clients created before on-demand rendering may only have a stored copy
+        config_path = client_config_file(client_name)
+        if not os.path.exists(config_path):
+            flash('Configuration file not found', 'error')
+            return redirect(request.referrer or url_for('clients_page'))
+        return send_file(config_path, as_attachment=True, download_name=f'{client_name}.ovpn')
+    except Exception as e:
+        flash(f'Cannot build configuration: {str(e)}', 'error')
+        return redirect(request.referrer or url_for('clients_page'))
+    
+    return Response(chunks, mimetype='application/x-openvpn-profile',
+                    headers={'Content-Disposition': f'attachment; filename={client_name}.ovpn'})
 
 @app.route('/api/status')
 @auth.login_required
@@ -4265,14 +7137,77 @@ def api_status():
 
 @app.route('/api/clients')
 @auth.login_required
+@versioned(
+    client_registry.version,
+    lambda: datetime.now().date(),  # Days left and expiry status
+    lambda: (connections_version(), db_pool.generation()) if request.args else None  # Paginated view only
+)
 def api_clients():
-    """API to get client list"""
-    return jsonify(OpenVPNManager.get_clients())
+    """API to get client list; any query parameter but compact switches to a paginated response"""
+    compact = compact_requested()
+    if not set(request.args) - {'compact'}:
+        clients = OpenVPNManager.get_clients()
+        return jsonify(drop_fields(clients, CLIENT_DERIVED_FIELDS) if compact else clients)
+    
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(CLIENT_QUERY_MAX_LIMIT, max(1, int(request.args.get('limit', CLIENT_QUERY_DEFAULT_LIMIT))))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'offset and limit must be integers'}), 400
+    
+    sort = request.args.get('sort', 'name')
+    if sort not in CLIENT_SORT_KEYS:
+        return jsonify({'success': False, 'error': f"sort must be one of: {', '.join(CLIENT_SORT_KEYS)}"}), 400
+    
+    online = request.args.get('online')
+    if online is not None:
+        online = online.lower() in ('1', 'true', 'yes')
+    
+    connections = {conn['name']: conn for conn in OpenVPNManager.get_active_connections()}
+    last_activity = OpenVPNManager.get_last_activity() if sort == 'last_activity' else None
+    
+    total, records = client_registry.query(
+        offset=offset,
+        limit=limit,
+        sort=sort,
+        descending=request.args.get('order', 'asc').lower() == 'desc',
+        status=request.args.get('status'),
+        group=request.args.get('group'),
+        expiry_status=request.args.get('expiry_status'),
+        online=online,
+        search=request.args.get('search'),
+        online_names=set(connections),
+        last_activity=last_activity
+    )
+    
+    if last_activity is None:
+        last_activity = OpenVPNManager.get_last_activity([record.name for record in records])
+    
+    today = datetime.now().date()
+    clients = []
+    for record in records:
+        client = record.to_dict(today)
+        client['is_online'] = record.name in connections
+        client['current_connection'] = connections.get(record.name)
+        client['last_activity'] = last_activity.get(record.name)
+        clients.append(client)
+    
+    if compact:
+        clients = drop_fields(clients, CLIENT_DERIVED_FIELDS)
+        for client in clients:
+            if client['current_connection'] is not None:
+                client['current_connection'] = drop_fields([client['current_connection']], CONNECTION_DERIVED_FIELDS)[0]
+    
+    return jsonify({
+        'success': True,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'clients': clients
+    })
 
-@app.route('/api/activity')
-@auth.login_required
-def api_activity():
-    """API to get real-time activity data"""
+def build_activity_payload():
+    """Real-time activity data served by /api/activity and /api/stream"""
     active_connections = OpenVPNManager.get_active_connections()
     client_activity = OpenVPNManager.get_client_activity()
     server_stats = OpenVPNManager.get_server_stats()
@@ -4284,13 +7219,10 @@ def api_activity():
     currently_connected = len(active_connections)
     offline_clients = max(0, total_active_clients - currently_connected)
     
-    # Get system metrics
-    system_metrics = OpenVPNManager.get_system_metrics()
-    
-    # Get network bandwidth
-    network_bandwidth = OpenVPNManager.get_network_bandwidth()
+    # System metrics and bandwidth come from the background sampler snapshot
+    metrics = metrics_sampler.snapshot()
     
-    return jsonify({
+    return {
         'active_connections': active_connections,
         'client_activity': client_activity,
         'server_stats': server_stats,
@@ -4299,9 +7231,81 @@ def api_activity():
             'currently_connected': currently_connected,
             'offline_clients': offline_clients
         },
-        'system_metrics': system_metrics,
-        'network_bandwidth': network_bandwidth,
+        'system_metrics': metrics['system_metrics'],
+        'network_bandwidth': metrics['network_bandwidth'],
+        'metrics_sampled_at': metrics['sampled_at'],
+        'metrics_age_seconds': metrics['age_seconds'],
         'timestamp': datetime.now().isoformat()
+    }
+
+@app.route('/api/activity')
+@auth.login_required
+def api_activity():
+    """API to get real-time activity data"""
+    return jsonify(build_activity_payload())
+
+@app.route('/api/changes')
+@auth.login_required
+def api_changes():
+    """API to get client events after a cursor; unknown cursors get a full snapshot"""
+    try:
+        since = request.args.get('since')
+        since = int(since) if since not in (None, '') else None
+        limit = min(CHANGES_MAX_LIMIT, max(1, int(request.args.get('limit', CHANGES_DEFAULT_LIMIT))))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'since and limit must be integers'}), 400
+    
+    changes = change_log.since(since, limit) if since is not None else None
+    if changes is None:
+        # Take the cursor first: events racing with the snapshot are replayed, never lost
+        cursor = change_log.cursor()
+        return jsonify({
+            'success': True,
+            'reset': True,
+            'cursor': cursor,
+            'events': [],
+            'has_more': False,
+            'snapshot': build_activity_payload()
+        })
+    
+    events, cursor, has_more = changes
+    return jsonify({
+        'success': True,
+        'reset': False,
+        'cursor': cursor,
+        'events': events,
+        'has_more': has_more
+    })
+
+@app.route('/api/stream')
+@auth.login_required
+def api_stream():
+    """Server-sent events with changes to the /api/activity data"""
+    subscriber = activity_stream.subscribe()
+
+    def generate():
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            while True:
+                try:
+                    yield subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            activity_stream.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # nginx would otherwise buffer the stream
+    })
+
+@app.route('/api/stream/stats')
+@auth.login_required
+def api_stream_stats():
+    """API to get subscriber count of the shared activity stream"""
+    return jsonify({
+        'success': True,
+        'stream': activity_stream.stats()
     })
 
 @app.route('/api/temporary_clients')
@@ -4309,7 +7313,7 @@ def api_activity():
 def api_temporary_clients():
     """API to get temporary clients info"""
     temp_info = {}
-    for client_name in temporary_clients:
+    for client_name in list(temporary_clients):
         temp_info[client_name] = OpenVPNManager.get_temporary_client_info(client_name)
     
     return jsonify({
@@ -4318,7 +7322,7 @@ def api_temporary_clients():
         'raw_data': {name: {
             'revoke_time': data['revoke_time'].isoformat(),
             'hours': data['hours'],
-            'timer_active': data['timer'].is_alive() if hasattr(data['timer'], 'is_alive') else 'unknown'
+            'timer_active': expiry_scheduler.is_scheduled(name)
         } for name, data in temporary_clients.items()}
     })
 
@@ -4328,6 +7332,24 @@ def api_diagnose():
     """API to get system diagnosis"""
     return jsonify(OpenVPNManager.diagnose_system())
 
+@app.route('/api/probe_cache')
+@auth.login_required
+def api_probe_cache():
+    """API to get hit/miss counters of the OpenVPNManager probe cache"""
+    return jsonify({
+        'success': True,
+        'probes': probe_cache.stats()
+    })
+
+@app.route('/api/keypair_pool')
+@auth.login_required
+def api_keypair_pool():
+    """API to get depth and refill rate of the pre-generated keypair pool"""
+    return jsonify({
+        'success': True,
+        'pool': keypair_pool.stats()
+    })
+
 @app.route('/enable_monitoring', methods=['POST'])
 @auth.login_required
 def enable_monitoring():
@@ -4373,16 +7395,27 @@ def api_logs(log_type):
 @auth.login_required
 def api_system_metrics():
     """API to get system metrics (CPU, RAM, Network)"""
-    metrics = OpenVPNManager.get_system_metrics()
-    # Save metrics to database for history
-    OpenVPNManager.save_system_metrics()
+    snapshot = metrics_sampler.snapshot()
+    metrics = dict(snapshot['system_metrics'])
+    metrics['age_seconds'] = snapshot['age_seconds']
     return jsonify(metrics)
 
+@app.route('/api/system_metrics/history')
+@auth.login_required
+def api_system_metrics_history():
+    """API to get stored system metrics (raw, 5-minute or hourly depending on range)"""
+    hours = request.args.get('hours', 24, type=int)
+    hours = max(1, min(hours, 24 * 365))  # Limit to prevent huge responses
+    return jsonify(OpenVPNManager.get_system_metrics_history(hours))
+
 @app.route('/api/network_bandwidth')
 @auth.login_required
 def api_network_bandwidth():
     """API to get real-time network bandwidth"""
-    return jsonify(OpenVPNManager.get_network_bandwidth())
+    snapshot = metrics_sampler.snapshot()
+    bandwidth = dict(snapshot['network_bandwidth'])
+    bandwidth['age_seconds'] = snapshot['age_seconds']
+    return jsonify(bandwidth)
 
 @app.route('/api/client_traffic/<client_name>')
 @auth.login_required
@@ -4396,9 +7429,30 @@ def api_client_traffic(client_name):
 
 @app.route('/api/traffic_summary')
 @auth.login_required
+@versioned(
+    lambda: db_pool.generation('data', 'sessions'),
+    lambda: int(time.time() // 60)  # Online durations in the status text
+)
 def api_traffic_summary():
-    """API to get traffic summary for all clients"""
-    return jsonify(OpenVPNManager.get_all_clients_traffic_summary())
+    """API to get traffic summary for all clients (?compact=1 drops the derived MB/GB fields)"""
+    summary = OpenVPNManager.get_all_clients_traffic_summary()
+    if compact_requested():
+        summary = drop_fields(summary, TRAFFIC_SUMMARY_DERIVED_FIELDS)
+    return jsonify(summary)
+
+@app.route('/api/traffic_timeline')
+@auth.login_required
+def api_traffic_timeline():
+    """API to get hourly/daily traffic totals, optionally for one client"""
+    period = request.args.get('period', 'daily')
+    if period not in ('hourly', 'daily'):
+        return jsonify({'error': 'Invalid period'}), 400
+    
+    days = request.args.get('days', 30, type=int)
+    if days > 365:  # Limit to prevent huge responses
+        days = 365
+    
+    return jsonify(OpenVPNManager.get_traffic_timeline(period, days, request.args.get('client')))
 
 @app.route('/api/client_history/<client_name>')
 @auth.login_required
@@ -4406,7 +7460,7 @@ def api_client_history(client_name):
     """API endpoint for client connection history with IP addresses"""
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -4425,6 +7479,7 @@ def api_client_history(client_name):
         """, (client_name,))
         
         rows = cursor.fetchall()
+        compact = compact_requested()
         
         history = []
         for row in rows:
@@ -4432,15 +7487,24 @@ def api_client_history(client_name):
             session_end = row[2]
             duration_seconds = row[5]
             
+            if compact:
+                history.append({
+                    'start_time': session_start,
+                    'end_time': session_end,
+                    'bytes_sent': row[3] or 0,
+                    'bytes_received': row[4] or 0,
+                    'duration': duration_seconds,
+                    'real_address': row[6] or 'N/A',
+                    'virtual_address': row[7] or 'N/A'
+                })
+                continue
+            
             # Format duration properly
             if duration_seconds and duration_seconds > 0:
                 duration_formatted = OpenVPNManager.format_duration(duration_seconds)
             else:
                 duration_formatted = 'N/A'
             
-            # Debug log for API response
-            print(f"📊 API History for {client_name}: bytes_sent={row[3]}, bytes_received={row[4]}, duration={duration_formatted}")
-            
             history.append({
                 'client_name': row[0],
                 'start_time': session_start,
@@ -4494,7 +7558,7 @@ def api_temp_clients_diagnosis():
     """API to diagnose temporary clients system"""
     try:
         # Get all temporary clients from database
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT client_name, created_at, revoke_at, hours, status 
@@ -4525,11 +7589,10 @@ def api_temp_clients_diagnosis():
         # Get active timers
         active_timers = {}
         for name, data in temporary_clients.items():
-            timer = data['timer']
             active_timers[name] = {
                 'revoke_time': data['revoke_time'].isoformat(),
                 'hours': data['hours'],
-                'timer_alive': hasattr(timer, 'is_alive') and timer.is_alive()
+                'timer_alive': expiry_scheduler.is_running() and expiry_scheduler.is_scheduled(name)
             }
         
         return jsonify({
@@ -4556,7 +7619,7 @@ def api_force_check_temp_clients():
         errors = []
         
         # Check database for expired clients
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT client_name, revoke_at 
@@ -4565,18 +7628,24 @@ def api_force_check_temp_clients():
         ''')
         
         current_time = datetime.now()
+        expired_clients = []
         for client_name, revoke_at_str in cursor.fetchall():
             try:
                 revoke_time = datetime.fromisoformat(revoke_at_str)
                 if revoke_time <= current_time:
                     print(f"🔍 Force processing expired client: {client_name}")
-                    OpenVPNManager.auto_revoke_client(client_name)
-                    processed += 1
+                    expired_clients.append(client_name)
             except Exception as e:
                 errors.append(f"Error processing {client_name}: {str(e)}")
         
         conn.close()
         
+        try:
+            OpenVPNManager.auto_revoke_clients(expired_clients)
+            processed = len(expired_clients)
+        except Exception as e:
+            errors.append(f"Error processing expired clients: {str(e)}")
+        
         return jsonify({
             'success': True,
             'processed_count': processed,
@@ -4725,6 +7794,7 @@ def view_logs(log_type):
 # Advanced Configuration Management Routes
 @app.route('/api/server_config')
 @auth.login_required
+@versioned(lambda: file_version(SERVER_CONF_PATH))
 def api_server_config():
     """Get server configuration"""
     try:
@@ -4940,9 +8010,9 @@ def api_backup_configs():
                 backup_info['clients_backed_up'] = False
         
         # Backup database
-        if os.path.exists('vpn_history.db'):
+        if os.path.exists(db_pool.path):
             try:
-                shutil.copy2('vpn_history.db', os.path.join(backup_dir, 'vpn_history.db'))
+                db_pool.backup_to(os.path.join(backup_dir, 'vpn_history.db'))
                 backup_info['database_backed_up'] = True
             except Exception as e:
                 print(f"Warning: Could not backup database: {e}")
@@ -4974,7 +8044,7 @@ def api_backup_configs():
         
         # Store backup record in database
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
+            conn = get_db_connection()
             cursor = conn.cursor()
             
             # Create backups table if it doesn't exist
@@ -5194,6 +8264,93 @@ def api_config_templates():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/clients/bulk', methods=['POST'])
+@auth.login_required
+def api_bulk_create_clients():
+    """Start a bulk provisioning job from a JSON list or CSV of clients"""
+    try:
+        if request.is_json:
+            data = request.get_json(silent=True) or {}
+            if isinstance(data, list):
+                # Bare list of clients, no defaults
+                data = {'clients': data}
+            if not isinstance(data, dict):
+                return jsonify({'success': False, 'error': 'Request body must be a JSON object or a list of clients'}), 400
+            entries = data.get('clients', [])
+            if not isinstance(entries, list):
+                return jsonify({'success': False, 'error': 'clients must be a list'}), 400
+            if isinstance(data.get('csv'), str):
+                entries = list(entries) + BulkProvisioner.parse_csv(data['csv'])
+        else:
+            data = request.form
+            csv_text = data.get('csv', '')
+            if not csv_text and 'file' in request.files:
+                csv_text = request.files['file'].read().decode('utf-8-sig')
+            if not csv_text and not request.form:
+                csv_text = request.get_data(as_text=True)
+            entries = BulkProvisioner.parse_csv(csv_text)
+        
+        defaults = {field: data[field] for field in ('group', 'profile', 'expiry_days') if data.get(field)}
+        clients, errors = BulkProvisioner.normalize_entries(entries, defaults)
+        
+        if not clients:
+            return jsonify({'success': False, 'error': 'No valid clients', 'errors': errors}), 400
+        if len(clients) > BULK_PROVISION_MAX_CLIENTS:
+            return jsonify({'success': False, 'error': f'At most {BULK_PROVISION_MAX_CLIENTS} clients per job'}), 400
+        
+        job_id = bulk_provisioner.submit(clients)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'total': len(clients),
+            'errors': errors,
+            'status_url': url_for('api_bulk_create_status', job_id=job_id)
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/clients/bulk')
+@auth.login_required
+def api_bulk_create_jobs():
+    """List recent bulk provisioning jobs"""
+    return jsonify({'success': True, 'jobs': bulk_provisioner.list_jobs()})
+
+@app.route('/api/clients/bulk/<job_id>')
+@auth.login_required
+def api_bulk_create_status(job_id):
+    """Progress of a bulk provisioning job"""
+    job = bulk_provisioner.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/bulk_revoke', methods=['POST'])
+@auth.login_required
+def api_bulk_revoke():
+    """Bulk revoke clients with a single CRL update"""
+    try:
+        data = request.get_json() or {}
+        clients = data.get('clients', [])
+        
+        if not clients:
+            return jsonify({'success': False, 'error': 'No clients selected'}), 400
+        
+        result = OpenVPNManager.revoke_clients_bulk(clients)
+        for client_name in result['revoked']:
+            OpenVPNManager.cancel_auto_revoke(client_name)
+        
+        return jsonify({
+            'success': bool(result['revoked']) and not result['error'],
+            'revoked_count': len(result['revoked']),
+            'revoked': result['revoked'],
+            'errors': [f"{name}: {message}" for name, message in result['failed'].items()],
+            'message': f"Revoked {len(result['revoked'])} clients"
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/bulk_assign_group', methods=['POST'])
 @auth.login_required
 def api_bulk_assign_group():
@@ -5210,7 +8367,7 @@ def api_bulk_assign_group():
         errors = []
         
         # Connect to database to store group assignments
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Create client_groups table if it doesn't exist
@@ -5244,6 +8401,7 @@ def api_bulk_assign_group():
         
         conn.commit()
         conn.close()
+        client_registry.invalidate_groups()
         
         if success_count > 0:
             message = f'Successfully assigned {success_count} clients to group "{group}"' if group else f'Successfully removed {success_count} clients from groups'
@@ -5260,6 +8418,46 @@ def api_bulk_assign_group():
         print(f"❌ Error in bulk_assign_group: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/export_configs', methods=['GET', 'POST'])
+@auth.login_required
+def api_export_configs():
+    """Stream a ZIP archive with the .ovpn files of a group or a list of clients"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'Request body must be a JSON object'}), 400
+        group = data.get('group') or request.args.get('group', '')
+        if not isinstance(group, str):
+            return jsonify({'success': False, 'error': 'group must be a string'}), 400
+        group = group.strip()
+        clients = data.get('clients') or [name for name in request.args.get('clients', '').split(',') if name.strip()]
+        if not isinstance(clients, list):
+            return jsonify({'success': False, 'error': 'clients must be a list of client names'}), 400
+        
+        if not group and not clients:
+            return jsonify({'success': False, 'error': 'Specify a group or a list of clients'}), 400
+        
+        wanted = {re.sub(r'[^0-9a-zA-Z_-]', '_', str(name).strip()) for name in clients}
+        client_names, seen = [], set()
+        for record in client_registry.records():
+            if record.status == 'active' and (record.name in wanted or (group and record.group == group)):
+                if record.name not in seen:
+                    seen.add(record.name)
+                    client_names.append(record.name)
+        
+        if not client_names:
+            return jsonify({'success': False, 'error': 'No matching active clients'}), 404
+        
+        archive_name = re.sub(r'[^0-9a-zA-Z_-]', '_', group) if group else 'openvpn-configs'
+        return Response(
+            iter_configs_zip(client_names),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename={archive_name}.zip'}
+        )
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/export_clients')
 @auth.login_required
 def api_export_clients():
@@ -5476,6 +8674,7 @@ def api_client_audit_log():
 
 @app.route('/api/cluster/status')
 @auth.login_required
+@versioned(lambda: db_pool.generation('data'))
 def api_cluster_status():
     """Get cluster status"""
     try:
@@ -5689,10 +8888,11 @@ def api_cluster_load_balance():
 
 @app.route('/api/backups', methods=['GET'])
 @auth.login_required
+@versioned(lambda: db_pool.generation('data'), lambda: file_version('backups'))
 def api_list_backups():
     """Get list of all backups"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Create backups table if it doesn't exist
@@ -5733,7 +8933,7 @@ def api_list_backups():
 def api_download_backup(backup_id):
     """Download backup file"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT name, file_path FROM backups WHERE id = ?', (backup_id,))
         backup = cursor.fetchone()
@@ -5757,7 +8957,7 @@ def api_download_backup(backup_id):
 def api_restore_backup(backup_id):
     """Restore from backup"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT name, file_path FROM backups WHERE id = ?', (backup_id,))
         backup = cursor.fetchone()
@@ -5808,11 +9008,13 @@ def api_restore_backup(backup_id):
             db_path = os.path.join(extracted_dir, 'vpn_history.db')
             if os.path.exists(db_path):
                 # Backup current database
-                if os.path.exists('vpn_history.db'):
-                    shutil.copy2('vpn_history.db', 'vpn_history.db.pre_restore')
+                if os.path.exists(db_pool.path):
+                    db_pool.backup_to(f'{db_pool.path}.pre_restore')
                 
                 # Restore database
-                shutil.copy2(db_path, 'vpn_history.db')
+                db_pool.replace_with(db_path)
+                init_database()  # Older backups predate newer tables
+                session_writer.reset()
             
             # Restore settings files
             for settings_file in ['user_groups.json', 'cluster_settings.json']:
@@ -5839,7 +9041,7 @@ def api_restore_backup(backup_id):
 def api_delete_backup(backup_id):
     """Delete backup"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT name, file_path FROM backups WHERE id = ?', (backup_id,))
         backup = cursor.fetchone()
@@ -5929,7 +9131,7 @@ def api_update_cluster_settings():
 def api_cluster_real_activity():
     """Get real cluster activity from database"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Get recent cluster activities
@@ -6074,15 +9276,24 @@ if __name__ == '__main__':
     # Initialize database first
     init_database()
     
-    # Start session tracking
-    start_session_tracking()
-    
     # Restore temporary clients from database
     restore_temporary_clients()
     
-    # Restore traffic history
+    # Restore traffic history before the tracker starts writing sessions
     restore_traffic_history()
     
+    # Start session tracking
+    start_session_tracking()
+    
+    # Connect to the OpenVPN management interface
+    management_client.start()
+    
+    # Start background metrics sampler
+    metrics_sampler.start()
+    
+    # Start pre-generating client keys
+    keypair_pool.start()
+    
     print("✅ OpenVPN Manager started successfully!")
     
     # Запускаем на всех интерфейсах для доступа из сети
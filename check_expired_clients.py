@@ -81,15 +81,15 @@ def check_expired_clients():
         revoked_count = 0
         failed_count = 0
         
-        # Revoke each expired client
+        for client_name, revoke_at in expired_clients:
+            log_message(f"🔄 Processing: {client_name} (expired: {revoke_at})")
+        
+        # Revoke all expired clients via EasyRSA with a single CRL update
+        revoked_clients = revoke_clients_bulk([client_name for client_name, _ in expired_clients])
+        
         for client_name, revoke_at in expired_clients:
             try:
-                log_message(f"🔄 Processing: {client_name} (expired: {revoke_at})")
-                
-                # Revoke via EasyRSA
-                success = revoke_client_direct(client_name)
-                
-                if success:
+                if re.sub(r'[^0-9a-zA-Z_-]', '_', client_name) in revoked_clients:
                     # Update temporary clients status
                     cursor.execute('''
                         UPDATE temporary_clients 
@@ -138,9 +138,24 @@ def check_expired_clients():
 
 def revoke_client_direct(client_name):
     """Direct client revocation via EasyRSA with improved logging"""
+    clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
+    return clean_name in revoke_clients_bulk([client_name])
+
+def revoke_clients_bulk(client_names):
+    """Revoke several clients via EasyRSA, generating and copying the CRL once.
+    
+    Returns the list of (cleaned) client names that were revoked.
+    """
     try:
-        # Clean client name for security
-        clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
+        # Clean client names for security
+        clean_names = []
+        for client_name in client_names:
+            clean_name = re.sub(r'[^0-9a-zA-Z_-]', '_', client_name)
+            if clean_name and clean_name not in clean_names:
+                clean_names.append(clean_name)
+        
+        if not clean_names:
+            return []
         
         # Change to EasyRSA directory
         old_cwd = os.getcwd()
@@ -149,33 +164,40 @@ def revoke_client_direct(client_name):
             os.chdir(EASYRSA_DIR)
         except Exception as e:
             log_message(f"Cannot access EasyRSA directory: {e}")
-            return False
+            return []
         
         try:
-            # Check if client certificate exists
-            cert_path = f"pki/issued/{clean_name}.crt"
-            if not os.path.exists(cert_path):
-                log_message(f"Certificate for {clean_name} not found")
-                return False
-            
-            # Revoke the certificate
-            revoke_cmd = ['./easyrsa', '--batch', 'revoke', clean_name]
-            log_message(f"Executing: {' '.join(revoke_cmd)}")
-            
-            result = subprocess.run(
-                revoke_cmd,
-                capture_output=True, text=True, timeout=60
-            )
+            revoked = []
+            for clean_name in clean_names:
+                # Check if client certificate exists
+                cert_path = f"pki/issued/{clean_name}.crt"
+                if not os.path.exists(cert_path):
+                    log_message(f"Certificate for {clean_name} not found")
+                    continue
+                
+                # Revoke the certificate
+                revoke_cmd = ['./easyrsa', '--batch', 'revoke', clean_name]
+                log_message(f"Executing: {' '.join(revoke_cmd)}")
+                
+                result = subprocess.run(
+                    revoke_cmd,
+                    capture_output=True, text=True, timeout=60
+                )
+                
+                if result.returncode != 0:
+                    # Check if already revoked
+                    if "Already revoked" in result.stderr or "already revoked" in result.stderr:
+                        log_message(f"Certificate {clean_name} was already revoked")
+                    else:
+                        log_message(f"Revocation failed: {result.stderr}")
+                        continue
+                
+                revoked.append(clean_name)
             
-            if result.returncode != 0:
-                # Check if already revoked
-                if "Already revoked" in result.stderr or "already revoked" in result.stderr:
-                    log_message(f"Certificate {clean_name} was already revoked")
-                else:
-                    log_message(f"Revocation failed: {result.stderr}")
-                    return False
+            if not revoked:
+                return []
             
-            # Generate updated CRL
+            # Generate updated CRL (once for the whole batch)
             crl_cmd = ['./easyrsa', '--batch', '--days=3650', 'gen-crl']
             log_message("Generating new CRL...")
             
@@ -186,7 +208,7 @@ def revoke_client_direct(client_name):
             
             if result.returncode != 0:
                 log_message(f"CRL generation failed: {result.stderr}")
-                return False
+                return []
             
             # Copy CRL to OpenVPN directory
             crl_source = "pki/crl.pem"
@@ -208,25 +230,26 @@ def revoke_client_direct(client_name):
                         
                 except subprocess.TimeoutExpired:
                     log_message("Error: Timeout copying CRL")
-                    return False
+                    return []
                 except Exception as e:
                     log_message(f"Error copying CRL: {e}")
-                    return False
+                    return []
             else:
                 log_message("Warning: CRL file not found after generation")
             
             # Remove client configuration files
-            cleanup_client_files(clean_name)
+            for clean_name in revoked:
+                cleanup_client_files(clean_name)
+                log_message(f"Client {clean_name} successfully revoked")
             
-            log_message(f"Client {clean_name} successfully revoked")
-            return True
+            return revoked
             
         finally:
             os.chdir(old_cwd)
             
     except Exception as e:
-        log_message(f"Error in revoke_client_direct: {str(e)}")
-        return False
+        log_message(f"Error in revoke_clients_bulk: {str(e)}")
+        return []
 
 def cleanup_client_files(client_name):
     """Clean up client files after revocation"""
@@ -0,0 +1,39 @@
+import app
+
+
+INDEX_ROWS = [
+    "V\t351231000000Z\t\t0A\tunknown\t/CN=server\n",
+    "V\t351231000000Z\t\t0B\tunknown\t/CN=bob\n",
+    "V\t351231000000Z\t\t0C\tunknown\t/CN=bobby\n",
+    "R\t351231000000Z\t250101000000Z\t0D\tunknown\t/CN=bob\n",
+]
+
+
+def write_index(tmp_path, monkeypatch):
+    index_file = tmp_path / 'index.txt'
+    index_file.write_text(''.join(INDEX_ROWS))
+    monkeypatch.setattr(app, 'INDEX_FILE', str(index_file))
+    return index_file
+
+
+def test_purge_keeps_clients_sharing_a_name_prefix(tmp_path, monkeypatch):
+    index_file = write_index(tmp_path, monkeypatch)
+
+    removed = app.OpenVPNManager.purge_index_entries(['bob'])
+
+    assert removed == ['0B', '0D']
+    assert index_file.read_text() == INDEX_ROWS[0] + INDEX_ROWS[2]
+
+
+def test_purge_without_matches_leaves_index_untouched(tmp_path, monkeypatch):
+    index_file = write_index(tmp_path, monkeypatch)
+
+    assert app.OpenVPNManager.purge_index_entries(['alice']) == []
+    assert index_file.read_text() == ''.join(INDEX_ROWS)
+    assert [p.name for p in tmp_path.iterdir()] == ['index.txt']
+
+
+def test_purge_missing_index_returns_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'INDEX_FILE', str(tmp_path / 'index.txt'))
+
+    assert app.OpenVPNManager.purge_index_entries(['bob']) == []